@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from autovm.billing.models import BillingAccount
+from autovm.billing.models import DailyUsage
 from autovm.billing.models import RatePlan
 from autovm.billing.models import Subscription
 from autovm.billing.models import Transaction
@@ -48,3 +49,20 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ["account", "amount", "status"]
     search_fields = ["account", "amount", "status"]
     list_filter = ["account", "amount", "status"]
+
+
+@admin.register(DailyUsage)
+class DailyUsageAdmin(admin.ModelAdmin):
+    """
+    Daily usage admin panel
+    """
+
+    list_display = [
+        "day",
+        "account",
+        "region",
+        "disk_size",
+        "running_seconds",
+        "provisioned_seconds",
+    ]
+    list_filter = ["day", "disk_size"]
@@ -0,0 +1,14 @@
+from autovm.billing.models import BillingAccount
+from autovm.resources.api.async_views import AsyncAPIView
+
+
+class AsyncBalanceView(AsyncAPIView):
+    """
+    Async variant of the billing account balance endpoint.
+    """
+
+    async def get(self, request):
+        account, created = await BillingAccount.objects.aget_or_create(
+            user=request.user,
+        )
+        return self.render({"balance": account.amount})
@@ -21,7 +21,16 @@ class RatePlanSerializer(serializers.ModelSerializer):
         """
 
         model = RatePlan
-        fields = ["_id", "plan", "price", "vm_limit", "backup_limit"]
+        fields = [
+            "_id",
+            "plan",
+            "price",
+            "vm_limit",
+            "backup_limit",
+            "keep_daily",
+            "keep_weekly",
+            "keep_monthly",
+        ]
 
 
 class BillingAccountSerializer(serializers.ModelSerializer):
@@ -131,3 +140,35 @@ class TransactionSerializer(serializers.ModelSerializer):
         user_account.save()
 
         return transaction
+
+
+class UsageQuerySerializer(serializers.Serializer):
+    """
+    Period usage is reported for, per day or per hour
+    """
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    period = serializers.ChoiceField(choices=["day", "hour"], default="day")
+
+    # days reported at once, per period
+    MAX_DAYS = {"day": 366, "hour": 31}
+
+    def validate(self, attrs):
+        days = (attrs["end"] - attrs["start"]).days
+        limit = self.MAX_DAYS[attrs["period"]]
+        if days <= 0:
+            msg = "The end must come after the start."
+            raise serializers.ValidationError(msg)
+        if days > limit:
+            msg = f"At most {limit} days per {attrs['period']}."
+            raise serializers.ValidationError(msg)
+        return attrs
+
+
+class InvoiceQuerySerializer(serializers.Serializer):
+    """
+    Month an invoice is for, as any date in it
+    """
+
+    month = serializers.DateField(input_formats=["%Y-%m", "iso-8601"])
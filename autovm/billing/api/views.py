@@ -3,23 +3,29 @@ from django.db.models.query import QuerySet
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from autovm.billing import metering
 from autovm.billing.api.serializers import BillingAccountSerializer
+from autovm.billing.api.serializers import InvoiceQuerySerializer
 from autovm.billing.api.serializers import RatePlanSerializer
 from autovm.billing.api.serializers import SubscriptionSerializer
 from autovm.billing.api.serializers import TransactionSerializer
+from autovm.billing.api.serializers import UsageQuerySerializer
 from autovm.billing.models import BillingAccount
 from autovm.billing.models import RatePlan
 from autovm.billing.models import Subscription
 from autovm.billing.models import Transaction
-
+from autovm.middleware.budgets import query_budget
+from autovm.resources.api.catalog import CatalogCacheMixin
+from autovm.resources.api.conditional import ConditionalGetMixin
+from autovm.resources.api.filters import TypedSearchFilter
+from autovm.resources.api.idempotency import idempotent
 from autovm.resources.api.permissions import IsAdminOrReadOnly
 
 
-class RatePlanViewSet(ModelViewSet):
+class RatePlanViewSet(CatalogCacheMixin, ConditionalGetMixin, ModelViewSet):
     """
     Rate Plan viewset.
     """
@@ -28,7 +34,7 @@ class RatePlanViewSet(ModelViewSet):
     queryset = RatePlan.objects.all()
     lookup_field = "pk"
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = ["plan", "price", "vm_limit", "backup_limit"]
     search_fields = ["plan", "price", "vm_limit", "backup_limit"]
 
@@ -60,20 +66,37 @@ class RatePlanViewSet(ModelViewSet):
         )
 
 
-class SubscriptionViewSet(ModelViewSet):
+class SubscriptionViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Subscription viewset.
     """
 
     serializer_class = SubscriptionSerializer
-    queryset = Subscription.objects.all()
+    queryset = Subscription.objects.select_related("plan")
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    throttle_scope = "subscriptions"
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = ["plan", "account", "account__user__id", "status"]
-    search_fields = ["plan", "account__user__name", "account__user__email", "status"]
+    search_fields = [
+        "plan",
+        "plan__plan",
+        "account",
+        "account__user__name",
+        "account__user__email",
+        "status",
+    ]
+    query_budgets = {"list": 2, "retrieve": 1}
 
+    @query_budget(10)
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """
+        Subscribe, replaying the response for retries with the same idempotency key.
+        """
+        return super().create(request, *args, **kwargs)
 
-class TransactionViewSet(ModelViewSet):
+
+class TransactionViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Transaction viewset.
     """
@@ -81,7 +104,7 @@ class TransactionViewSet(ModelViewSet):
     serializer_class = TransactionSerializer
     queryset = Transaction.objects.all()
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = [
         "amount",
         "account",
@@ -89,7 +112,15 @@ class TransactionViewSet(ModelViewSet):
         "account__user__email",
         "status",
     ]
-    search_fields = ["amount", "account", "status"]
+    search_fields = ["amount", "account", "account__user__email", "status"]
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """
+        Record a transaction, replaying the response for retries with the same
+        idempotency key.
+        """
+        return super().create(request, *args, **kwargs)
 
     def get_queryset(self) -> QuerySet:
         """
@@ -100,7 +131,7 @@ class TransactionViewSet(ModelViewSet):
         return Transaction.objects.filter(account__user=self.request.user)
 
 
-class BillingAccountViewSet(ModelViewSet):
+class BillingAccountViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Billing Account viewset.
     """
@@ -108,11 +139,14 @@ class BillingAccountViewSet(ModelViewSet):
     serializer_class = BillingAccountSerializer
     queryset = BillingAccount.objects.all()
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    # set per action for writes that are throttled separately
+    throttle_scope = None
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = ["user", "amount", "user__id", "user__email"]
-    search_fields = ["user", "amount"]
+    search_fields = ["user", "user__email", "amount"]
 
-    @action(detail=False, methods=["post"])
+    @action(detail=False, methods=["post"], throttle_scope="deposit")
+    @idempotent
     def deposit(self, request):
         """
         Deposit money into the user account.
@@ -144,3 +178,40 @@ class BillingAccountViewSet(ModelViewSet):
             {"balance": account.amount},
             status=status.HTTP_200_OK,
         )
+
+    @action(detail=False, methods=["get"])
+    @query_budget(3)
+    def usage(self, request):
+        """
+        Hours the user's machines ran and were provisioned, per region and
+        storage size, from the usage rollups.
+        """
+        serializer = UsageQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        account = BillingAccount.objects.filter(user=request.user).first()
+        return Response(
+            {
+                "period": serializer.validated_data["period"],
+                "results": metering.usage(account, **serializer.validated_data),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"])
+    @query_budget(3)
+    def invoice(self, request):
+        """
+        Charges for the usage of the user's machines over a month, from the
+        daily usage rollups.
+        """
+        serializer = InvoiceQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        account = BillingAccount.objects.filter(user=request.user).first()
+        start, end = metering.month_bounds(serializer.validated_data["month"])
+        return Response(
+            {
+                "account": account.pk if account else None,
+                **metering.invoice(account, start, end),
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -1,3 +1,5 @@
+import contextlib
+
 from django.apps import AppConfig
 from django.utils.translation import gettext_lazy as _
 
@@ -6,3 +8,7 @@ class BillingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "autovm.billing"
     verbose_name = _("Billing")
+
+    def ready(self):
+        with contextlib.suppress(ImportError):
+            import autovm.billing.signals  # noqa: F401
@@ -0,0 +1,318 @@
+"""
+Metering of virtual machine usage.
+
+What a machine is billed for changes when it is created, started, stopped,
+resized, moved, assigned to another user or deleted. Each change appends a
+UsageEvent holding what the machine is metered for from then on: its owner,
+region and storage size and whether it is running. Events are only ever read
+by time range, which the BRIN index on their time serves at a fraction of the
+size of a B-tree.
+
+``roll_up_usage``, run by beat, aggregates them into HourlyUsage rows, the
+seconds the machines of each account were running and provisioned per
+region and storage size in each hour, and the complete days of those into
+DailyUsage rows. Each rollup is incremental: UsageWatermark records the time
+up to which it is done, and UsageCheckpoint what each machine was metered
+for at that time, so a run reads the checkpoint and the events since the
+watermark, never the events before it. Hours are rolled up once they are
+METERING_DELAY seconds past, so that events committed late still fall in
+the hour they happened in. Usage queries and invoices read the rollups.
+
+Machines of users without a billing account aren't rolled up.
+"""
+
+from datetime import UTC
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import DailyUsage
+from autovm.billing.models import HourlyUsage
+from autovm.billing.models import UsageCheckpoint
+from autovm.billing.models import UsageEvent
+from autovm.billing.models import UsageWatermark
+
+# the state of each machine over the window, as segments between its
+# checkpoint and events, sliced into hours and summed per account
+HOURLY_ROLLUP = """
+WITH points AS (
+    SELECT "machine", "user_id", "region_id", "running", "disk_size",
+        0 AS "kind", %(start)s::timestamptz AS "time", 0 AS "seq"
+    FROM {checkpoints}
+    UNION ALL
+    SELECT "machine", "user_id", "region_id", "running", "disk_size",
+        "kind", "time", "id"
+    FROM {events}
+    WHERE "time" >= %(start)s AND "time" < %(end)s
+),
+segments AS (
+    SELECT "user_id", "region_id", "running", "disk_size", "kind",
+        "time" AS "since",
+        COALESCE(
+            LEAD("time") OVER (PARTITION BY "machine" ORDER BY "time", "seq"),
+            %(end)s
+        ) AS "until"
+    FROM points
+),
+slices AS (
+    SELECT "user_id", "region_id", "running", "disk_size", "hour",
+        EXTRACT(EPOCH FROM LEAST("until", "hour" + INTERVAL '1 hour')
+            - GREATEST("since", "hour")) AS "seconds"
+    FROM segments, generate_series(
+        date_trunc('hour', "since"),
+        "until" - INTERVAL '1 microsecond',
+        INTERVAL '1 hour'
+    ) AS "hour"
+    WHERE "kind" <> %(deleted)s AND "until" > "since"
+)
+INSERT INTO {hourly} ("account_id", "region_id", "disk_size", "hour",
+    "running_seconds", "provisioned_seconds")
+SELECT account."_id", "region_id", "disk_size", "hour",
+    ROUND(SUM(CASE WHEN "running" THEN "seconds" ELSE 0 END)),
+    ROUND(SUM("seconds"))
+FROM slices JOIN {accounts} AS account USING ("user_id")
+GROUP BY account."_id", "region_id", "disk_size", "hour"
+"""
+
+# the last state of the machines with events in the window, unless deleted,
+# once their previous checkpoints are cleared
+CLEAR_CHECKPOINTS = """
+DELETE FROM {checkpoints}
+WHERE "machine" IN (
+    SELECT "machine" FROM {events} WHERE "time" >= %(start)s AND "time" < %(end)s
+)
+"""
+CHECKPOINT = """
+INSERT INTO {checkpoints} ("machine", "user_id", "region_id", "running", "disk_size")
+SELECT "machine", "user_id", "region_id", "running", "disk_size"
+FROM (
+    SELECT DISTINCT ON ("machine") *
+    FROM {events}
+    WHERE "time" >= %(start)s AND "time" < %(end)s
+    ORDER BY "machine", "time" DESC, "id" DESC
+) AS latest
+WHERE "kind" <> %(deleted)s
+"""
+
+DAILY_ROLLUP = """
+INSERT INTO {daily} ("account_id", "region_id", "disk_size", "day",
+    "running_seconds", "provisioned_seconds")
+SELECT "account_id", "region_id", "disk_size", date_trunc('day', "hour")::date,
+    SUM("running_seconds"), SUM("provisioned_seconds")
+FROM {hourly}
+WHERE "hour" >= %(start)s AND "hour" < %(end)s
+GROUP BY "account_id", "region_id", "disk_size", date_trunc('day', "hour")
+"""
+
+
+def usage_event(machine, kind, running=None):
+    """
+    The event of a change of a machine. Machines are running once started
+    and not once stopped, created or deleted; for other changes, pass
+    whether they run unless their state says it.
+    """
+    if running is None:
+        running = {
+            UsageEvent.STARTED: True,
+            UsageEvent.STOPPED: False,
+            UsageEvent.CREATED: False,
+            UsageEvent.DELETED: False,
+        }.get(kind, machine.state == "running")
+    return UsageEvent(
+        machine=machine.pk,
+        user_id=machine.user_id,
+        region_id=machine.region_id,
+        kind=kind,
+        running=running,
+        disk_size=int(machine.disk_size),
+    )
+
+
+def record_usage(machines, kind, running=None):
+    """
+    Append the events of a change of machines, in one INSERT.
+    """
+    UsageEvent.objects.bulk_create(
+        usage_event(machine, kind, running) for machine in machines if machine.user_id
+    )
+
+
+def tables():
+    quote_name = connection.ops.quote_name
+    return {
+        name: quote_name(model._meta.db_table)
+        for name, model in [
+            ("events", UsageEvent),
+            ("checkpoints", UsageCheckpoint),
+            ("hourly", HourlyUsage),
+            ("daily", DailyUsage),
+            ("accounts", BillingAccount),
+        ]
+    }
+
+
+def locked_watermark(name, default):
+    """
+    The watermark of a rollup, locked until the transaction ends so that
+    concurrent runs wait for each other, created at ``default()`` if new.
+    """
+    watermark = UsageWatermark.objects.select_for_update().filter(name=name).first()
+    if watermark is None:
+        watermark, _ = UsageWatermark.objects.select_for_update().get_or_create(
+            name=name,
+            defaults={"position": default()},
+        )
+    return watermark
+
+
+def start_of_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def start_of_day(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def roll_up_hours(now=None):
+    """
+    Roll the events up into the hours that ended METERING_DELAY seconds
+    before ``now``, returning how many hours were.
+    """
+    now = now or timezone.now()
+    end = start_of_hour(now - timedelta(seconds=settings.METERING_DELAY))
+
+    def first_hour():
+        first = UsageEvent.objects.order_by("time").values_list("time", flat=True)
+        return start_of_hour(first.first() or end)
+
+    with transaction.atomic():
+        watermark = locked_watermark("hourly", first_hour)
+        start = watermark.position
+        if start >= end:
+            return 0
+        params = {"start": start, "end": end, "deleted": UsageEvent.DELETED}
+        with connection.cursor() as cursor:
+            for statement in (HOURLY_ROLLUP, CLEAR_CHECKPOINTS, CHECKPOINT):
+                cursor.execute(statement.format(**tables()), params)
+        watermark.position = end
+        watermark.save(update_fields=["position"])
+    return (end - start) // timedelta(hours=1)
+
+
+def roll_up_days():
+    """
+    Roll the hours up into the days they complete, returning how many days
+    were.
+    """
+    hourly = UsageWatermark.objects.filter(name="hourly").first()
+    if hourly is None:
+        return 0
+    end = start_of_day(hourly.position)
+
+    def first_day():
+        first = HourlyUsage.objects.order_by("hour").values_list("hour", flat=True)
+        return start_of_day(first.first() or end)
+
+    with transaction.atomic():
+        watermark = locked_watermark("daily", first_day)
+        start = watermark.position
+        if start >= end:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                DAILY_ROLLUP.format(**tables()),
+                {"start": start, "end": end},
+            )
+        watermark.position = end
+        watermark.save(update_fields=["position"])
+    return (end - start).days
+
+
+def roll_up_usage(now=None):
+    return roll_up_hours(now), roll_up_days()
+
+
+def usage(account, start, end, period="day"):
+    """
+    Hours the machines of an account were running and provisioned per
+    region and storage size, per day or hour from ``start`` to ``end``.
+    """
+    if period == "hour":
+        rows = HourlyUsage.objects.filter(
+            hour__gte=datetime.combine(start, time(), tzinfo=UTC),
+            hour__lt=datetime.combine(end, time(), tzinfo=UTC),
+        )
+        field = "hour"
+    else:
+        rows = DailyUsage.objects.filter(day__gte=start, day__lt=end)
+        field = "day"
+    return [
+        {
+            field: row[field],
+            "region": row["region"],
+            "disk_size": str(row["disk_size"]),
+            "running_hours": Decimal(row["running_seconds"]) / 3600,
+            "provisioned_hours": Decimal(row["provisioned_seconds"]) / 3600,
+        }
+        for row in rows.filter(account=account)
+        .order_by(field, "region", "disk_size")
+        .values(field, "region", "disk_size", "running_seconds", "provisioned_seconds")
+    ]
+
+
+def invoice(account, start, end):
+    """
+    Charges for the usage of an account over the days from ``start`` to
+    ``end``, at the hourly METERING_RATES of each storage size, with a line
+    per region and storage size. Days not rolled up yet aren't charged.
+    """
+    daily = UsageWatermark.objects.filter(name="daily").first()
+    rolled_up = daily.position.date() if daily else start
+    lines = []
+    for row in (
+        DailyUsage.objects.filter(account=account, day__gte=start, day__lt=end)
+        .values("region", "disk_size")
+        .annotate(
+            running=Sum("running_seconds"),
+            provisioned=Sum("provisioned_seconds"),
+        )
+        .order_by("region", "disk_size")
+    ):
+        rates = settings.METERING_RATES[str(row["disk_size"])]
+        running_hours = Decimal(row["running"]) / 3600
+        provisioned_hours = Decimal(row["provisioned"]) / 3600
+        running_rate = Decimal(rates["running"])
+        provisioned_rate = Decimal(rates["provisioned"])
+        amount = running_hours * running_rate + provisioned_hours * provisioned_rate
+        lines.append(
+            {
+                "region": row["region"],
+                "disk_size": str(row["disk_size"]),
+                "running_hours": running_hours.quantize(Decimal("0.01")),
+                "provisioned_hours": provisioned_hours.quantize(Decimal("0.01")),
+                "amount": amount.quantize(Decimal("0.01")),
+            },
+        )
+    return {
+        "start": start,
+        "end": end,
+        "through": min(max(rolled_up, start), end),
+        "lines": lines,
+        "total": sum((line["amount"] for line in lines), Decimal("0.00")),
+    }
+
+
+def month_bounds(month):
+    """
+    The first day of a month given as a date in it, and of the next one.
+    """
+    start = month.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
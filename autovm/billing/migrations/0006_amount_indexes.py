@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("billing", "0005_alter_subscription_status"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="billingaccount",
+            index=models.Index(fields=["amount"], name="billingaccount_amount_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["amount"], name="transaction_amount_idx"),
+        ),
+    ]
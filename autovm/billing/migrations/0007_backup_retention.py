@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("billing", "0006_amount_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rateplan",
+            name="keep_daily",
+            field=models.PositiveIntegerField(default=7),
+        ),
+        migrations.AddField(
+            model_name="rateplan",
+            name="keep_monthly",
+            field=models.PositiveIntegerField(default=6),
+        ),
+        migrations.AddField(
+            model_name="rateplan",
+            name="keep_weekly",
+            field=models.PositiveIntegerField(default=4),
+        ),
+    ]
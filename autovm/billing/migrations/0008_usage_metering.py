@@ -0,0 +1,222 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:40
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("billing", "0007_backup_retention"),
+        ("resources", "0017_move_jobs"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsageWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=20, unique=True)),
+                ("position", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="UsageCheckpoint",
+            fields=[
+                ("machine", models.UUIDField(primary_key=True, serialize=False)),
+                ("running", models.BooleanField()),
+                ("disk_size", models.PositiveSmallIntegerField()),
+                (
+                    "region",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="resources.region",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DailyUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("disk_size", models.PositiveSmallIntegerField()),
+                ("running_seconds", models.BigIntegerField(default=0)),
+                ("provisioned_seconds", models.BigIntegerField(default=0)),
+                ("day", models.DateField()),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="billing.billingaccount",
+                    ),
+                ),
+                (
+                    "region",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="resources.region",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("account", "day", "region", "disk_size"),
+                        name="dailyusage_unique",
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="HourlyUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("disk_size", models.PositiveSmallIntegerField()),
+                ("running_seconds", models.BigIntegerField(default=0)),
+                ("provisioned_seconds", models.BigIntegerField(default=0)),
+                ("hour", models.DateTimeField()),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="billing.billingaccount",
+                    ),
+                ),
+                (
+                    "region",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="resources.region",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("account", "hour", "region", "disk_size"),
+                        name="hourlyusage_unique",
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="UsageEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("time", models.DateTimeField(default=django.utils.timezone.now)),
+                ("machine", models.UUIDField()),
+                (
+                    "kind",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "Created"),
+                            (2, "Started"),
+                            (3, "Stopped"),
+                            (4, "Resized"),
+                            (5, "Moved"),
+                            (6, "Deleted"),
+                        ]
+                    ),
+                ),
+                ("running", models.BooleanField()),
+                ("disk_size", models.PositiveSmallIntegerField()),
+                (
+                    "region",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="resources.region",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.BrinIndex(
+                        fields=["time"], name="usageevent_time_brin"
+                    )
+                ],
+            },
+        ),
+        # machines created before metering are metered from now on
+        migrations.RunSQL(
+            """
+            INSERT INTO billing_usageevent
+                (time, machine, user_id, region_id, kind, running, disk_size)
+            SELECT now(), _id, user_id, region_id, 1, state = 'running',
+                disk_size::smallint
+            FROM resources_virtualmachine
+            WHERE user_id IS NOT NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
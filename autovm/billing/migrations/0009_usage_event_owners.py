@@ -0,0 +1,52 @@
+# Generated by Django 5.1.15 on 2026-10-19 20:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("billing", "0008_usage_metering"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usagecheckpoint",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="usageevent",
+            name="kind",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (1, "Created"),
+                    (2, "Started"),
+                    (3, "Stopped"),
+                    (4, "Resized"),
+                    (5, "Moved"),
+                    (6, "Deleted"),
+                    (7, "Assigned"),
+                ]
+            ),
+        ),
+        migrations.AlterField(
+            model_name="usageevent",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -1,6 +1,8 @@
 import uuid
 
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
+from django.utils import timezone
 
 from autovm.users.models import User
 
@@ -43,6 +45,12 @@ class RatePlan(CommonBaseModel):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     vm_limit = models.IntegerField(default=2)
     backup_limit = models.IntegerField(default=2)
+    # backups kept for each machine by the retention job, the newest of each
+    # of the last keep_daily days, keep_weekly weeks and keep_monthly months,
+    # see autovm.resources.backups
+    keep_daily = models.PositiveIntegerField(default=7)
+    keep_weekly = models.PositiveIntegerField(default=4)
+    keep_monthly = models.PositiveIntegerField(default=6)
 
     def __str__(self) -> str:
         return self.plan
@@ -56,6 +64,13 @@ class BillingAccount(CommonBaseModel):
     user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2, default=200)
 
+    class Meta(CommonBaseModel.Meta):
+        """
+        Accounts are searched by amount
+        """
+
+        indexes = [models.Index(fields=["amount"], name="billingaccount_amount_idx")]
+
     def __str__(self):
         return f"{self.user}: {self.amount}"
 
@@ -103,5 +118,186 @@ class Transaction(CommonBaseModel):
     description = models.CharField(max_length=255, null=True, blank=True)
     status = models.CharField(max_length=15, choices=STATUS, default="processing")
 
+    class Meta(CommonBaseModel.Meta):
+        """
+        Transactions are searched by amount
+        """
+
+        indexes = [models.Index(fields=["amount"], name="transaction_amount_idx")]
+
     def __str__(self):
         return f"{self.account}:{self.get_status_display()}"
+
+
+class UsageEvent(models.Model):
+    """
+    A change of what a virtual machine is metered for, appended as it
+    happens and kept compact: no UUID key, no foreign key constraints, so
+    that events outlive the machines, users and regions they refer to. Each
+    event holds what the machine is metered for from then on, see metering.
+    """
+
+    CREATED = 1
+    STARTED = 2
+    STOPPED = 3
+    RESIZED = 4
+    MOVED = 5
+    DELETED = 6
+    ASSIGNED = 7
+    KIND_CHOICES = (
+        (CREATED, "Created"),
+        (STARTED, "Started"),
+        (STOPPED, "Stopped"),
+        (RESIZED, "Resized"),
+        (MOVED, "Moved"),
+        (DELETED, "Deleted"),
+        (ASSIGNED, "Assigned"),
+    )
+
+    time = models.DateTimeField(default=timezone.now)
+    machine = models.UUIDField()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    region = models.ForeignKey(
+        "resources.Region",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    running = models.BooleanField()
+    disk_size = models.PositiveSmallIntegerField()
+
+    class Meta:
+        """
+        Events are read by time range only, in insertion order
+        """
+
+        indexes = [BrinIndex(fields=["time"], name="usageevent_time_brin")]
+
+    def __str__(self):
+        return f"{self.machine} {self.get_kind_display()} at {self.time}"
+
+
+class UsageCheckpoint(models.Model):
+    """
+    What each existing machine was metered for at the hourly watermark, where
+    the next rollup picks up from
+    """
+
+    machine = models.UUIDField(primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    region = models.ForeignKey(
+        "resources.Region",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    running = models.BooleanField()
+    disk_size = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return str(self.machine)
+
+
+class BaseUsage(models.Model):
+    """
+    Seconds the machines of an account were running and provisioned in a
+    region at a storage size, over a period
+    """
+
+    account = models.ForeignKey(
+        BillingAccount,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    region = models.ForeignKey(
+        "resources.Region",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    disk_size = models.PositiveSmallIntegerField()
+    running_seconds = models.BigIntegerField(default=0)
+    provisioned_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        """
+        Errata for usage rollups
+        """
+
+        abstract = True
+
+
+class HourlyUsage(BaseUsage):
+    """
+    Usage per hour, rolled up from the events
+    """
+
+    hour = models.DateTimeField()
+
+    class Meta(BaseUsage.Meta):
+        """
+        An hour is rolled up once per account, region and storage size
+        """
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "hour", "region", "disk_size"],
+                name="hourlyusage_unique",
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.account}: {self.hour}"
+
+
+class DailyUsage(BaseUsage):
+    """
+    Usage per day, rolled up from the hours
+    """
+
+    day = models.DateField()
+
+    class Meta(BaseUsage.Meta):
+        """
+        A day is rolled up once per account, region and storage size
+        """
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "day", "region", "disk_size"],
+                name="dailyusage_unique",
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.account}: {self.day}"
+
+
+class UsageWatermark(models.Model):
+    """
+    Time up to which a rollup is done
+    """
+
+    name = models.CharField(max_length=20, unique=True)
+    position = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} up to {self.position}"
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.resources.api.catalog import bump_catalog_version
+
+
+@receiver(post_save, sender=RatePlan)
+def touch_plan_subscriptions(sender, instance, created, **kwargs):
+    """
+    Plans are nested in the payload of their subscriptions, so touching the
+    subscriptions invalidates their ETags
+    """
+    if not created:
+        Subscription.objects.filter(plan=instance).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=RatePlan)
+@receiver(post_delete, sender=RatePlan)
+def invalidate_catalog(sender, instance, **kwargs):
+    """
+    Invalidate the cached catalog once the change is committed
+    """
+    transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,16 @@
+import logging
+
+from autovm.billing import metering
+from config import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task()
+def roll_up_usage():
+    """
+    Aggregate the usage events into hourly and daily rollups, see
+    autovm.billing.metering
+    """
+    hours, days = metering.roll_up_usage()
+    logger.info(f"Rolled up {hours} hours and {days} days of usage")
@@ -0,0 +1,260 @@
+import uuid
+from datetime import UTC
+from datetime import date
+from datetime import datetime
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from autovm.billing.metering import roll_up_days
+from autovm.billing.metering import roll_up_hours
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import DailyUsage
+from autovm.billing.models import HourlyUsage
+from autovm.billing.models import UsageEvent
+from autovm.resources.lifecycle import begin
+from autovm.resources.lifecycle import perform
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.users.models import User
+
+
+@pytest.fixture
+def customer(customer):
+    BillingAccount.objects.create(user=customer)
+    return customer
+
+
+@pytest.fixture
+def region(db):
+    return Region.objects.create(name="Eu West")
+
+
+def at(day, hour, minute=0):
+    return datetime(2026, 1, day, hour, minute, tzinfo=UTC)
+
+
+def record(machine, user, region, kind, moment, *, running=False, disk_size=200):
+    UsageEvent.objects.create(
+        time=moment,
+        machine=machine,
+        user=user,
+        region=region,
+        kind=kind,
+        running=running,
+        disk_size=disk_size,
+    )
+
+
+def record_lifecycle(user, region):
+    """
+    A machine created at 10:15, started at 10:45, stopped at 12:30 and
+    deleted at 13:00.
+    """
+    machine = uuid.uuid4()
+    record(machine, user, region, UsageEvent.CREATED, at(1, 10, 15))
+    record(machine, user, region, UsageEvent.STARTED, at(1, 10, 45), running=True)
+    record(machine, user, region, UsageEvent.STOPPED, at(1, 12, 30))
+    record(machine, user, region, UsageEvent.DELETED, at(1, 13))
+
+
+def hours():
+    return list(
+        HourlyUsage.objects.order_by("hour").values_list(
+            "hour",
+            "running_seconds",
+            "provisioned_seconds",
+        ),
+    )
+
+
+@pytest.mark.django_db
+class TestRollups:
+    def test_events_are_rolled_up_per_hour(self, customer, region):
+        record_lifecycle(customer, region)
+
+        assert roll_up_hours(at(1, 14, 10)) == 4
+
+        assert hours() == [
+            (at(1, 10), 900, 2700),
+            (at(1, 11), 3600, 3600),
+            (at(1, 12), 1800, 3600),
+        ]
+
+    def test_rollups_are_incremental(self, customer, region):
+        machine = uuid.uuid4()
+        record(machine, customer, region, UsageEvent.STARTED, at(1, 10), running=True)
+        roll_up_hours(at(1, 12, 10))
+        record(
+            machine,
+            customer,
+            region,
+            UsageEvent.RESIZED,
+            at(1, 12, 30),
+            disk_size=400,
+        )
+
+        assert roll_up_hours(at(1, 12, 20)) == 0
+        assert roll_up_hours(at(1, 14, 10)) == 2
+
+        assert list(
+            HourlyUsage.objects.order_by("hour", "disk_size").values_list(
+                "hour",
+                "disk_size",
+                "provisioned_seconds",
+            ),
+        ) == [
+            (at(1, 10), 200, 3600),
+            (at(1, 11), 200, 3600),
+            (at(1, 12), 200, 1800),
+            (at(1, 12), 400, 1800),
+            (at(1, 13), 400, 3600),
+        ]
+
+    def test_late_hours_wait_for_the_delay(self, customer, region, settings):
+        settings.METERING_DELAY = 15 * 60
+        record_lifecycle(customer, region)
+
+        roll_up_hours(at(1, 13, 10))
+
+        assert [hour for hour, _, _ in hours()] == [at(1, 10), at(1, 11)]
+
+    def test_complete_days_are_rolled_up(self, customer, region):
+        machine = uuid.uuid4()
+        record(machine, customer, region, UsageEvent.STARTED, at(1, 22), running=True)
+        roll_up_hours(at(2, 1, 10))
+
+        assert roll_up_days() == 1
+        assert roll_up_days() == 0
+
+        daily = DailyUsage.objects.get()
+        assert (daily.day, daily.running_seconds) == (date(2026, 1, 1), 7200)
+
+    def test_machines_of_users_without_accounts_are_left_out(self, region):
+        user = User.objects.create_user(email="admin@mail.com", password="password")
+        record_lifecycle(user, region)
+
+        roll_up_hours(at(1, 14, 10))
+
+        assert not HourlyUsage.objects.exists()
+
+
+@pytest.mark.django_db
+class TestEvents:
+    def events(self, pk):
+        return list(
+            UsageEvent.objects.filter(machine=pk)
+            .order_by("id")
+            .values_list("kind", "running", "disk_size"),
+        )
+
+    def test_changes_of_machines_are_recorded(self, customer, region):
+        machine = VirtualMachine.objects.create(user=customer, region=region)
+        perform("provision", [machine.pk], customer.pk)
+        machine = VirtualMachine.objects.get(pk=machine.pk)
+        machine.disk_size = "400"
+        machine.save()
+        perform("stop", begin("stop", VirtualMachine.objects.all()), customer.pk)
+        pk = machine.pk
+        machine.delete()
+
+        assert self.events(pk) == [
+            (UsageEvent.CREATED, False, 200),
+            (UsageEvent.STARTED, True, 200),
+            (UsageEvent.RESIZED, True, 400),
+            (UsageEvent.STOPPED, False, 400),
+            (UsageEvent.DELETED, False, 400),
+        ]
+
+    def test_assigned_machines_are_metered_for_their_new_owner(
+        self,
+        customer,
+        region,
+    ):
+        admin = User.objects.create_user(
+            email="admin@mail.com",
+            password="password",
+            role="admin",
+        )
+        machine = VirtualMachine.objects.create(user=admin, region=region)
+        UsageEvent.objects.update(time=at(1, 10))
+        # as the assign action does
+        machine = VirtualMachine.objects.get(pk=machine.pk)
+        machine.user = customer
+        machine.save()
+        UsageEvent.objects.filter(kind=UsageEvent.ASSIGNED).update(time=at(1, 11))
+
+        roll_up_hours(at(1, 12, 10))
+
+        assert list(
+            UsageEvent.objects.order_by("id").values_list("kind", "user"),
+        ) == [(UsageEvent.CREATED, admin.pk), (UsageEvent.ASSIGNED, customer.pk)]
+        assert hours() == [(at(1, 11), 0, 3600)]
+
+    def test_unassigned_machines_are_no_longer_metered(self, customer, region):
+        machine = VirtualMachine.objects.create(user=customer, region=region)
+        UsageEvent.objects.update(time=at(1, 10))
+        machine.user = None
+        machine.save()
+        UsageEvent.objects.filter(kind=UsageEvent.ASSIGNED).update(time=at(1, 11))
+
+        roll_up_hours(at(1, 13, 10))
+
+        assert hours() == [(at(1, 10), 0, 3600)]
+
+
+@pytest.mark.django_db
+class TestUsageEndpoints:
+    @pytest.fixture
+    def client(self, customer):
+        client = APIClient()
+        client.force_authenticate(user=customer)
+        return client
+
+    def test_usage(self, client, customer, region, query_budgets):
+        record_lifecycle(customer, region)
+        roll_up_hours(at(2, 1))
+
+        response = client.get(
+            reverse("api:billingaccount-usage"),
+            {"start": "2026-01-01", "end": "2026-01-02", "period": "hour"},
+        )
+
+        assert response.status_code == 200
+        assert [row["running_hours"] for row in response.json()["results"]] == [
+            0.25,
+            1,
+            0.5,
+        ]
+
+    def test_invoice(self, client, customer, region, query_budgets):
+        record_lifecycle(customer, region)
+        roll_up_hours(at(2, 1))
+        roll_up_days()
+
+        response = client.get(
+            reverse("api:billingaccount-invoice"),
+            {"month": "2026-01"},
+        )
+
+        body = response.json()
+        assert body["through"] == "2026-01-02"
+        assert body["lines"] == [
+            {
+                "region": str(region.pk),
+                "disk_size": "200",
+                "running_hours": 1.75,
+                "provisioned_hours": 2.75,
+                "amount": 0.02,
+            },
+        ]
+        assert body["total"] == 0.02
+
+    def test_usage_periods_are_bounded(self, client):
+        response = client.get(
+            reverse("api:billingaccount-usage"),
+            {"start": "2026-01-01", "end": "2026-03-01", "period": "hour"},
+        )
+
+        assert response.status_code == 400
@@ -1,5 +1,16 @@
+import fakeredis
 import pytest
+from rest_framework.test import APIClient
 
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.middleware.budgets import query_budget_checked
+from autovm.resources import jobs
+from autovm.resources import placement
+from autovm.resources.api import catalog
+from autovm.resources.api import throttles
+from autovm.users import tasks as user_tasks
 from autovm.users.models import User
 from autovm.users.tests.factories import UserFactory
 
@@ -7,8 +18,127 @@ from autovm.users.tests.factories import UserFactory
 @pytest.fixture(autouse=True)
 def _media_storage(settings, tmpdir) -> None:
     settings.MEDIA_ROOT = tmpdir.strpath
+    settings.BACKUP_STORE = {
+        "BACKEND": "autovm.resources.backup_store.FileSystemChunkStore",
+        "OPTIONS": {"location": tmpdir.join("backups").strpath},
+    }
+
+
+@pytest.fixture(autouse=True)
+def throttle_redis(monkeypatch) -> fakeredis.FakeRedis:
+    client = fakeredis.FakeRedis()
+    script = client.register_script(throttles.TOKEN_BUCKET_SCRIPT)
+    monkeypatch.setattr(throttles, "get_token_bucket", lambda: script)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def catalog_redis(monkeypatch) -> fakeredis.FakeRedis:
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(catalog, "get_redis", lambda: client)
+    monkeypatch.setattr(catalog, "local_catalog", catalog.LocalCatalog())
+    return client
+
+
+@pytest.fixture(autouse=True)
+def jobs_redis(monkeypatch) -> fakeredis.FakeRedis:
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(jobs, "get_redis", lambda: client)
+    monkeypatch.setattr(
+        jobs,
+        "get_async_redis",
+        lambda: fakeredis.FakeAsyncRedis(server=server),
+    )
+    return client
+
+
+@pytest.fixture(autouse=True)
+def mail_redis(monkeypatch) -> fakeredis.FakeRedis:
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(user_tasks, "get_redis", lambda: client)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def placement_index() -> placement.PlacementIndex:
+    # hosts of earlier tests were rolled back, start from an empty index
+    placement.get_placement_index.cache_clear()
+    yield placement.get_placement_index()
+    placement.get_placement_index.cache_clear()
+
+
+@pytest.fixture
+def _eager_celery(settings) -> None:
+    settings.CELERY_TASK_ALWAYS_EAGER = True
 
 
 @pytest.fixture
 def user(db) -> User:
     return UserFactory()
+
+
+@pytest.fixture
+def admin(db) -> User:
+    return User.objects.create_user(
+        email="admin@mail.com",
+        password="password",
+        role="admin",
+    )
+
+
+@pytest.fixture
+def customer(db) -> User:
+    return User.objects.create_user(email="customer@mail.com", password="password")
+
+
+@pytest.fixture
+def subscribed_customer(customer) -> User:
+    """
+    The customer with a billing account subscribed to a plan of 3 machines with
+    2 backups each.
+    """
+    plan = RatePlan.objects.create(plan="gold", price=800, vm_limit=3, backup_limit=2)
+    account = BillingAccount.objects.create(user=customer, amount=0)
+    Subscription.objects.create(account=account, plan=plan)
+    return customer
+
+
+@pytest.fixture
+def api_user(admin) -> User:
+    """
+    The user api_client is authenticated as. Override it to call the API as
+    someone else.
+    """
+    return admin
+
+
+@pytest.fixture
+def api_client(api_user) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=api_user)
+    return client
+
+
+@pytest.fixture
+def query_budgets(settings) -> list:
+    """
+    Fail the test if one of its requests goes to a view that declares no
+    query budget or runs more queries than it. Yields the check of each
+    request.
+    """
+    # report every request over budget rather than stop at the first
+    settings.QUERY_BUDGET_MODE = "log"
+    checks = []
+
+    def record(sender, request, check, **kwargs):
+        checks.append(check)
+
+    query_budget_checked.connect(record)
+    yield checks
+    query_budget_checked.disconnect(record)
+
+    unbudgeted = sorted({check.view for check in checks if check.budget is None})
+    assert not unbudgeted, f"no query budget declared for {unbudgeted}"
+    exceeded = [check for check in checks if check.exceeded]
+    assert not exceeded, f"requests over their query budget: {exceeded}"
@@ -0,0 +1,143 @@
+"""
+Query budgets.
+
+Views declare the most queries a request to them may run, either with the
+``query_budget`` decorator on a handler or action, or for actions they
+inherit, with a ``query_budgets`` mapping of action names to budgets::
+
+    class VirtualMachineViewSet(ModelViewSet):
+        query_budgets = {"list": 6, "retrieve": 5}
+
+        @query_budget(8)
+        def create(self, request, *args, **kwargs): ...
+
+QueryBudgetMiddleware compares the queries counted by RequestMetricsMiddleware
+with the budget of the view that handled the request. Depending on
+``QUERY_BUDGET_MODE``, a request over budget is logged or raises
+QueryBudgetExceeded, which fails the test that made it.
+"""
+
+import logging
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import Signal
+
+from autovm.middleware.instrumentation import current_metrics
+from autovm.middleware.instrumentation import get_view_name
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "log", "raise")
+
+# sent with the QueryBudgetCheck of every request checked
+query_budget_checked = Signal()
+
+
+class QueryBudgetExceeded(Exception):  # noqa: N818
+    """
+    A request ran more queries than its view's budget.
+    """
+
+
+@dataclass(frozen=True)
+class QueryBudgetCheck:
+    view: str
+    queries: int
+    budget: int | None
+
+    @property
+    def exceeded(self):
+        return self.budget is not None and self.queries > self.budget
+
+
+def query_budget(queries):
+    """
+    Declare the most queries a request to the decorated view handler or
+    viewset action may run.
+    """
+
+    def decorator(handler):
+        handler.query_budget = queries
+        return handler
+
+    return decorator
+
+
+def get_query_budget(request):
+    """
+    Budget of the view that handled a request: the one its handler was
+    decorated with, else the one its viewset declares for the action, else
+    ``QUERY_BUDGET_DEFAULT``.
+    """
+    match = getattr(request, "resolver_match", None)
+    view = match and match.func
+    view_class = getattr(view, "cls", None) or getattr(view, "view_class", None)
+    if view_class is None:
+        return settings.QUERY_BUDGET_DEFAULT
+
+    method = request.method.lower()
+    action = (getattr(view, "actions", None) or {}).get(method, method)
+    handler = getattr(view_class, action, None)
+    budget = getattr(handler, "query_budget", None)
+    if budget is None:
+        budget = getattr(view_class, "query_budgets", {}).get(action)
+    if budget is None:
+        return settings.QUERY_BUDGET_DEFAULT
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Enforce query budgets, see the module docstring. Goes right after
+    RequestMetricsMiddleware, whose query count it reads.
+    Async capable so that ASGI requests don't hop onto a thread for it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.QUERY_BUDGET_MODE not in MODES:
+            msg = f"QUERY_BUDGET_MODE must be one of {', '.join(MODES)}"
+            raise ImproperlyConfigured(msg)
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        metrics = current_metrics.get()
+        if metrics is None or settings.QUERY_BUDGET_MODE == "off":
+            return response
+
+        check = QueryBudgetCheck(
+            view=get_view_name(request),
+            queries=metrics.queries,
+            budget=get_query_budget(request),
+        )
+        query_budget_checked.send(sender=self.__class__, request=request, check=check)
+        if not check.exceeded:
+            return response
+
+        msg = (
+            f"{request.method} {request.path} ran {check.queries} queries, "
+            f"the budget of {check.view} is {check.budget}"
+        )
+        if settings.QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(msg)
+        logger.warning(msg)
+        return response
@@ -0,0 +1,185 @@
+import re
+import zlib
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# JSON, the OpenAPI schema and other text, anything else is most likely
+# compressed already
+COMPRESSIBLE_TYPES = re.compile(
+    r"^(text/|application/((.+\+)?(json|xml|yaml)|javascript|vnd\.oai\.openapi))",
+)
+
+
+class GzipEncoder:
+    """
+    Incremental gzip compression.
+    """
+
+    name = "gzip"
+
+    def __init__(self, level=6):
+        # wbits 31 writes the gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        """
+        Output everything compressed so far, so a chunk of a stream can be
+        decompressed as soon as it arrives.
+        """
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliEncoder:
+    """
+    Incremental brotli compression. Quality 4 compresses JSON better than
+    gzip at a similar CPU cost, higher qualities are meant for static files.
+    """
+
+    name = "br"
+
+    def __init__(self, quality=4):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+# in order of preference
+ENCODERS = [BrotliEncoder, GzipEncoder] if brotli else [GzipEncoder]
+
+
+def negotiate(accept_encoding):
+    """
+    The encoder to use for an Accept-Encoding header: the one with the
+    highest quality value, the first in ENCODERS on a tie, or None.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    default = qualities.get("*", 0.0)
+    chosen, best = None, 0.0
+    for encoder in ENCODERS:
+        quality = qualities.get(encoder.name, default)
+        if quality > best:
+            chosen, best = encoder, quality
+    return chosen
+
+
+def compress_stream(chunks, encoder):
+    for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+async def acompress_stream(chunks, encoder):
+    async for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+class APICompressionMiddleware:
+    """
+    Compress API responses with brotli or gzip, whichever the client
+    prefers, so that payloads are compressed where no proxy does it.
+
+    Responses shorter than ``API_COMPRESSION_MIN_SIZE`` bytes, already
+    encoded or of a type that doesn't compress well are left alone.
+    Streaming responses are compressed chunk by chunk as they are sent.
+    Async capable so that ASGI requests don't hop onto a thread for it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def is_compressible(self, response):
+        if response.has_header("Content-Encoding"):
+            return False
+        if (
+            not response.streaming
+            and len(response.content) < settings.API_COMPRESSION_MIN_SIZE
+        ):
+            return False
+        return bool(COMPRESSIBLE_TYPES.match(response.get("Content-Type", "")))
+
+    def process_response(self, request, response):
+        if not request.path.startswith("/api/") or not self.is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoder_class = negotiate(request.headers.get("Accept-Encoding", ""))
+        if encoder_class is None:
+            return response
+
+        if response.streaming:
+            stream = acompress_stream if response.is_async else compress_stream
+            response.streaming_content = stream(
+                response.streaming_content,
+                encoder_class(),
+            )
+            # the compressed size is only known once the stream is sent
+            del response.headers["Content-Length"]
+        else:
+            encoder = encoder_class()
+            content = encoder.compress(response.content) + encoder.finish()
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        # the representation changed, so a strong ETag must be made weak,
+        # If-None-Match still matches it
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = f"W/{etag}"
+        response.headers["Content-Encoding"] = encoder_class.name
+        return response
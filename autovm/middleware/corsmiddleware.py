@@ -1,16 +1,34 @@
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
 from django import http
 
 
 class CorsMiddleware:
     """
-    Custom middleware
+    Custom middleware.
+    Async capable so that ASGI requests don't hop onto a thread for it.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
         if (
             request.method == "OPTIONS"
             and "access-control-request-method" in request.headers
@@ -0,0 +1,326 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware records, for every request, the number and total
+time of database queries, the time spent serializing, catalog cache hits and
+misses and the Celery tasks enqueued. They are sent back in a Server-Timing
+header, logged as structured fields of the ``autovm.requests`` logger and
+aggregated per viewset action into the Prometheus metrics served at
+/metrics.
+"""
+
+import hmac
+import logging
+import os
+import time
+from collections import Counter as TaskCounter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from dataclasses import field
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from celery.signals import before_task_publish
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from prometheus_client import multiprocess
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger("autovm.requests")
+
+REGISTRY = CollectorRegistry(auto_describe=True)
+REQUESTS = Counter(
+    "autovm_http_requests",
+    "Requests handled",
+    ["view", "method", "status"],
+    registry=REGISTRY,
+)
+REQUEST_SECONDS = Histogram(
+    "autovm_http_request_duration_seconds",
+    "Time taken to handle requests",
+    ["view"],
+    registry=REGISTRY,
+)
+DB_QUERIES = Histogram(
+    "autovm_db_queries_per_request",
+    "Database queries run by each request",
+    ["view"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, float("inf")),
+    registry=REGISTRY,
+)
+DB_SECONDS = Counter(
+    "autovm_db_duration_seconds",
+    "Time spent running database queries",
+    ["view"],
+    registry=REGISTRY,
+)
+SERIALIZER_SECONDS = Counter(
+    "autovm_serializer_duration_seconds",
+    "Time spent serializing, including the queries serializers run",
+    ["view"],
+    registry=REGISTRY,
+)
+CACHE_LOOKUPS = Counter(
+    "autovm_cache_lookups",
+    "Catalog cache lookups",
+    ["view", "result"],
+    registry=REGISTRY,
+)
+TASKS_ENQUEUED = Counter(
+    "autovm_celery_tasks_enqueued",
+    "Celery tasks enqueued",
+    ["view", "task"],
+    registry=REGISTRY,
+)
+
+SAVEPOINT_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Measurements of the request being handled.
+    """
+
+    queries: int = 0
+    db_time: float = 0.0
+    serializer_time: float = 0.0
+    # nested serializers are timed as part of the outermost one
+    serializer_depth: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    tasks: TaskCounter = field(default_factory=TaskCounter)
+
+
+# copied into the threads sync views run in under ASGI, so the hooks below
+# record into the metrics of the request they run for
+current_metrics: ContextVar[RequestMetrics | None] = ContextVar(
+    "current_metrics",
+    default=None,
+)
+
+
+def is_savepoint(sql):
+    return isinstance(sql, str) and sql.startswith(SAVEPOINT_STATEMENTS)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper timing the queries run while handling a request.
+    Savepoints are timed but not counted, so a request counts as many
+    queries in tests, where the transaction of ATOMIC_REQUESTS is a
+    savepoint, as in production.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if not is_savepoint(sql):
+            metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """
+    Connections are per thread, so the recorder is installed on each as it
+    is opened rather than around the request with ``execute_wrapper``.
+    """
+    install_query_recorder(connection)
+
+
+@receiver(before_task_publish)
+def task_enqueued(sender, **kwargs):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.tasks[sender] += 1
+
+
+def record_cache_lookup(*, hit):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def instrument_serializers():
+    """
+    Time the evaluation of ``serializer.data``, which is where DRF turns
+    instances into primitives. DRF has no hook for it, so the property is
+    wrapped.
+    """
+    data = BaseSerializer.data
+    if getattr(data.fget, "instrumented", False):
+        return
+
+    def timed_data(self):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.serializer_depth:
+            return data.fget(self)
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            metrics.serializer_depth -= 1
+
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+
+def get_view_name(request):
+    """
+    Label of the view that handled a request, ``<viewset>.<action>`` for
+    viewsets.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    view = match.func
+    view_class = getattr(view, "cls", None) or getattr(view, "view_class", None)
+    if view_class is None:
+        return match.view_name
+    method = request.method.lower()
+    action = (getattr(view, "actions", None) or {}).get(method, method)
+    return f"{view_class.__name__}.{action}"
+
+
+def format_server_timing(metrics, duration):
+    return ", ".join(
+        [
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f"serialize;dur={metrics.serializer_time * 1000:.1f}",
+            f'cache;desc="hits={metrics.cache_hits} misses={metrics.cache_misses}"',
+            f'celery;desc="{metrics.tasks.total()} tasks"',
+            f"total;dur={duration * 1000:.1f}",
+        ],
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure each request, see the module docstring. Goes first so that the
+    total covers the other middleware.
+    Async capable so that ASGI requests don't hop onto a thread for it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        instrument_serializers()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # connections opened before the signal receiver was connected
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.process_response(
+            request,
+            response,
+            metrics,
+            time.perf_counter() - started,
+        )
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.process_response(
+            request,
+            response,
+            metrics,
+            time.perf_counter() - started,
+        )
+
+    def process_response(self, request, response, metrics, duration):
+        view = get_view_name(request)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        REQUEST_SECONDS.labels(view).observe(duration)
+        DB_QUERIES.labels(view).observe(metrics.queries)
+        DB_SECONDS.labels(view).inc(metrics.db_time)
+        SERIALIZER_SECONDS.labels(view).inc(metrics.serializer_time)
+        if metrics.cache_hits:
+            CACHE_LOOKUPS.labels(view, "hit").inc(metrics.cache_hits)
+        if metrics.cache_misses:
+            CACHE_LOOKUPS.labels(view, "miss").inc(metrics.cache_misses)
+        for task, count in metrics.tasks.items():
+            TASKS_ENQUEUED.labels(view, task).inc(count)
+
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = format_server_timing(metrics, duration)
+        logger.info(
+            "%s %s %s",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                "view": view,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 1),
+                "db_queries": metrics.queries,
+                "db_ms": round(metrics.db_time * 1000, 1),
+                "serializer_ms": round(metrics.serializer_time * 1000, 1),
+                "cache_hits": metrics.cache_hits,
+                "cache_misses": metrics.cache_misses,
+                "tasks_enqueued": metrics.tasks.total(),
+            },
+        )
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics, for scrapers sending METRICS_TOKEN and not served
+    without one. With several worker processes, set PROMETHEUS_MULTIPROC_DIR
+    so that every worker's metrics are collected.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    # compared as bytes, strings with non-ASCII characters can't be
+    authorization = request.headers.get("Authorization", "").encode()
+    if not hmac.compare_digest(authorization, f"Bearer {token}".encode()):
+        return HttpResponse(status=401)
+
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
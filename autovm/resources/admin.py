@@ -1,6 +1,8 @@
 from django.contrib import admin
 
 from autovm.resources.models import Backup
+from autovm.resources.models import Host
+from autovm.resources.models import Job
 from autovm.resources.models import Notification
 from autovm.resources.models import OperatingSystem
 from autovm.resources.models import OperatingSystemVersion
@@ -15,12 +17,23 @@ class VirtualMachineAdmin(admin.ModelAdmin):
     Virtual machine admin panel
     """
 
-    list_display = ["name", "user", "is_active", "created", "updated"]
+    list_display = ["name", "user", "is_active", "state", "host", "created", "updated"]
     search_fields = ["name", "user__name"]
-    list_filter = ["user", "is_active", "region"]
+    list_filter = ["user", "is_active", "state", "region"]
     # ordering = ["id"]
 
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """
+    Job admin panel
+    """
+
+    list_display = ["action", "user", "status", "completed", "failed", "created"]
+    list_filter = ["action", "status"]
+    search_fields = ["user__name", "user__email"]
+
+
 @admin.register(VirtualMachineHistory)
 class VirtualMachineHistoryAdmin(admin.ModelAdmin):
     """
@@ -66,6 +79,17 @@ class RegionAdmin(admin.ModelAdmin):
     # ordering = ["id"]
 
 
+@admin.register(Host)
+class HostAdmin(admin.ModelAdmin):
+    """
+    Host admin panel
+    """
+
+    list_display = ["name", "region", "cpus", "used_cpus", "memory", "used_memory"]
+    search_fields = ["name"]
+    list_filter = ["region", "is_active"]
+
+
 @admin.register(Backup)
 class BackupAdmin(admin.ModelAdmin):
     """
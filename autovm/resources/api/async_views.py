@@ -0,0 +1,366 @@
+"""
+Async-native variants of the hot read endpoints.
+
+DRF views are sync, so under the ASGI server every request hops onto a worker
+thread. The views below authenticate and query with Django's async ORM on the
+event loop instead. They mirror the payloads, authentication errors and
+throttling of their DRF counterparts but do not support the search and
+filter query parameters.
+"""
+
+import base64
+from datetime import datetime
+from typing import cast
+
+from asgiref.sync import sync_to_async
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import Q
+from django.db.models import aprefetch_related_objects
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from autovm.resources.api.serializers import NotificationSerializer
+from autovm.resources.api.serializers import VirtualMachineSerializer
+from autovm.resources.models import Notification
+from autovm.resources.models import VirtualMachine
+from autovm.users.models import Customer
+from autovm.users.models import Guest
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication reading the ``Authorization`` header or the dj-rest-auth
+    cookie, with the user lookup done through the async ORM.
+    """
+
+    async def aauthenticate(self, request):
+        """
+        Return the user for the request's token, or None if it carries none.
+        """
+        header = self.get_header(request)
+        if header is None:
+            raw_token = request.COOKIES.get(rest_auth_settings.JWT_AUTH_COOKIE)
+        else:
+            raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return await self.aauthenticate_token(raw_token)
+
+    async def aauthenticate_token(self, raw_token):
+        """
+        Return the user of a token, however it was sent.
+        """
+        validated_token = self.get_validated_token(raw_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            msg = "Token contained no recognizable user identification"
+            raise InvalidToken(msg) from exc
+
+        user = await self.user_model.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: user_id},
+        ).afirst()
+        if user is None:
+            msg = "User not found"
+            raise AuthenticationFailed(msg, code="user_not_found")
+        if not user.is_active:
+            msg = "User is inactive"
+            raise AuthenticationFailed(msg, code="user_inactive")
+        return user
+
+
+async def aauthenticate(request):
+    """
+    Authenticate a request the way the DRF authentication classes would:
+    session first, then DRF tokens, then JWT.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+
+    auth = request.headers.get("Authorization", "").split()
+    if len(auth) == 2 and auth[0] == "Token":  # noqa: PLR2004
+        tokens = Token._default_manager.select_related("user")
+        token = await tokens.filter(key=auth[1]).afirst()
+        if token is None or not token.user.is_active:
+            msg = "Invalid token."
+            raise AuthenticationFailed(msg)
+        return token.user
+
+    return await AsyncJWTAuthentication().aauthenticate(request)
+
+
+class AsyncAPIView(View):
+    """
+    Base class for read-only API views served natively on the event loop.
+    """
+
+    http_method_names = ["get", "options"]
+    # the classes the DRF views use
+    authentication_classes = APIView.authentication_classes
+    renderer_classes = APIView.renderer_classes
+    throttle_classes = APIView.throttle_classes
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        """
+        Opt out of ATOMIC_REQUESTS, which Django can't apply to async views.
+        The views only read, apart from single statement updates.
+        """
+        return transaction.non_atomic_requests(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Authenticate, check permissions and throttle before running the
+        handler, in the order DRF does.
+        """
+        try:
+            user = await aauthenticate(request)
+            if user is None:
+                raise NotAuthenticated
+            request.user = user
+            if not await self.has_permission(request):
+                raise PermissionDenied
+            await self.check_throttles(request)
+            # the handlers are coroutines, View.dispatch returns their call
+            return await super().dispatch(request, *args, **kwargs)  # type: ignore[misc]
+        except APIException as exc:
+            return self.handle_exception(request, exc)
+
+    async def check_throttles(self, request):
+        """
+        Draw from the same throttles as the DRF views, whose Redis calls are
+        made off the event loop. The throttles don't look at the view they
+        are handed, so this one stands in for a DRF view.
+        """
+        waits = []
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            allowed = await sync_to_async(
+                throttle.allow_request,
+                thread_sensitive=False,
+            )(request, self)  # type: ignore[arg-type]
+            if not allowed:
+                waits.append(throttle.wait())
+        if waits:
+            known = [wait for wait in waits if wait is not None]
+            raise Throttled(max(known) if known else None)
+
+    def handle_exception(self, request, exc):
+        """
+        Render an API error as DRF's APIView would: failed authentication is
+        401 with a challenge if the first authentication class has one, else
+        403, and throttled requests are told when to retry.
+        """
+        headers = {}
+        if isinstance(exc, NotAuthenticated | AuthenticationFailed):
+            authenticator = self.authentication_classes[0]()
+            challenge = authenticator.authenticate_header(request)
+            if challenge:
+                headers["WWW-Authenticate"] = challenge
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        if getattr(exc, "wait", None):
+            headers["Retry-After"] = str(int(exc.wait))
+        detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+        response = self.render(detail, status=exc.status_code)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    async def has_permission(self, request):
+        """
+        Any authenticated user is allowed by default.
+        """
+        return True
+
+    def render(self, data, status=status.HTTP_200_OK):
+        """
+        Render data with the same JSON renderer the DRF views use.
+        """
+        return HttpResponse(
+            self.renderer_classes[0]().render(data),
+            content_type="application/json",
+            status=status,
+        )
+
+
+class AsyncVirtualMachineMixin:
+    """
+    Shared queryset and serialization for the async virtual machine views.
+    """
+
+    async def has_permission(self, request):
+        """
+        Same rules as IsNotSuspendedCustomer for safe methods.
+        """
+        user = request.user
+        if user.role in ("admin", "staff", "guest"):
+            return True
+        return await Customer.objects.filter(user=user).aexists()
+
+    async def get_queryset(self, request):
+        """
+        Admins see every machine, guests their customer's machines and
+        customers their own.
+        """
+        user = request.user
+        queryset = VirtualMachine.objects.all()
+        if user.role == "admin":
+            return queryset
+        if user.role == "guest":
+            owner_id = (
+                await Guest.objects.filter(user=user)
+                .values_list(
+                    "customer__user_id",
+                    flat=True,
+                )
+                .afirst()
+            )
+            # guests of no customer see no machines, rather than unowned ones
+            if owner_id is None:
+                return queryset.none()
+            return queryset.filter(user_id=owner_id)
+        return queryset.filter(user=user)
+
+    async def serialize(self, machines):
+        """
+        Serialize machines with VirtualMachineSerializer, with their backups
+        and history prefetched in one query each, so that the serializer
+        runs on the event loop without querying.
+        """
+        await aprefetch_related_objects(machines, "backups", "history__user")
+        return VirtualMachineSerializer(machines, many=True).data
+
+
+class AsyncVirtualMachineListView(AsyncVirtualMachineMixin, AsyncAPIView):
+    """
+    Virtual machine list, paginated by creation date like the DRF viewset.
+    The cursor is the creation date and id of the last machine of the page,
+    so that machines created at the same time aren't skipped.
+    """
+
+    # PAGE_SIZE is set, the DRF viewset always paginates
+    page_size = cast(int, api_settings.PAGE_SIZE)
+    cursor_query_param = "cursor"
+
+    async def get(self, request):
+        queryset = (
+            (await self.get_queryset(request))
+            .select_related(
+                "user",
+                "region",
+                "operating_system_version__operating_system",
+            )
+            .order_by("-created", "-pk")
+        )
+
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            try:
+                position = base64.urlsafe_b64decode(cursor.encode()).decode()
+                timestamp, pk = position.split("|")
+                created = datetime.fromisoformat(timestamp)
+                queryset = queryset.filter(
+                    Q(created__lt=created) | Q(created=created, pk__lt=pk),
+                )
+            except (TypeError, ValueError, ValidationError):
+                return self.render(
+                    {"detail": "Invalid cursor"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+        machines = [machine async for machine in queryset[: self.page_size + 1]]
+        next_url = None
+        if len(machines) > self.page_size:
+            machines = machines[: self.page_size]
+            position = f"{machines[-1].created.isoformat()}|{machines[-1].pk}"
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                base64.urlsafe_b64encode(position.encode()).decode(),
+            )
+
+        return self.render(
+            {
+                "next": next_url,
+                "previous": None,
+                "results": await self.serialize(machines),
+            },
+        )
+
+
+class AsyncVirtualMachineDetailView(AsyncVirtualMachineMixin, AsyncAPIView):
+    """
+    A single virtual machine.
+    """
+
+    async def get(self, request, pk):
+        queryset = (await self.get_queryset(request)).select_related(
+            "user",
+            "region",
+            "operating_system_version__operating_system",
+        )
+        machine = await queryset.filter(pk=pk).afirst()
+        if machine is None:
+            return self.render(
+                {"detail": "No VirtualMachine matches the given query."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        data = await self.serialize([machine])
+        return self.render(data[0])
+
+
+class AsyncVirtualMachineStatisticsView(AsyncVirtualMachineMixin, AsyncAPIView):
+    """
+    Virtual machine statistics, counted in a single aggregate query.
+    """
+
+    async def get(self, request):
+        queryset = await self.get_queryset(request)
+        counts = await queryset.aaggregate(
+            total=Count("pk"),
+            active=Count("pk", filter=Q(is_active=True)),
+        )
+        return self.render(
+            {
+                "total": counts["total"],
+                "active": counts["active"],
+                "inactive": counts["total"] - counts["active"],
+            },
+        )
+
+
+class AsyncNotificationListView(AsyncAPIView):
+    """
+    Unread notifications of the current user, marked as read once listed.
+    """
+
+    async def get(self, request):
+        queryset = Notification.objects.filter(user=request.user, read=False)
+        notifications = NotificationSerializer(
+            [notification async for notification in queryset],
+            many=True,
+        ).data
+        if notifications:
+            # only mark what was listed, newer notifications stay unread
+            await Notification.objects.filter(
+                pk__in=[notification["_id"] for notification in notifications],
+            ).aupdate(read=True)
+        return self.render(notifications)
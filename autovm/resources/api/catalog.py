@@ -0,0 +1,163 @@
+import logging
+import time
+from functools import cache
+
+import redis
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from autovm.middleware.instrumentation import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Redis key of the catalog version, bumped whenever a region, operating
+# system, operating system version or rate plan is saved or deleted
+CATALOG_VERSION_KEY = "catalog:version"
+# responses cached per worker, past which the cache is emptied
+MAX_ENTRIES = 256
+
+
+@cache
+def get_redis():
+    """
+    Client of the Redis server holding the catalog version.
+    """
+    return redis.Redis.from_url(settings.CATALOG_REDIS_URL)
+
+
+def bump_catalog_version():
+    """
+    Invalidate the catalog cached by every worker.
+    """
+    try:
+        get_redis().incr(CATALOG_VERSION_KEY)
+    except redis.RedisError:
+        logger.exception("Catalog version not bumped, Redis is unavailable")
+    local_catalog.checked = None
+
+
+class LocalCatalog:
+    """
+    Catalog responses cached in the memory of this worker, along with the
+    catalog version they were rendered at.
+
+    The version is read from Redis at most once every ``CATALOG_CACHE_TTL``
+    seconds, so a change is picked up by every worker within that time.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.checked = None
+        self.entries = {}
+
+    def read_version(self):
+        """
+        The current catalog version. A missing key is seeded with the clock
+        rather than 0 so versions are not reused if Redis loses the key.
+        """
+        client = get_redis()
+        version = client.get(CATALOG_VERSION_KEY)
+        if version is None:
+            client.set(CATALOG_VERSION_KEY, time.time_ns(), nx=True)
+            version = client.get(CATALOG_VERSION_KEY)
+        return int(version)
+
+    def get_version(self):
+        """
+        The catalog version, or None if it can't be checked, in which case
+        the catalog must not be served from the cache.
+        """
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < settings.CATALOG_CACHE_TTL:
+            return self.version
+
+        try:
+            version = self.read_version()
+        except redis.RedisError:
+            logger.warning("Catalog cache skipped, Redis is unavailable", exc_info=True)
+            # bumps may be missed while Redis is down
+            self.version, self.checked = None, None
+            self.entries.clear()
+            return None
+
+        if version != self.version:
+            self.entries.clear()
+        self.version, self.checked = version, now
+        return version
+
+    def get(self, key, version):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1:]
+
+    def set(self, key, version, data, etag, last_modified):
+        if len(self.entries) >= MAX_ENTRIES:
+            self.entries.clear()
+        self.entries[key] = (version, data, etag, last_modified)
+
+
+local_catalog = LocalCatalog()
+
+
+class CatalogCacheMixin:
+    """
+    Serve list and detail responses of catalog viewsets from memory.
+
+    The catalog is read on every VM form render but changes a few times a
+    year, so each worker keeps the serialized responses and only checks the
+    catalog version in Redis, at most once every ``CATALOG_CACHE_TTL``
+    seconds. Saving or deleting a catalog object bumps the version once the
+    transaction commits, see the app signals. Bulk updates skip the signals
+    and must call ``bump_catalog_version`` themselves.
+
+    Goes before ``ConditionalGetMixin``, whose validators are cached along
+    with the data.
+    """
+
+    # the catalog is the same for every user
+    etag_per_user = False
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        """
+        The cached response for the request URL, rendered by the handler if
+        the catalog changed since it was cached.
+        """
+        version = local_catalog.get_version()
+        if version is None:
+            return handler(request, *args, **kwargs)
+
+        key = (type(self).__name__, request.build_absolute_uri())
+        entry = local_catalog.get(key, version)
+        record_cache_lookup(hit=entry is not None)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:  # noqa: PLR2004
+                local_catalog.set(
+                    key,
+                    version,
+                    response.data,
+                    response.get("ETag"),
+                    response.get("Last-Modified"),
+                )
+            return response
+
+        data, etag, last_modified = entry
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=parse_http_date_safe(last_modified),
+        )
+        response = Response(data) if not_modified is None else not_modified
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = last_modified
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(request, super().retrieve, *args, **kwargs)
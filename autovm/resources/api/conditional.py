@@ -0,0 +1,95 @@
+import hashlib
+
+from django.db.models import Count
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified validators for list and detail responses, so that
+    pollers sending If-None-Match or If-Modified-Since get a 304 without the
+    payload being serialized again.
+
+    Detail validators come from the object's ``updated`` timestamp. List
+    ETags come from the count and latest ``updated`` of the filtered
+    queryset, taken in a single aggregate query. Lists have no Last-Modified:
+    deleting an object doesn't move their latest ``updated``, so only the
+    count in the ETag tells. Changes to nested data must touch ``updated`` on
+    the object they are nested in.
+    """
+
+    # whether the queryset is scoped to the requesting user
+    etag_per_user = True
+
+    def get_etag(self, request, *parts):
+        """
+        Hash the parts identifying a representation. The user and the query
+        string are included since querysets are scoped to the user and
+        filtered or paginated by the query parameters.
+        """
+        user = request.user.pk if self.etag_per_user else None
+        digest = hashlib.md5(usedforsecurity=False)
+        for part in (user, request.get_full_path(), *parts):
+            digest.update(f"{part}\n".encode())
+        return quote_etag(digest.hexdigest())
+
+    def get_conditional_response(self, request, etag, last_modified):
+        """
+        A 304 response if the client's copy is still current, else None.
+        """
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=timestamp,
+        )
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        """
+        Add the validators to a response.
+        """
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fingerprint = queryset.aggregate(
+            count=Count("pk"),
+            last_modified=Max("updated"),
+        )
+        etag = self.get_etag(
+            request,
+            fingerprint["count"],
+            fingerprint["last_modified"],
+        )
+        not_modified = self.get_conditional_response(request, etag, None)
+        if not_modified is not None:
+            return not_modified
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        else:
+            serializer = self.get_serializer(queryset, many=True)
+            response = Response(serializer.data)
+        return self.set_validators(response, etag, None)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_etag(request, instance.pk, instance.updated)
+        not_modified = self.get_conditional_response(request, etag, instance.updated)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(instance)
+        return self.set_validators(Response(serializer.data), etag, instance.updated)
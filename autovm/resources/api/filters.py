@@ -0,0 +1,209 @@
+import operator
+import uuid
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from decimal import Decimal
+from decimal import InvalidOperation
+from functools import reduce
+
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import models
+from django.db.models import F
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.filters import SearchFilter
+from rest_framework.pagination import CursorPagination
+
+
+def parse_uuid(term):
+    """
+    The UUID a term names, if any.
+    """
+    try:
+        return uuid.UUID(term)
+    except ValueError:
+        return None
+
+
+def parse_integer(term):
+    """
+    The integer a term names, if any.
+    """
+    return int(term) if term.isdecimal() else None
+
+
+def parse_decimal(term):
+    """
+    The decimal number a term names, if any.
+    """
+    try:
+        value = Decimal(term)
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def parse_day(term):
+    """
+    Start of the day a ``YYYY-MM-DD`` term names, in the current timezone.
+    """
+    try:
+        day = parse_date(term)
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# how terms are turned into values of each type of field
+TERM_PARSERS = [
+    (models.UUIDField, parse_uuid),
+    (models.IntegerField, parse_integer),
+    (models.DecimalField | models.FloatField, parse_decimal),
+]
+
+
+class TypedSearchFilter(SearchFilter):
+    """
+    SearchFilter that looks each term up according to the type of the search
+    field instead of running ``icontains`` on every column.
+
+    - UUIDs, integers and decimals, including foreign keys, match exactly,
+      so the lookups are served by the primary key and foreign key indexes.
+    - Datetimes match every moment of the day a ``YYYY-MM-DD`` term names,
+      as a range on the column.
+    - Fields with choices match the choice a term names.
+    - Text fields are searched like SearchFilter does. Only list text
+      columns with a trigram or unique index.
+
+    Fields a term can't be a value of are left out of its lookups, so
+    ``?search=gold`` doesn't cast the amount column to text.
+    """
+
+    def get_field(self, queryset, search_field):
+        """
+        The model field a search field points to, following relations. For
+        a foreign key this is the field it references.
+        """
+        model = queryset.model
+        for part in search_field.split(LOOKUP_SEP):
+            field = model._meta.get_field(part)
+            if field.is_relation:
+                model = field.related_model
+        return field.target_field if field.is_relation else field
+
+    def get_term_lookups(self, search_field, field, term, queryset):
+        """
+        ORM lookups matching the term in a field, or None if the term can't
+        be a value of the field.
+        """
+        is_text = isinstance(field, models.CharField | models.TextField)
+        if search_field[0] in self.lookup_prefixes or (is_text and not field.choices):
+            return {self.construct_search(search_field, queryset): term}
+
+        if field.choices:
+            value = next(
+                (
+                    value
+                    for value, _ in field.flatchoices
+                    if str(value).lower() == term.lower()
+                ),
+                None,
+            )
+        elif isinstance(field, models.DateTimeField):
+            start = parse_day(term)
+            if start is None:
+                return None
+            return {
+                f"{search_field}__gte": start,
+                f"{search_field}__lt": start + timedelta(days=1),
+            }
+        else:
+            parse = next(
+                (parse for types, parse in TERM_PARSERS if isinstance(field, types)),
+                None,
+            )
+            value = parse(term) if parse else None
+        return None if value is None else {search_field: value}
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+
+        if not search_fields or not search_terms:
+            return queryset
+
+        fields = [
+            (search_field, self.get_field(queryset, search_field.lstrip("^=@$")))
+            for search_field in map(str, search_fields)
+        ]
+        conditions = []
+        for term in search_terms:
+            lookups = [
+                self.get_term_lookups(search_field, field, term, queryset)
+                for search_field, field in fields
+            ]
+            lookups = [Q(**lookup) for lookup in lookups if lookup is not None]
+            if not lookups:
+                # the term can't match any field
+                return queryset.none()
+            conditions.append(reduce(operator.or_, lookups))
+        return queryset.filter(*conditions)
+
+
+class VirtualMachineSearchFilter(SearchFilter):
+    """
+    Search virtual machines through their full-text search vector, falling
+    back to trigram similarity for misspelt names. Both are served by GIN
+    indexes instead of ``icontains`` scans across the joined tables.
+
+    Matches are annotated with ``search_rank`` and ordered by it.
+    """
+
+    def get_search_query(self, terms):
+        """
+        Prefix query matching every term, so partially typed words match.
+        """
+        lexemes = []
+        for term in terms:
+            # quotes and backslashes are the only characters with a meaning
+            # inside a quoted tsquery lexeme
+            lexeme = term.replace("'", "").replace("\\", "")
+            if lexeme:
+                lexemes.append(f"'{lexeme}':*")
+        if not lexemes:
+            return None
+        return SearchQuery(" & ".join(lexemes), search_type="raw", config="simple")
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        query = self.get_search_query(terms)
+        if query is None:
+            return queryset
+
+        text = " ".join(terms)
+        return (
+            queryset.filter(Q(search_vector=query) | Q(name__trigram_similar=text))
+            .annotate(
+                search_rank=SearchRank(F("search_vector"), query)
+                + TrigramSimilarity("name", text),
+            )
+            .order_by("-search_rank", "-created")
+        )
+
+
+class SearchRankCursorPagination(CursorPagination):
+    """
+    Cursor pagination that keeps search results in relevance order.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        if "search_rank" in queryset.query.annotations:
+            return ("-search_rank", "-created")
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from autovm.resources.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+# response headers worth replaying along with the body
+REPLAYED_HEADERS = ["Location"]
+
+
+def fingerprint(request):
+    """
+    Hash of what the request asks for, so a key reused for a different
+    request can be told apart from a retry.
+    """
+    payload = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(payload.encode())
+    return digest.hexdigest()
+
+
+def claim(request, key, request_fingerprint):
+    """
+    Return the stored key for the request, creating it if the key is new or
+    expired. ``stored.status_code`` is None when the caller got the claim and
+    has to run the view.
+
+    The key row is inserted with ON CONFLICT DO NOTHING. While the request
+    that inserted it hasn't committed, Postgres makes concurrent duplicates
+    wait on the unique index, so they only read the key once it holds the
+    response, or insert it themselves if the first request rolled back.
+    """
+    expires = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    new = IdempotencyKey(
+        user=request.user,
+        key=key,
+        fingerprint=request_fingerprint,
+        expires=expires,
+    )
+    IdempotencyKey.objects.bulk_create([new], ignore_conflicts=True)
+    stored = IdempotencyKey.objects.get(user=request.user, key=key)
+    if stored.pk == new.pk or stored.expires > timezone.now():
+        return stored
+
+    # take over the expired key, the row lock makes duplicates of this
+    # request wait here as well
+    taken = IdempotencyKey.objects.filter(
+        pk=stored.pk,
+        expires__lte=timezone.now(),
+    ).update(
+        fingerprint=request_fingerprint,
+        status_code=None,
+        body=None,
+        headers={},
+        expires=expires,
+    )
+    if taken:
+        return IdempotencyKey(
+            pk=stored.pk,
+            user=request.user,
+            key=key,
+            fingerprint=request_fingerprint,
+            expires=expires,
+        )
+    return IdempotencyKey.objects.get(pk=stored.pk)
+
+
+def idempotent(view):
+    """
+    Make a POST handler idempotent for clients sending an Idempotency-Key
+    header.
+
+    The first response for a key is stored and replayed for requests retried
+    with the same key, without running the view again. Responses of requests
+    that fail with an exception are rolled back with the key, so those can be
+    retried.
+    """
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response(
+                {"detail": f"{HEADER} must be at most 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        request_fingerprint = fingerprint(request)
+        with transaction.atomic():
+            stored = claim(request, key, request_fingerprint)
+            if stored.status_code is None:
+                response = view(self, request, *args, **kwargs)
+                IdempotencyKey.objects.filter(pk=stored.pk).update(
+                    status_code=response.status_code,
+                    body=response.data,
+                    headers={
+                        name: response[name]
+                        for name in REPLAYED_HEADERS
+                        if response.has_header(name)
+                    },
+                )
+                return response
+
+        if stored.fingerprint != request_fingerprint:
+            return Response(
+                {"detail": f"{HEADER} was already used for a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = Response(
+            stored.body,
+            status=stored.status_code,
+            headers=stored.headers,
+        )
+        response["Idempotent-Replayed"] = "true"
+        return response
+
+    return wrapper
@@ -58,3 +58,18 @@ class IsAdminOrReadOnly(BasePermission):
             or request.user.is_superuser
             or request.user.role == "admin"
         )
+
+
+class IsAdmin(BasePermission):
+    """
+    Permission class that grants access to admins only.
+    """
+
+    message = "You are not an admin"
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and (
+            request.user.is_staff
+            or request.user.is_superuser
+            or request.user.role == "admin"
+        )
@@ -0,0 +1,36 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# UUIDs and datetimes are serialized by orjson itself, with UTC as "Z" like
+# DRF's encoder does. Anything else, such as Decimal, lazy strings or
+# querysets, goes through DRF's encoder.
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+encode_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson, which serializes large VM and history
+    lists several times faster than the stdlib ``json`` module.
+
+    Output matches JSONRenderer's compact form, except that indentation,
+    as requested by the browsable API or an ``indent`` media type parameter,
+    is always two spaces.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        options = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context):
+            options |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=encode_default, option=options)
+        # same escaping as JSONRenderer, the line separators are valid JSON
+        # but not valid JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9",
+            b"\\u2029",
+        )
@@ -0,0 +1,112 @@
+import hashlib
+from functools import cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.renderers import OpenApiJsonRenderer
+from drf_spectacular.renderers import OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS
+from drf_spectacular.views import SpectacularAPIView
+
+from autovm.middleware.compression import ENCODERS
+from autovm.middleware.compression import negotiate
+
+# highest levels, the artifacts are compressed once at build time
+BUILD_LEVELS = {"gzip": 9, "br": 11}
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+
+def get_artifact_path(fmt):
+    return Path(settings.API_SCHEMA_DIR) / f"openapi.{fmt}"
+
+
+def build_schema():
+    """
+    Generate the public schema the way SpectacularAPIView does, and write
+    it to API_SCHEMA_DIR in every format the view serves, along with
+    gzip and brotli compressed copies. Returns the paths written.
+    """
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+
+    directory = Path(settings.API_SCHEMA_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for renderer in (OpenApiYamlRenderer(), OpenApiJsonRenderer()):
+        content = renderer.render(schema, renderer_context={})
+        path = get_artifact_path(renderer.format)
+        path.write_bytes(content)
+        paths.append(path)
+        for encoder_class in ENCODERS:
+            encoder = encoder_class(BUILD_LEVELS[encoder_class.name])
+            compressed = path.with_name(path.name + SUFFIXES[encoder_class.name])
+            compressed.write_bytes(encoder.compress(content) + encoder.finish())
+            paths.append(compressed)
+    return paths
+
+
+@cache
+def read_artifact(path, mtime):
+    """
+    Content of an artifact and its ETag, cached per modification time so a
+    rebuild is picked up without a restart. The ETag is weak since it's
+    shared by the compressed copies.
+    """
+    content = path.read_bytes()
+    return content, f'W/"{hashlib.sha256(content).hexdigest()}"'
+
+
+def load_artifact(path):
+    """
+    Content and ETag of an artifact, or None if it hasn't been built.
+    """
+    try:
+        return read_artifact(path, path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+class SchemaArtifactView(SpectacularAPIView):
+    """
+    Serve the schema written by the ``buildschema`` command instead of
+    introspecting every viewset and serializer on each request, which takes
+    seconds.
+
+    Precompressed copies are sent to clients that accept them. If the
+    schema has not been built, it is generated live in DEBUG and an error
+    is raised otherwise.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        renderer, media_type = self.perform_content_negotiation(request)
+        path = get_artifact_path(renderer.format)
+        artifact = load_artifact(path)
+        if artifact is None:
+            if settings.DEBUG:
+                return super().get(request, *args, **kwargs)
+            msg = "The API schema has not been built, run manage.py buildschema"
+            raise ImproperlyConfigured(msg)
+
+        content, etag = artifact
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=media_type)
+            encoder = negotiate(request.headers.get("Accept-Encoding", ""))
+            compressed = encoder and load_artifact(
+                path.with_name(path.name + SUFFIXES[encoder.name]),
+            )
+            if compressed:
+                response.content = compressed[0]
+                response["Content-Encoding"] = encoder.name
+            filename = f"{spectacular_settings.TITLE or 'schema'}.{renderer.format}"
+            response["Content-Disposition"] = f'inline; filename="{filename}"'
+        patch_vary_headers(response, ("Accept-Encoding",))
+        response["ETag"] = etag
+        return response
@@ -1,6 +1,9 @@
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
 from autovm.resources.models import Backup
+from autovm.resources.models import Host
+from autovm.resources.models import Job
 from autovm.resources.models import Notification
 from autovm.resources.models import OperatingSystemVersion
 from autovm.resources.models import Region
@@ -63,6 +66,33 @@ class RegionSerializer(serializers.ModelSerializer):
         fields = ["_id", "name", "created", "updated"]
 
 
+class HostSerializer(serializers.ModelSerializer):
+    """
+    Host serializer.
+    """
+
+    class Meta:
+        """
+        Fields to render in the serializer.
+        """
+
+        model = Host
+        fields = [
+            "_id",
+            "name",
+            "region",
+            "cpus",
+            "memory",
+            "disk",
+            "used_cpus",
+            "used_memory",
+            "used_disk",
+            "is_active",
+            "created",
+            "updated",
+        ]
+
+
 class VirtualMachineSerializer(serializers.ModelSerializer):
     """
     Virtual Machine serializer.
@@ -93,7 +123,9 @@ class VirtualMachineSerializer(serializers.ModelSerializer):
             "history",
             "operating_system_version",
             "is_active",
+            "state",
             "disk_size",
+            "host",
             "user",
             "user_info",
             "created",
@@ -102,6 +134,18 @@ class VirtualMachineSerializer(serializers.ModelSerializer):
 
         read_only_fields = ["name"]
 
+    def to_representation(self, instance):
+        """
+        Include the relevance of machines returned by a search.
+        Backups and history that weren't prefetched with the page are loaded
+        here, a query each rather than one per field and history entry.
+        """
+        prefetch_related_objects([instance], "backups", "history__user")
+        data = super().to_representation(instance)
+        if hasattr(instance, "search_rank"):
+            data["search_rank"] = instance.search_rank
+        return data
+
     def create(self, validated_data):
         """G
         Create a virtual machine and associated history.
@@ -127,22 +171,24 @@ class VirtualMachineSerializer(serializers.ModelSerializer):
         """
         Get the operating system of the virtual machine.
         """
+        if obj.operating_system_version is None:
+            return None
         return obj.operating_system_version.operating_system.name
 
     def get_last_backup(self, obj):
         """
         Get the last backup of the virtual machine.
         """
-        backup = Backup.objects.filter(vm=obj).last()
-        if backup:
-            return backup.created
+        backups = obj.backups.all()
+        if backups:
+            return max(backup.created for backup in backups)
         return None
 
     def get_backups(self, obj):
         """
         Get the backups of the virtual machine.
         """
-        backups = Backup.objects.filter(vm=obj)
+        backups = obj.backups.all()
         # serialize backups
         backups = BackupSerializer(backups, many=True).data
         return backups
@@ -151,6 +197,8 @@ class VirtualMachineSerializer(serializers.ModelSerializer):
         """
         Get the user info of the virtual machine.
         """
+        if obj.user is None:
+            return None
         return {
             "id": obj.user.id,
             "name": obj.user.name,
@@ -204,3 +252,70 @@ class AssignmentSerializer(serializers.Serializer):
     """
 
     user_id = serializers.IntegerField()  # wehre the vm will be assigned
+
+
+class MachineSelectionSerializer(serializers.Serializer):
+    """
+    Machines a bulk action applies to
+    """
+
+    machines = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+
+class MoveSerializer(serializers.Serializer):
+    """
+    Region machines move to
+    """
+
+    region = serializers.PrimaryKeyRelatedField(queryset=Region.objects.all())
+
+
+class BulkMoveSerializer(MachineSelectionSerializer, MoveSerializer):
+    """
+    Machines to move and the region they move to
+    """
+
+
+class EvacuateSerializer(serializers.Serializer):
+    """
+    Region the machines of an evacuated region move to, any other with room
+    if none
+    """
+
+    region = serializers.PrimaryKeyRelatedField(
+        queryset=Region.objects.all(),
+        required=False,
+        allow_null=True,
+    )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Job serializer.
+    """
+
+    class Meta:
+        """
+        Fields to render in the serializer.
+        """
+
+        model = Job
+        fields = [
+            "_id",
+            "action",
+            "status",
+            "total",
+            "completed",
+            "failed",
+            "result",
+            "error",
+            "created",
+            "started",
+            "finished",
+            "updated",
+        ]
+        read_only_fields = fields
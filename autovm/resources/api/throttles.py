@@ -0,0 +1,138 @@
+import logging
+from functools import cache
+
+import redis
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Checks every bucket of a request and only takes a token from each if all of
+# them have one, so a request denied by one bucket doesn't drain the others.
+# The time is Redis', so that app servers with skewed clocks don't refill
+# buckets too fast or too slow.
+# KEYS: one key per bucket
+# ARGV: capacity and refill rate (tokens per second) for each bucket in turn
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local bucket = redis.call("HMGET", key, "tokens", "ts")
+    local level = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    level = math.min(capacity, level + elapsed * rate)
+    if level < 1 then
+        wait = math.max(wait, (1 - level) / rate)
+    end
+    levels[i] = level
+end
+local allowed = 0
+if wait == 0 then
+    allowed = 1
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    redis.call("HSET", key, "tokens", levels[i] - allowed, "ts", now)
+    redis.call("EXPIRE", key, math.ceil(capacity / rate))
+end
+return {allowed, tostring(wait)}
+"""
+
+
+@cache
+def get_token_bucket():
+    """
+    The token bucket script registered on the throttling Redis server.
+    """
+    client = redis.Redis.from_url(settings.THROTTLE_REDIS_URL)
+    return client.register_script(TOKEN_BUCKET_SCRIPT)
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """
+    Turn a DRF style rate such as ``100/min`` into the bucket capacity and
+    its refill rate in tokens per second.
+    """
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / DURATIONS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle requests with token buckets kept in Redis.
+
+    Unlike DRF's ``SimpleRateThrottle`` it keeps two numbers per bucket instead
+    of a list of request timestamps, and checks all buckets of a request in a
+    single atomic script call. Each request draws from:
+
+    - a per user bucket, rated ``user:<role>`` or ``user`` (``anon`` per client
+      address for anonymous requests),
+    - for writes on views with a ``throttle_scope``, a per user bucket rated
+      by that scope.
+
+    If Redis is unavailable requests are let through.
+    """
+
+    cache_format = "throttle:{scope}:{ident}"
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_buckets(self, request, view):
+        """
+        The ``(key, rate)`` pairs of the buckets this request draws from.
+        """
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        user = request.user
+        if not user or not user.is_authenticated:
+            rate = rates.get("anon")
+            if rate is None:
+                return []
+            key = self.cache_format.format(scope="anon", ident=self.get_ident(request))
+            return [(key, rate)]
+
+        buckets = []
+        rate = rates.get(f"user:{user.role}", rates.get("user"))
+        if rate is not None:
+            key = self.cache_format.format(scope="user", ident=user.pk)
+            buckets.append((key, rate))
+
+        scope = getattr(view, "throttle_scope", None)
+        rate = rates.get(scope) if scope else None
+        if rate is not None and request.method not in SAFE_METHODS:
+            key = self.cache_format.format(scope=scope, ident=user.pk)
+            buckets.append((key, rate))
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request, view)
+        if not buckets:
+            return True
+
+        args = []
+        for _, rate in buckets:
+            args.extend(parse_rate(rate))
+        try:
+            allowed, wait = get_token_bucket()(
+                keys=[key for key, _ in buckets],
+                args=args,
+            )
+        except redis.RedisError:
+            logger.warning("Throttling skipped, Redis is unavailable", exc_info=True)
+            return True
+
+        self.retry_after = float(wait)
+        return bool(allowed)
+
+    def wait(self):
+        return self.retry_after
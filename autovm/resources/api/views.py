@@ -1,38 +1,89 @@
+from functools import partial
+
+import redis
 from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Sum
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.filters import SearchFilter
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
-
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from autovm.middleware.budgets import query_budget
+from autovm.resources.jobs import create_job
+from autovm.resources.jobs import issue_ticket
+from autovm.resources.moves import abandon_moves
+from autovm.resources.moves import begin_move
+from autovm.resources.placement import NoCapacityError
+from autovm.resources.placement import place
 from autovm.resources.models import (
     Backup,
+    Host,
+    Job,
     Notification,
     OperatingSystemVersion,
     Region,
     VirtualMachine,
     VirtualMachineHistory,
 )
+from autovm.resources import lifecycle
+from autovm.resources.tasks import back_up
+from autovm.resources.tasks import move_machines
 from autovm.resources.tasks import notify_user
+from autovm.resources.tasks import perform_lifecycle
 
 from autovm.users.models import User, Customer
 from autovm.billing.models import Subscription
 from autovm.billing.models import BillingAccount
+from autovm.resources.api.catalog import CatalogCacheMixin
+from autovm.resources.api.conditional import ConditionalGetMixin
+from autovm.resources.api.filters import SearchRankCursorPagination
+from autovm.resources.api.filters import TypedSearchFilter
+from autovm.resources.api.filters import VirtualMachineSearchFilter
+from autovm.resources.api.idempotency import idempotent
+from autovm.resources.api.permissions import IsAdmin
 from autovm.resources.api.permissions import IsNotSuspendedCustomer
 
 from .serializers import (
     BackupSerializer,
+    BulkMoveSerializer,
+    EvacuateSerializer,
+    HostSerializer,
+    JobSerializer,
     NotificationSerializer,
     OperatingSystemVersionSerializer,
     RegionSerializer,
     VirtualMachineHistorySerializer,
     VirtualMachineSerializer,
     AssignmentSerializer,
+    MachineSelectionSerializer,
+    MoveSerializer,
 )
 
 
-class OperatingSystemVersionViewSet(ModelViewSet):
+class NoCapacity(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "No host has room for the virtual machine."
+    default_code = "no_capacity"
+
+
+class JobEventsUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Changes of jobs can't be followed right now."
+    default_code = "job_events_unavailable"
+
+
+class OperatingSystemVersionViewSet(
+    CatalogCacheMixin,
+    ConditionalGetMixin,
+    ModelViewSet,
+):
     """
     Operating System Version viewset.
     """
@@ -40,12 +91,12 @@ class OperatingSystemVersionViewSet(ModelViewSet):
     serializer_class = OperatingSystemVersionSerializer
     queryset = OperatingSystemVersion.objects.all()
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = ["operating_system", "version"]
-    search_fields = ["operating_system", "version"]
+    search_fields = ["operating_system", "operating_system__name", "version"]
 
 
-class RegionViewSet(ModelViewSet):
+class RegionViewSet(CatalogCacheMixin, ConditionalGetMixin, ModelViewSet):
     """
     Region viewset.
     """
@@ -57,8 +108,108 @@ class RegionViewSet(ModelViewSet):
     filterset_fields = ["name"]
     search_fields = ["name"]
 
+    @action(
+        detail=True,
+        methods=["post"],
+        name="Evacuate",
+        serializer_class=EvacuateSerializer,
+        permission_classes=[IsAdmin],
+    )
+    @query_budget(8)
+    def evacuate(self, request, pk=None):
+        """
+        Move every machine out of the region, to the requested region or any
+        other with room, and stop placing new ones on its hosts, see
+        autovm.resources.moves.
+        """
+        region = self.get_object()
+        serializer = EvacuateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        destination = serializer.validated_data.get("region")
+        if destination == region:
+            return Response(
+                {"region": ["Machines can't be evacuated to their own region."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if destination is None and not Host.objects.exclude(region=region).exists():
+            return Response(
+                {"region": ["No other region has hosts to evacuate to."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        Host.objects.filter(region=region).update(is_active=False, updated=timezone.now())
+        moves = begin_move(VirtualMachine.objects.filter(region=region))
+        job = start_move(request.user, moves, destination) if moves else None
+        return Response(
+            {"job": job.pk if job else None, "machines": len(moves)},
+            status=status.HTTP_202_ACCEPTED if job else status.HTTP_200_OK,
+        )
+
+
+def start_move(user, moves, region):
+    """
+    Start a job moving machines moved into migrating to ``region``, or out
+    of their region if None.
+    """
+    return create_job(
+        user,
+        "move",
+        move_machines,
+        [
+            [[str(pk), state] for pk, state in moves],
+            str(region.pk) if region else None,
+        ],
+        total=len(moves),
+        undo=partial(abandon_moves, moves),
+    )
+
 
-class VirtualMachineViewSet(ModelViewSet):
+class HostViewSet(ModelViewSet):
+    """
+    Hosts the machines are placed on, see autovm.resources.placement
+    """
+
+    serializer_class = HostSerializer
+    queryset = Host.objects.all()
+    permission_classes = [IsAdmin]
+    lookup_field = "pk"
+    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filterset_fields = ["region", "is_active"]
+    search_fields = ["name"]
+    query_budgets = {
+        "list": 2,
+        "retrieve": 1,
+        "create": 2,
+        "update": 3,
+        "partial_update": 3,
+        "destroy": 4,
+        "capacity": 1,
+    }
+
+    @action(detail=False, methods=["get"])
+    def capacity(self, request):
+        """
+        Capacity of the active hosts of each region, and how much is free.
+        """
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .filter(is_active=True)
+            .values("region")
+            .annotate(
+                # before the totals, which take the names of the fields
+                free_cpus=Sum(F("cpus") - F("used_cpus")),
+                free_memory=Sum(F("memory") - F("used_memory")),
+                free_disk=Sum(F("disk") - F("used_disk")),
+                hosts=Count("pk"),
+                cpus=Sum("cpus"),
+                memory=Sum("memory"),
+                disk=Sum("disk"),
+            )
+            .order_by("region")
+        )
+        return Response(list(rows))
+
+
+class VirtualMachineViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Virtual Machine viewset.
     """
@@ -67,31 +218,44 @@ class VirtualMachineViewSet(ModelViewSet):
     queryset = VirtualMachine.objects.all()
     permission_classes = [IsNotSuspendedCustomer]
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    # set per action for writes that are throttled separately
+    throttle_scope = None
+    filter_backends = [DjangoFilterBackend, VirtualMachineSearchFilter]
     filterset_fields = ["name", "is_active", "user__id"]
-    search_fields = [
-        "name",
-        "user__name",
-        "region__name",
-        "operating_system_version__version",
-        "operating_system_version__operating_system__name",
-        "description",
-    ]
+    pagination_class = SearchRankCursorPagination
+    # the budgets include the customer profile IsNotSuspendedCustomer loads
+    query_budgets = {
+        "list": 6,
+        "retrieve": 5,
+        "update": 7,
+        "partial_update": 7,
+        "destroy": 7,
+    }
 
     # if this is the admin user, return all virtual machines, else,
     # return only those that belong to the user making teh request
     def get_queryset(self):
+        queryset = VirtualMachine.objects.select_related(
+            "user",
+            "region",
+            "operating_system_version__operating_system",
+        )
+        if self.action == "list":
+            # nested in VirtualMachineSerializer, loaded for the whole page
+            queryset = queryset.prefetch_related("backups", "history__user")
         if self.request.user.role == "admin":
-            return VirtualMachine.objects.all()
+            return queryset
         if self.request.user.role == "guest":
             # get the customer the guest belongs to and retrieve the customers vms
             customer = Customer.objects.get(
                 id=self.request.user.guest_profile.customer.id
             )
 
-            return VirtualMachine.objects.filter(user=customer.user)
-        return VirtualMachine.objects.filter(user=self.request.user)
+            return queryset.filter(user=customer.user)
+        return queryset.filter(user=self.request.user)
 
+    @query_budget(20)
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Check the current active subscription of the user.
@@ -135,7 +299,203 @@ class VirtualMachineViewSet(ModelViewSet):
 
             return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        """
+        Place the new machine on a host and provision it there, see
+        autovm.resources.placement.
+        """
+        super().perform_create(serializer)
+        try:
+            place(serializer.instance)
+        except NoCapacityError as error:
+            raise NoCapacity(str(error)) from error
+        self.start_lifecycle("provision", [serializer.instance.pk])
+
+    def start_lifecycle(self, action, machines):
+        """
+        Start a job carrying a lifecycle action out on machines moved into
+        its first state.
+        """
+        return create_job(
+            self.request.user,
+            action,
+            perform_lifecycle,
+            [action, [str(pk) for pk in machines]],
+            total=len(machines),
+            undo=partial(lifecycle.abandon, machines),
+        )
+
+    def change_state(self, action):
+        """
+        Begin a lifecycle action on the requested machine, see
+        autovm.resources.lifecycle. Fails with 409 Conflict when the machine
+        is in a state the action can't start from.
+        """
+        virtual_machine = self.get_object()
+        moved = lifecycle.begin(
+            action,
+            VirtualMachine.objects.filter(pk=virtual_machine.pk),
+        )
+        if not moved:
+            return Response(
+                {
+                    "message": f"Can't {action} virtual machine "
+                    f"{virtual_machine.name} while it is {virtual_machine.state}.",
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(
+            {
+                "job": self.start_lifecycle(action, moved).pk,
+                "state": lifecycle.TRANSITIONS[action].steps[0][1],
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    def change_states(self, action):
+        """
+        Begin a lifecycle action on many machines at once. Machines that
+        can't go through it, or aren't the user's, are reported as rejected.
+        """
+        serializer = MachineSelectionSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = serializer.validated_data["machines"]
+        moved = lifecycle.begin(action, self.get_queryset().filter(pk__in=requested))
+        accepted = set(moved)
+        body = {
+            "job": self.start_lifecycle(action, moved).pk if moved else None,
+            "accepted": [str(pk) for pk in moved],
+            "rejected": [str(pk) for pk in requested if pk not in accepted],
+        }
+        if not moved:
+            return Response(body, status=status.HTTP_409_CONFLICT)
+        return Response(body, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["post"], name="Start", throttle_scope="lifecycle")
+    @query_budget(5)
+    def start(self, request, pk=None):
+        """
+        Start a stopped virtual machine.
+        """
+        return self.change_state("start")
+
+    @action(detail=True, methods=["post"], name="Stop", throttle_scope="lifecycle")
+    @query_budget(5)
+    def stop(self, request, pk=None):
+        """
+        Stop a running virtual machine.
+        """
+        return self.change_state("stop")
+
+    @action(detail=True, methods=["post"], name="Restart", throttle_scope="lifecycle")
+    @query_budget(5)
+    def restart(self, request, pk=None):
+        """
+        Restart a running virtual machine.
+        """
+        return self.change_state("restart")
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-start",
+        name="Start many",
+        serializer_class=MachineSelectionSerializer,
+        throttle_scope="lifecycle",
+    )
+    @query_budget(5)
+    def bulk_start(self, request):
+        """
+        Start many virtual machines.
+        """
+        return self.change_states("start")
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-stop",
+        name="Stop many",
+        serializer_class=MachineSelectionSerializer,
+        throttle_scope="lifecycle",
+    )
+    @query_budget(5)
+    def bulk_stop(self, request):
+        """
+        Stop many virtual machines.
+        """
+        return self.change_states("stop")
+
+    @action(
+        detail=True,
+        methods=["post"],
+        name="Move",
+        serializer_class=MoveSerializer,
+        throttle_scope="lifecycle",
+    )
+    @query_budget(6)
+    def move(self, request, pk=None):
+        """
+        Move a running or stopped virtual machine to another region, see
+        autovm.resources.moves.
+        """
+        virtual_machine = self.get_object()
+        serializer = MoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        region = serializer.validated_data["region"]
+        if virtual_machine.region_id == region.pk:
+            return Response(
+                {"region": ["The virtual machine is already in this region."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        moves = begin_move(
+            VirtualMachine.objects.filter(pk=virtual_machine.pk),
+            region.pk,
+        )
+        if not moves:
+            return Response(
+                {
+                    "message": f"Can't move virtual machine {virtual_machine.name} "
+                    f"while it is {virtual_machine.state}.",
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(
+            {"job": start_move(request.user, moves, region).pk, "state": "migrating"},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-move",
+        name="Move many",
+        serializer_class=BulkMoveSerializer,
+        throttle_scope="lifecycle",
+    )
+    @query_budget(6)
+    def bulk_move(self, request):
+        """
+        Move many virtual machines to another region. Machines that can't be
+        moved, are already there or aren't the user's are reported as
+        rejected.
+        """
+        serializer = BulkMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = serializer.validated_data["machines"]
+        region = serializer.validated_data["region"]
+        moves = begin_move(self.get_queryset().filter(pk__in=requested), region.pk)
+        accepted = {pk for pk, _ in moves}
+        body = {
+            "job": start_move(request.user, moves, region).pk if moves else None,
+            "accepted": [str(pk) for pk, _ in moves],
+            "rejected": [str(pk) for pk in requested if pk not in accepted],
+        }
+        if not moves:
+            return Response(body, status=status.HTTP_409_CONFLICT)
+        return Response(body, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=False, methods=["get"], name="Statistics")
+    @query_budget(4)
     def statistics(self, request, pk=None):
         """
         Get statistics of virtual machines.
@@ -154,7 +514,8 @@ class VirtualMachineViewSet(ModelViewSet):
             status=status.HTTP_200_OK,
         )
 
-    @action(detail=True, methods=["post"], name="Backup")
+    @action(detail=True, methods=["post"], name="Backup", throttle_scope="backup")
+    @query_budget(9)
     def backup(self, request, pk=None):
         """
         Backup virtual machine.
@@ -196,17 +557,16 @@ class VirtualMachineViewSet(ModelViewSet):
                 status=status.HTTP_402_PAYMENT_REQUIRED,
             )
 
-        backup = Backup.objects.create(
-            vm=virtual_machine,
-            size=virtual_machine.disk_size,
+        job = create_job(
+            request.user,
+            "backup",
+            back_up,
+            [str(virtual_machine.pk)],
         )
 
         return Response(
-            {
-                "message": "Backup created successfully.",
-                "backup": backup.created,
-            },
-            status=status.HTTP_200_OK,
+            {"message": "Backup started.", "job": job.pk},
+            status=status.HTTP_202_ACCEPTED,
         )
 
     @action(
@@ -214,7 +574,9 @@ class VirtualMachineViewSet(ModelViewSet):
         methods=["post"],
         name="Asssign a virtual machine to a user",
         serializer_class=AssignmentSerializer,
+        throttle_scope="assign",
     )
+    @query_budget(13)
     def assign(self, request, pk=None):
         """
         Assign a virtual machine to a user.
@@ -284,7 +646,34 @@ class VirtualMachineViewSet(ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class VirtualMachineHistoryViewSet(ModelViewSet):
+class JobViewSet(ReadOnlyModelViewSet):
+    """
+    Jobs of the user, see autovm.resources.jobs
+    """
+
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+    lookup_field = "pk"
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["action", "status"]
+    query_budgets = {"list": 2, "retrieve": 1, "ticket": 0}
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(detail=False, methods=["post"])
+    def ticket(self, request):
+        """
+        A ticket to open the websocket of the user's jobs with, once.
+        """
+        try:
+            ticket = issue_ticket(request.user)
+        except redis.RedisError as error:
+            raise JobEventsUnavailable from error
+        return Response({"ticket": ticket}, status=status.HTTP_201_CREATED)
+
+
+class VirtualMachineHistoryViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Virtual Machine history viewset.
     """
@@ -292,12 +681,12 @@ class VirtualMachineHistoryViewSet(ModelViewSet):
     serializer_class = VirtualMachineHistorySerializer
     queryset = VirtualMachineHistory.objects.all()
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = ["virtual_machine", "user"]
     search_fields = ["description", "user"]
 
 
-class BackupViewSet(ModelViewSet):
+class BackupViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Backup viewset.
     """
@@ -305,9 +694,9 @@ class BackupViewSet(ModelViewSet):
     serializer_class = BackupSerializer
     queryset = Backup.objects.all()
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = ["vm"]
-    search_fields = ["vm", "size", "created"]
+    search_fields = ["vm", "vm__name", "size", "created"]
 
 
 class NotificationViewSet(ModelViewSet):
@@ -318,7 +707,7 @@ class NotificationViewSet(ModelViewSet):
     serializer_class = NotificationSerializer
     queryset = Notification.objects.all()
     lookup_field = "pk"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TypedSearchFilter]
     filterset_fields = ["user"]
     search_fields = ["user", "message", "created"]
 
@@ -1,3 +1,5 @@
+import contextlib
+
 from django.apps import AppConfig
 from django.utils.translation import gettext_lazy as _
 
@@ -6,3 +8,7 @@ class ResourcesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "autovm.resources"
     verbose_name = _("Resources")
+
+    def ready(self):
+        with contextlib.suppress(ImportError):
+            import autovm.resources.signals  # noqa: F401
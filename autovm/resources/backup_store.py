@@ -0,0 +1,369 @@
+"""
+Content-addressed, deduplicating storage of machine disk images.
+
+Images are cut into chunks at content-defined boundaries, so that bytes
+inserted or removed in one place only change the chunks around them. Each
+chunk is stored compressed under the SHA-256 of its content, once however
+many backups contain it, and a backup is a manifest listing the digests of
+its chunks in order, itself stored under its digest. Backing up a machine
+again only writes the chunks that changed since.
+
+Where chunks and manifests are kept is up to the store configured in
+BACKUP_STORE, FileSystemChunkStore keeps them in a local directory.
+
+Chunks and manifests no backup refers to any more are deleted by
+``collect_garbage``, once they are older than BACKUP_GC_GRACE seconds so
+that those of backups still being written are left alone. Backups touch
+the chunks they reuse for the same reason.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from autovm.resources.models import Backup
+
+logger = logging.getLogger(__name__)
+
+KiB = 1024
+MiB = 1024 * KiB
+
+HASH_BITS = 2**64 - 1
+
+
+def gear_table(seed=0):
+    """
+    Random values per byte for the gear hash, drawn from a fixed seed so
+    that boundaries, and therefore digests, are the same across processes
+    and releases.
+    """
+    rng = random.Random(seed)  # noqa: S311
+    return tuple(rng.getrandbits(64) for _ in range(256))
+
+
+GEAR = gear_table()
+
+
+class CorruptBackupError(Exception):
+    """
+    A chunk or manifest read from the store doesn't match its digest.
+    """
+
+
+def digest_of(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def boundary_mask(bits):
+    """
+    Mask of the ``bits`` highest bits of the hash, which depend on the last
+    64 bytes read where the lowest only depend on the last few.
+    """
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+class Chunker:
+    """
+    FastCDC content-defined chunking: a gear hash is rolled over the bytes
+    of a chunk and the chunk ends where its highest bits are all zero.
+    Chunks are at least ``min_size`` long, the hash isn't even computed
+    over those bytes, and at most ``max_size``. Boundaries are harder to
+    hit before ``avg_size`` and easier after, which keeps most chunks close
+    to it.
+    """
+
+    def __init__(self, min_size=16 * KiB, avg_size=64 * KiB, max_size=256 * KiB):
+        bits = avg_size.bit_length() - 1
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.strict_mask = boundary_mask(bits + 2)
+        self.loose_mask = boundary_mask(bits - 2)
+
+    def cut(self, data, start, end):
+        """
+        Offset at which the chunk of ``data`` starting at ``start`` ends,
+        ``end`` being the end of the data read so far.
+        """
+        end = min(end, start + self.max_size)
+        if end - start <= self.min_size:
+            return end
+        # the loop runs for every byte, so everything it uses is local
+        gear = GEAR
+        bits = HASH_BITS
+        fingerprint = 0
+        normal = min(end, start + self.avg_size)
+        for first, last, mask in (
+            (start + self.min_size, normal, self.strict_mask),
+            (normal, end, self.loose_mask),
+        ):
+            for offset, byte in enumerate(data[first:last], first):
+                fingerprint = ((fingerprint << 1) + gear[byte]) & bits
+                if not fingerprint & mask:
+                    return offset + 1
+        return end
+
+    def chunks(self, stream, read_size=MiB):
+        """
+        Read a binary stream to the end, yielding its chunks.
+        """
+        buffer = bytearray()
+        start = 0
+        eof = False
+        while True:
+            while not eof and len(buffer) - start < self.max_size:
+                block = stream.read(read_size)
+                eof = not block
+                buffer += block
+            if start == len(buffer):
+                return
+            end = self.cut(buffer, start, len(buffer))
+            yield bytes(buffer[start:end])
+            start = end
+            # drop what was yielded once it outweighs what's left to read
+            if start >= read_size:
+                del buffer[:start]
+                start = 0
+
+
+class ChunkStore:
+    """
+    Where chunks and manifests are kept, each under its digest in a
+    namespace of its kind, ``chunks`` or ``manifests``. Objects are
+    immutable, so writing one that exists has no effect.
+    """
+
+    def exists(self, kind, digest):
+        raise NotImplementedError
+
+    def touch(self, kind, digest):
+        """
+        Mark an object as just written, returning whether it exists.
+        """
+        raise NotImplementedError
+
+    def write(self, kind, digest, data):
+        raise NotImplementedError
+
+    def read(self, kind, digest):
+        """
+        Content of an object, raising KeyError when there is none.
+        """
+        raise NotImplementedError
+
+    def delete(self, kind, digest):
+        raise NotImplementedError
+
+    def digests(self, kind, before=None):
+        """
+        Digests of the objects of a kind, in no particular order, only those
+        last written before the ``before`` timestamp if given.
+        """
+        raise NotImplementedError
+
+
+class FileSystemChunkStore(ChunkStore):
+    """
+    Objects are files named by their digest under ``location``, fanned out
+    in directories by the first two hex digits of the digest. Files are
+    written under a temporary name and renamed once complete, so readers
+    and backups running at the same time never see a partial object.
+    """
+
+    def __init__(self, location):
+        self.location = Path(location)
+
+    def path(self, kind, digest):
+        return self.location / kind / digest[:2] / digest
+
+    def exists(self, kind, digest):
+        return self.path(kind, digest).exists()
+
+    def touch(self, kind, digest):
+        try:
+            os.utime(self.path(kind, digest))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def write(self, kind, digest, data):
+        path = self.path(kind, digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{digest}.{uuid.uuid4().hex}")
+        temporary.write_bytes(data)
+        temporary.replace(path)
+
+    def read(self, kind, digest):
+        try:
+            return self.path(kind, digest).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+
+    def delete(self, kind, digest):
+        self.path(kind, digest).unlink(missing_ok=True)
+
+    def digests(self, kind, before=None):
+        directory = self.location / kind
+        if not directory.exists():
+            return
+        for parent, _, names in os.walk(directory):
+            for name in names:
+                if name.startswith("."):
+                    continue
+                if before is None or Path(parent, name).stat().st_mtime < before:
+                    yield name
+
+
+def get_backup_store():
+    config = settings.BACKUP_STORE
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+@dataclass(frozen=True)
+class BackupResult:
+    """
+    Outcome of backing up an image.
+    """
+
+    manifest: str
+    # bytes read from the image and compressed bytes written for it
+    size: int
+    stored: int
+    chunks: int
+    new_chunks: int
+
+    @property
+    def dedup_ratio(self):
+        return self.size / self.stored if self.stored else float("inf")
+
+
+class BackupEngine:
+    """
+    Back up and restore images against a chunk store, see the module
+    docstring. Chunks are compressed with zlib at ``level``.
+    """
+
+    def __init__(self, store=None, chunker=None, level=3):
+        self.store = store or get_backup_store()
+        self.chunker = chunker or Chunker()
+        self.level = level
+
+    def backup(self, image):
+        """
+        Back up a binary stream, returning a BackupResult whose manifest
+        restores it.
+        """
+        entries = []
+        written = set()
+        size = stored = 0
+        for chunk in self.chunker.chunks(image):
+            digest = digest_of(chunk)
+            if digest not in written and not self.store.touch("chunks", digest):
+                data = zlib.compress(chunk, self.level)
+                self.store.write("chunks", digest, data)
+                written.add(digest)
+                stored += len(data)
+            entries.append([digest, len(chunk)])
+            size += len(chunk)
+
+        manifest = json.dumps({"size": size, "chunks": entries}).encode()
+        digest = digest_of(manifest)
+        data = zlib.compress(manifest, self.level)
+        self.store.write("manifests", digest, data)
+        return BackupResult(
+            manifest=digest,
+            size=size,
+            stored=stored + len(data),
+            chunks=len(entries),
+            new_chunks=len(written),
+        )
+
+    def read(self, kind, digest):
+        data = zlib.decompress(self.store.read(kind, digest))
+        if digest_of(data) != digest:
+            msg = f"The {kind} {digest} doesn't match its digest"
+            raise CorruptBackupError(msg)
+        return data
+
+    def chunk_digests(self, manifest):
+        """
+        Digests of the chunks listed in a manifest, in order.
+        """
+        entries = json.loads(self.read("manifests", manifest))["chunks"]
+        return [digest for digest, _ in entries]
+
+    def restore(self, manifest):
+        """
+        Stream the image backed up under ``manifest`` back, a chunk at a
+        time, checking every chunk against its digest.
+        """
+        for digest in self.chunk_digests(manifest):
+            yield self.read("chunks", digest)
+
+    def restore_to(self, manifest, output):
+        """
+        Write the image backed up under ``manifest`` to a binary stream,
+        returning the number of bytes written.
+        """
+        return sum(output.write(chunk) for chunk in self.restore(manifest))
+
+
+def backup_image(machine, image, engine=None):
+    """
+    Back up a disk image of ``machine`` read from a binary stream and record
+    the backup.
+    """
+    result = (engine or BackupEngine()).backup(image)
+    return Backup.objects.create(
+        vm=machine,
+        size=machine.disk_size,
+        manifest=result.manifest,
+    )
+
+
+def collect_garbage(store=None, grace=None):
+    """
+    Delete the manifests no backup refers to and the chunks no remaining
+    manifest lists, returning the number of each deleted. Only objects last
+    written more than ``grace`` seconds ago, BACKUP_GC_GRACE by default, are
+    deleted.
+    """
+    engine = BackupEngine(store=store)
+    grace = settings.BACKUP_GC_GRACE if grace is None else grace
+    before = time.time() - grace
+
+    referenced = set(
+        Backup.objects.exclude(manifest="")
+        .values_list("manifest", flat=True)
+        .distinct()
+        .iterator(),
+    )
+    manifests = 0
+    for digest in engine.store.digests("manifests", before=before):
+        if digest not in referenced:
+            engine.store.delete("manifests", digest)
+            manifests += 1
+
+    # digests are kept as bytes, half the size of their hex form
+    live = set()
+    for manifest in referenced:
+        try:
+            live.update(map(bytes.fromhex, engine.chunk_digests(manifest)))
+        except KeyError:
+            logger.warning(f"The manifest {manifest} of a backup is missing")
+    chunks = 0
+    for digest in engine.store.digests("chunks", before=before):
+        if bytes.fromhex(digest) not in live:
+            engine.store.delete("chunks", digest)
+            chunks += 1
+    return manifests, chunks
@@ -0,0 +1,311 @@
+"""
+Scheduled backups and their retention.
+
+Every machine has a ``next_backup_at``, set from its ``backup_freq`` when it
+is created and moved one interval on each time it is claimed. Beat runs the
+``schedule_backups`` task every BACKUP_SCHEDULE_INTERVAL seconds, which
+claims the active machines that are due, at most BACKUP_REGION_CONCURRENCY
+per region in each run, and hands them to ``run_backups`` tasks
+BACKUP_BATCH_SIZE at a time, delayed at random over the interval so that
+they tend not to start at once. How many run at once is only bounded by the
+concurrency of the workers of the ``backups`` queue. Each batch is snapshotted through the orchestrator and the images
+are stored like those of the backup action, see ``backup_machines``.
+
+The ``prune_backups`` task then rotates them: of the backups of a machine,
+it keeps the newest of each of the last ``keep_daily`` days, ``keep_weekly``
+weeks and ``keep_monthly`` months of the customer's plan, at most one less
+than its ``backup_limit`` so that there is room for the next one, and
+deletes the others. With a ``backup_limit`` of 1 that leaves no room, so the
+newest backup is kept and the next scheduled backup replaces it. Plans with
+a limit below 1 get no scheduled backups. What the deleted backups stored
+is freed by ``collect_backup_garbage`` afterwards, see
+autovm.resources.backup_store.
+"""
+
+import logging
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.utils import timezone
+
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.resources.backup_store import BackupEngine
+from autovm.resources.backup_store import backup_image
+from autovm.resources.drivers import Operation
+from autovm.resources.drivers import Orchestrator
+from autovm.resources.drivers import get_driver
+from autovm.resources.lifecycle import host_of
+from autovm.resources.models import Backup
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+
+logger = logging.getLogger(__name__)
+
+
+class BackupLimitError(Exception):
+    """
+    A machine has as many backups as the plan of its owner allows.
+    """
+
+
+def due_machines(region, now):
+    """
+    Active machines of a region, or without one for ``None``, that are due
+    for a backup, the longest overdue first.
+    """
+    return (
+        VirtualMachine.objects.filter(
+            region=region,
+            is_active=True,
+            next_backup_at__lte=now,
+            # unowned machines wait until they are assigned
+            user__isnull=False,
+        )
+        .order_by("next_backup_at")
+        .only("pk", "backup_freq", "next_backup_at")
+    )
+
+
+@transaction.atomic
+def claim_due_machines(now=None):
+    """
+    Claim the machines to back up in this run of the scheduler, returning
+    their ids. Their next backup is scheduled as they are claimed, so a
+    machine is claimed once however the backup goes, and rows locked by a
+    scheduler run that overlaps this one are skipped.
+    """
+    now = now or timezone.now()
+    claimed = []
+    for region in [*Region.objects.values_list("pk", flat=True), None]:
+        machines = list(
+            due_machines(region, now).select_for_update(skip_locked=True)[
+                : settings.BACKUP_REGION_CONCURRENCY
+            ],
+        )
+        for machine in machines:
+            machine.schedule_next_backup(after=now)
+        VirtualMachine.objects.bulk_update(machines, ["next_backup_at"])
+        claimed += [machine.pk for machine in machines]
+    return claimed
+
+
+def backup_machines(machine_ids, orchestrator=None):
+    """
+    Back up the given machines, as the backup action of the API would, from
+    snapshots taken concurrently through the orchestrator and in a few
+    queries for the whole batch. Machines of suspended customers, without an
+    active subscription or at the backup limit of their plan are skipped, as
+    are those the hypervisor failed to snapshot, except that the backup of a
+    machine whose plan allows a single one replaces it. Returns the number
+    of backups made.
+    """
+    machines = [
+        machine
+        for machine in VirtualMachine.objects.filter(
+            pk__in=machine_ids,
+            is_active=True,
+            user__customer_profile__suspended=False,
+        )
+        .select_related("host", "region")
+        .annotate(
+            backup_count=Count("backups"),
+            backup_limit=plan_subquery("backup_limit"),
+        )
+        if machine.backup_limit is not None
+        and (machine.backup_count < machine.backup_limit or machine.backup_limit == 1)
+    ]
+    results = (orchestrator or Orchestrator()).run_sync(
+        [Operation("snapshot", machine.name, host_of(machine)) for machine in machines],
+    )
+
+    engine = BackupEngine()
+    backups = []
+    history = []
+    for machine, result in zip(machines, results, strict=True):
+        if not result.ok:
+            logger.warning(f"Failed to snapshot {machine.name}: {result.error}")
+            continue
+        backups.append(
+            Backup(
+                vm=machine,
+                size=machine.disk_size,
+                manifest=engine.backup(result.result).manifest,
+            ),
+        )
+        history.append(
+            VirtualMachineHistory(
+                virtual_machine=machine,
+                user_id=machine.user_id,
+                action="backup_vm",
+                description="scheduled backup",
+            ),
+        )
+
+    replaced = replaced_backups(backup.vm for backup in backups)
+    with transaction.atomic():
+        if replaced:
+            delete_backups(replaced)
+        Backup.objects.bulk_create(backups)
+        VirtualMachineHistory.objects.bulk_create(history)
+        # bulk_create skips the signals that touch the machines they list in
+        VirtualMachine.objects.filter(
+            pk__in=[backup.vm_id for backup in backups],
+        ).update(updated=timezone.now())
+
+    skipped = len(machine_ids) - len(backups)
+    if skipped:
+        logger.info(f"Skipped {skipped} of {len(machine_ids)} scheduled backups")
+    return len(backups)
+
+
+def replaced_backups(machines):
+    """
+    Ids of the oldest backups of the machines at their backup limit, which
+    a new backup of each replaces, leaving one less than the limit.
+    """
+    excess = {
+        machine.pk: machine.backup_count - machine.backup_limit + 1
+        for machine in machines
+        if machine.backup_count >= machine.backup_limit
+    }
+    if not excess:
+        return []
+    replaced = []
+    for pk, vm_id in (
+        Backup.objects.filter(vm__in=excess)
+        .order_by("vm", "created")
+        .values_list("pk", "vm")
+    ):
+        if excess[vm_id] > 0:
+            replaced.append(pk)
+            excess[vm_id] -= 1
+    return replaced
+
+
+def back_up_machine(machine_id, user_id, driver=None):
+    """
+    Back up a machine from a snapshot of its disk taken by the hypervisor,
+    on behalf of a user, returning the backup. The backup limit is checked
+    again, since other backups may have been made since it was requested.
+    """
+    machine = VirtualMachine.objects.annotate(
+        backup_count=Count("backups"),
+        backup_limit=plan_subquery("backup_limit"),
+    ).get(pk=machine_id)
+    if machine.backup_limit is None or machine.backup_count >= machine.backup_limit:
+        msg = f"{machine.name} has reached the backup limit of its plan"
+        raise BackupLimitError(msg)
+
+    image = async_to_sync((driver or get_driver()).snapshot)(machine.name)
+    backup = backup_image(machine, image)
+    VirtualMachineHistory.objects.create(
+        virtual_machine=machine,
+        user_id=user_id,
+        action="backup_vm",
+        description="backed up the virtual machine",
+    )
+    return backup
+
+
+def plan_subquery(field):
+    """
+    A field of the plan of the active subscription of a machine's owner.
+    """
+    return Subquery(
+        Subscription.objects.filter(
+            account__user=OuterRef("user"),
+            status="active",
+        ).values(f"plan__{field}")[:1],
+    )
+
+
+def retained_backups(backups, plan):
+    """
+    Ids of the backups to keep out of ``backups``, (id, created) pairs of
+    the backups of a machine newest first, under the retention policy of
+    ``plan``. The newest backup is always kept.
+    """
+    policies = [
+        (plan.keep_daily, lambda created: created.date()),
+        (plan.keep_weekly, lambda created: created.isocalendar()[:2]),
+        (plan.keep_monthly, lambda created: (created.year, created.month)),
+    ]
+    kept = {backups[0][0]} if backups else set()
+    for count, period in policies:
+        periods = set()
+        for pk, created in backups:
+            if len(periods) == count:
+                break
+            key = period(timezone.localtime(created))
+            if key not in periods:
+                periods.add(key)
+                kept.add(pk)
+    newest_first = [pk for pk, _ in backups if pk in kept]
+    return set(newest_first[: max(1, plan.backup_limit - 1)])
+
+
+def prune_backups(batch_size=1000):
+    """
+    Delete the backups the retention policies don't keep, for batch_size
+    machines at a time, returning the number deleted. Machines whose owner
+    has no active subscription keep all their backups.
+    """
+    machines = (
+        VirtualMachine.objects.filter(Exists(Backup.objects.filter(vm=OuterRef("pk"))))
+        .annotate(plan_id=plan_subquery("pk"))
+        .exclude(plan_id=None)
+        .order_by("pk")
+        .values_list("pk", "plan_id")
+    )
+    deleted = 0
+    last = None
+    while True:
+        batch = machines.filter(pk__gt=last) if last else machines
+        machine_plans = dict(batch[:batch_size])
+        if not machine_plans:
+            return deleted
+        last = max(machine_plans)
+        plans = RatePlan.objects.in_bulk(set(machine_plans.values()))
+
+        backups = {pk: [] for pk in machine_plans}
+        for pk, vm_id, created in (
+            Backup.objects.filter(vm__in=machine_plans)
+            .order_by("vm", "-created")
+            .values_list("pk", "vm", "created")
+        ):
+            backups[vm_id].append((pk, created))
+        doomed = []
+        for vm_id, entries in backups.items():
+            kept = retained_backups(entries, plans[machine_plans[vm_id]])
+            doomed += [pk for pk, _ in entries if pk not in kept]
+        deleted += delete_backups(doomed)
+
+
+@transaction.atomic
+def delete_backups(pks):
+    """
+    Delete backups in one statement, rather than one per backup for the
+    signals ``QuerySet.delete`` sends, and touch their machines once.
+    """
+    if not pks:
+        return 0
+    quote_name = connection.ops.quote_name
+    meta = Backup._meta
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote_name(meta.db_table)} "  # noqa: S608
+            f"WHERE {quote_name(meta.pk.column)} = ANY(%s) "
+            f"RETURNING {quote_name(meta.get_field('vm').column)}",
+            [pks],
+        )
+        machines = {vm_id for (vm_id,) in cursor.fetchall()}
+    VirtualMachine.objects.filter(pk__in=machines).update(updated=timezone.now())
+    return len(pks)
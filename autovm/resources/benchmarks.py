@@ -0,0 +1,68 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+
+import time
+
+from autovm.resources.api.serializers import VirtualMachineSerializer
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.users.models import User
+
+
+def seed_machines(count):
+    """
+    Create ``count`` machines with a history entry each for a new user and
+    return their serialized representation. Meant to be run in a transaction
+    that is rolled back.
+    """
+    user = User.objects.create_user(
+        email="benchmark@mail.com",
+        name="Benchmark User",
+    )
+    region = Region.objects.create(name="Benchmark Region")
+    version = OperatingSystemVersion.objects.create(
+        operating_system=OperatingSystem.objects.create(name="Benchmark OS"),
+        version="1.0",
+    )
+    machines = VirtualMachine.objects.bulk_create(
+        VirtualMachine(
+            name=f"bench{i:06}",
+            description=f"Benchmark machine {i}, serving ünïcode tràffic",
+            user=user,
+            region=region,
+            operating_system_version=version,
+        )
+        for i in range(count)
+    )
+    VirtualMachineHistory.objects.bulk_create(
+        VirtualMachineHistory(
+            virtual_machine=machine,
+            user=user,
+            description=f"Created {machine.name}",
+        )
+        for machine in machines
+    )
+
+    queryset = (
+        VirtualMachine.objects.filter(user=user)
+        .select_related("user", "region", "operating_system_version")
+        .prefetch_related("history__user")
+    )
+    return VirtualMachineSerializer(queryset, many=True).data
+
+
+def time_calls(func, rounds, clock=time.perf_counter):
+    """
+    Time taken by each of ``rounds`` calls of ``func``, as measured by
+    ``clock``.
+    """
+    samples = []
+    for _ in range(rounds):
+        started = clock()
+        func()
+        samples.append(clock() - started)
+    return samples
@@ -0,0 +1,304 @@
+"""
+Hypervisor drivers and the orchestration of operations through them.
+
+A driver carries out operations on the machines of the hosts it manages:
+create, start, stop, delete, snapshot and migrate. Which driver is used is
+set by HYPERVISOR_DRIVER, FakeDriver simulates one in process with random
+latency and failures.
+
+The Orchestrator runs batches of operations concurrently on an asyncio
+event loop, at most HYPERVISOR_HOST_CONCURRENCY at a time on each host, so
+that a batch spread over many hosts goes as fast as the slowest host allows
+without overloading any. Migrations are capped separately, at
+MIGRATION_SOURCE_CONCURRENCY at a time out of each host and
+MIGRATION_DESTINATION_CONCURRENCY into each, as they load both ends. The
+``run_operations`` task runs a batch on a Celery worker.
+
+These caps are per batch: each batch has its own slots, so batches running
+at the same time, on one worker or several, each run up to the cap on a host
+they share.
+"""
+
+import asyncio
+import contextlib
+import functools
+import io
+import random
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+ACTIONS = ("create", "start", "stop", "delete", "snapshot", "migrate")
+
+
+class DriverError(Exception):
+    """
+    A hypervisor failed to carry out an operation.
+    """
+
+
+@dataclass(frozen=True)
+class MachineSpec:
+    """
+    What a hypervisor needs to know to create a machine.
+    """
+
+    name: str
+    host: str
+    disk_size: int
+    operating_system: str = ""
+
+
+class HypervisorDriver:
+    """
+    Interface of hypervisor drivers. Operations are coroutines, drivers of
+    hypervisors with a blocking API run the calls in a thread with
+    ``asyncio.to_thread``. Operations raise DriverError when they fail.
+    """
+
+    async def create(self, spec):
+        raise NotImplementedError
+
+    async def start(self, name):
+        raise NotImplementedError
+
+    async def stop(self, name):
+        raise NotImplementedError
+
+    async def delete(self, name):
+        raise NotImplementedError
+
+    async def snapshot(self, name):
+        """
+        A consistent image of the machine's disk, as a binary stream, see
+        autovm.resources.backup_store.backup_image.
+        """
+        raise NotImplementedError
+
+    async def migrate(self, name, destination):
+        """
+        Move a machine to the host ``destination``, running if it was.
+        """
+        raise NotImplementedError
+
+
+class FakeDriver(HypervisorDriver):
+    """
+    Simulated hypervisor keeping its machines in memory. Every operation
+    takes between ``min_latency`` and ``max_latency`` seconds and fails
+    with a probability of ``failure_rate``, snapshots are ``image_size``
+    bytes of random data.
+
+    Each process has its own machines, so unless it is ``strict`` the driver
+    adopts machines it doesn't know, as created by another worker or before
+    a restart.
+    """
+
+    def __init__(
+        self,
+        min_latency=0.0,
+        max_latency=0.0,
+        failure_rate=0.0,
+        image_size=1024 * 1024,
+        seed=None,
+        *,
+        strict=False,
+    ):
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.failure_rate = failure_rate
+        self.image_size = image_size
+        self.random = random.Random(seed)  # noqa: S311
+        self.strict = strict
+        # the host of each machine by name, and whether it is running
+        self.machines = {}
+
+    async def operate(self, name, *, exists=True):
+        await asyncio.sleep(self.random.uniform(self.min_latency, self.max_latency))
+        if self.random.random() < self.failure_rate:
+            msg = f"Simulated failure of an operation on {name}"
+            raise DriverError(msg)
+        if exists and not self.strict:
+            self.machines.setdefault(name, {"host": None, "running": False})
+        if exists != (name in self.machines):
+            msg = f"Machine {name} {'does not' if exists else 'already'} exist"
+            raise DriverError(msg)
+        return self.machines.get(name)
+
+    async def create(self, spec):
+        await self.operate(spec.name, exists=False)
+        self.machines[spec.name] = {"host": spec.host, "running": False}
+
+    async def start(self, name):
+        machine = await self.operate(name)
+        machine["running"] = True
+
+    async def stop(self, name):
+        machine = await self.operate(name)
+        machine["running"] = False
+
+    async def delete(self, name):
+        await self.operate(name)
+        del self.machines[name]
+
+    async def snapshot(self, name):
+        await self.operate(name)
+        return io.BytesIO(self.random.randbytes(self.image_size))
+
+    async def migrate(self, name, destination):
+        machine = await self.operate(name)
+        machine["host"] = destination
+
+
+@functools.cache
+def get_driver():
+    """
+    The configured driver, one per process, so that drivers can keep
+    connections to their hosts open across batches.
+    """
+    config = settings.HYPERVISOR_DRIVER
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+@receiver(setting_changed)
+def reset_driver(setting, **kwargs):
+    if setting == "HYPERVISOR_DRIVER":
+        get_driver.cache_clear()
+
+
+@dataclass(frozen=True)
+class Operation:
+    """
+    An operation on a machine of a host. ``arguments`` are passed to the
+    driver after the name, or replace it for ``create``.
+    """
+
+    action: str
+    machine: str
+    host: str
+    arguments: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.action not in ACTIONS:
+            msg = f"Unknown hypervisor operation {self.action}"
+            raise ValueError(msg)
+
+
+@dataclass(frozen=True)
+class OperationResult:
+    operation: Operation
+    ok: bool
+    # what the driver returned, or why it failed
+    result: object = None
+    error: str = ""
+    duration: float = 0.0
+
+
+class Orchestrator:
+    """
+    Run operations through a driver concurrently, ``host_concurrency`` at a
+    time per host within each batch, see the module docstring.
+    """
+
+    def __init__(
+        self,
+        driver=None,
+        host_concurrency=None,
+        source_concurrency=None,
+        destination_concurrency=None,
+    ):
+        self.driver = driver or get_driver()
+        self.host_concurrency = host_concurrency or settings.HYPERVISOR_HOST_CONCURRENCY
+        self.source_concurrency = (
+            source_concurrency or settings.MIGRATION_SOURCE_CONCURRENCY
+        )
+        self.destination_concurrency = (
+            destination_concurrency or settings.MIGRATION_DESTINATION_CONCURRENCY
+        )
+
+    def call(self, operation):
+        method = getattr(self.driver, operation.action)
+        if operation.action == "create":
+            return method(MachineSpec(**operation.arguments))
+        return method(operation.machine, **operation.arguments)
+
+    def limits(self, operation):
+        """
+        The slots an operation holds while it runs, as (key, limit) pairs.
+        Migrations take their source's before their destination's, so that
+        those waiting for a destination hold no slot others wait for.
+        """
+        if operation.action == "migrate":
+            destination = operation.arguments["destination"]
+            return [
+                (("from", operation.host), self.source_concurrency),
+                (("to", destination), self.destination_concurrency),
+            ]
+        return [(operation.host, self.host_concurrency)]
+
+    async def perform(self, operation, slots):
+        async with contextlib.AsyncExitStack() as stack:
+            for slot in slots:
+                await stack.enter_async_context(slot)
+            started = time.perf_counter()
+            try:
+                result = await self.call(operation)
+            except DriverError as error:
+                return OperationResult(
+                    operation,
+                    ok=False,
+                    error=str(error),
+                    duration=time.perf_counter() - started,
+                )
+            return OperationResult(
+                operation,
+                ok=True,
+                result=result,
+                duration=time.perf_counter() - started,
+            )
+
+    async def run(self, operations):
+        """
+        Run operations, returning their results in the same order. Failed
+        operations are reported in their result rather than raised, so one
+        failure doesn't abandon the rest of the batch. The slots of hosts are
+        only shared by the operations of this batch.
+        """
+        slots = {}
+
+        def slot(key, limit):
+            if key not in slots:
+                slots[key] = asyncio.Semaphore(limit)
+            return slots[key]
+
+        return await asyncio.gather(
+            *(
+                self.perform(
+                    operation,
+                    [slot(key, limit) for key, limit in self.limits(operation)],
+                )
+                for operation in operations
+            ),
+        )
+
+    def run_sync(self, operations):
+        return async_to_sync(self.run)(operations)
+
+
+def serialize_result(result):
+    """
+    A result as JSON, for Celery results.
+    """
+    return {
+        **asdict(result.operation),
+        "ok": result.ok,
+        "error": result.error,
+        "duration": result.duration,
+    }
@@ -0,0 +1,230 @@
+"""
+Jobs, the long-running operations on virtual machines.
+
+Actions that take a while, like starting machines or backing them up, check
+what they can within the request, create a Job and answer 202 Accepted with
+its id. A Celery task, whose id is the job's, carries the work out and
+records on the job how far it got and how it ended. Clients poll
+/api/jobs/<id>/, or follow their jobs over the websocket at /ws/jobs/, to
+which every change of a job is published through the Redis channel of its
+owner. Websockets carry no headers, so clients that can't rely on the login
+cookie open it with a ticket from ``issue_ticket``, good for one connection
+within JOB_TICKET_TTL seconds, rather than a token that would end up in the
+logs of every proxy on the way.
+
+Jobs that finished more than JOB_RETENTION seconds ago are moved to the
+archive by ``archive_jobs``, a batch per statement, so that the jobs table
+only holds recent ones.
+"""
+
+import functools
+import json
+import logging
+import secrets
+from datetime import timedelta
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from rest_framework.utils.encoders import JSONEncoder
+
+from autovm.resources.api.serializers import JobSerializer
+from autovm.resources.models import ArchivedJob
+from autovm.resources.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def job_channel(user_id):
+    """
+    Redis channel the changes of a user's jobs are published to.
+    """
+    return f"jobs:{user_id}"
+
+
+def ticket_key(ticket):
+    return f"job-ticket:{ticket}"
+
+
+@functools.cache
+def get_redis():
+    return redis.Redis.from_url(settings.JOB_EVENTS_REDIS_URL)
+
+
+def get_async_redis():
+    """
+    Client for subscribing to job channels, one per websocket since the
+    connections of asyncio clients belong to their event loop.
+    """
+    return redis.asyncio.Redis.from_url(settings.JOB_EVENTS_REDIS_URL)
+
+
+def publish(job):
+    """
+    Send the job, as the API renders it, to the websockets of its owner.
+    Progress is still recorded when Redis is unavailable.
+    """
+    try:
+        get_redis().publish(
+            job_channel(job.user_id),
+            json.dumps(JobSerializer(job).data, cls=JSONEncoder),
+        )
+    except redis.RedisError:
+        logger.exception(f"Change of job {job.pk} not published, Redis is unavailable")
+
+
+def issue_ticket(user):
+    """
+    A ticket opening the websocket of the user's jobs once, within
+    JOB_TICKET_TTL seconds.
+    """
+    ticket = secrets.token_urlsafe(32)
+    get_redis().set(ticket_key(ticket), str(user.pk), ex=settings.JOB_TICKET_TTL)
+    return ticket
+
+
+async def redeem_ticket(ticket):
+    """
+    The id of the user a ticket was issued to, None if it was used already,
+    expired or can't be looked up as Redis is unavailable.
+    """
+    client = get_async_redis()
+    try:
+        user_id = await client.getdel(ticket_key(ticket))
+    except redis.RedisError:
+        logger.exception("Ticket not redeemed, Redis is unavailable")
+        return None
+    finally:
+        await client.aclose()
+    return user_id.decode() if user_id else None
+
+
+def create_job(user, action, task, arguments, total=1, undo=None):
+    """
+    Create a job of ``user`` and send ``task`` to carry it out once the
+    transaction commits, with the id of the job followed by ``arguments``.
+    When the task can't be sent the job fails and ``undo`` is called, to
+    put back the machines the job was to work on.
+    """
+    job = Job.objects.create(user=user, action=action, total=total)
+    transaction.on_commit(
+        functools.partial(dispatch_job, job, task, arguments, undo),
+    )
+    return job
+
+
+def dispatch_job(job, task, arguments, undo=None):
+    try:
+        task.apply_async([str(job.pk), *arguments], task_id=str(job.pk))
+    except OperationalError as error:
+        logger.exception(f"Job {job.pk} not sent, the broker is unavailable")
+        update_job(job, status="failed", error=str(error), finished=timezone.now())
+        if undo:
+            undo()
+
+
+def update_job(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=[*fields, "updated"])
+    publish(job)
+
+
+def advance_job(job, completed=0, failed=0):
+    """
+    Count machines a job is done with. The counts are added up in the
+    database, so that tasks sharing a job don't overwrite each other's.
+    """
+    Job.objects.filter(pk=job.pk).update(
+        completed=F("completed") + completed,
+        failed=F("failed") + failed,
+        updated=timezone.now(),
+    )
+    job.refresh_from_db(fields=["completed", "failed", "updated"])
+    publish(job)
+
+
+def job_task(function):
+    """
+    Make ``function`` carry out a job as the body of a task. The task is
+    sent the id of the job, which is marked running and passed on as the
+    Job. It ends failed if the function raised or failed on any machine,
+    and succeeded otherwise, with what the function returned as its result.
+    """
+
+    @functools.wraps(function)
+    def run(job_id, *args, **kwargs):
+        job = Job.objects.get(pk=job_id)
+        update_job(job, status="running", started=timezone.now())
+        try:
+            result = function(job, *args, **kwargs)
+        except Exception as error:
+            update_job(job, status="failed", error=str(error), finished=timezone.now())
+            raise
+        update_job(
+            job,
+            status="failed" if job.failed else "succeeded",
+            result=result,
+            finished=timezone.now(),
+        )
+        return result
+
+    return run
+
+
+def fail_stalled_jobs(before):
+    """
+    Fail the pending and running jobs that haven't changed since
+    ``before``, whose task was lost or whose worker died, returning how
+    many.
+    """
+    jobs = list(
+        Job.objects.filter(status__in=["pending", "running"], updated__lt=before),
+    )
+    for job in jobs:
+        update_job(
+            job,
+            status="failed",
+            error="The job stalled",
+            finished=timezone.now(),
+        )
+    return len(jobs)
+
+
+def archive_jobs(before=None, batch_size=10_000):
+    """
+    Move the jobs that finished before ``before``, JOB_RETENTION seconds ago
+    by default, to the archive, returning the number moved. Each batch is
+    deleted and inserted by a single statement.
+    """
+    before = before or timezone.now() - timedelta(seconds=settings.JOB_RETENTION)
+    quote_name = connection.ops.quote_name
+    meta = Job._meta
+    table = quote_name(meta.db_table)
+    archive = quote_name(ArchivedJob._meta.db_table)
+    pk = quote_name(meta.pk.column)
+    finished = quote_name(meta.get_field("finished").column)
+    # both tables have the same columns
+    columns = ", ".join(quote_name(field.column) for field in meta.concrete_fields)
+    archived = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH moved AS ("  # noqa: S608
+                f"DELETE FROM {table} WHERE {pk} IN ("
+                f"SELECT {pk} FROM {table} WHERE {finished} < %s "
+                f"ORDER BY {finished} LIMIT %s) "
+                f"RETURNING {columns}) "
+                f"INSERT INTO {archive} ({columns}) "
+                f"SELECT {columns} FROM moved",
+                [before, batch_size],
+            )
+            moved = cursor.rowcount
+        archived += moved
+        if moved < batch_size:
+            return archived
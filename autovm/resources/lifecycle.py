@@ -0,0 +1,224 @@
+"""
+Lifecycle of virtual machines.
+
+A machine is ``provisioning`` until the hypervisor has created and started
+it, then ``running`` or ``stopped`` as it is started and stopped, and
+``error`` once an operation on it failed, from where it can be started or
+stopped again. ``migrating`` marks machines moving between regions, see
+autovm.resources.moves.
+
+An action first moves its machines into a transitional state, all of them in
+one conditional UPDATE, see VirtualMachineQuerySet.transition. Machines in a
+state the action can't start from are left as they are, so a machine goes
+through one action at a time and concurrent requests for it need no row
+locks: those that lose the race find it already moved. The machines that
+moved are handed to the ``perform_lifecycle`` task, which carries the action
+out through the hypervisor driver and moves each machine to the state the
+action ends in, or to ``error``.
+
+Machines whose task couldn't be sent go to ``error`` at once. Those left in
+a transitional state for LIFECYCLE_TIMEOUT seconds, as when their worker
+died, are moved to ``error`` by ``recover_stalled``, and their jobs failed.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from autovm.billing.metering import record_usage
+from autovm.billing.models import UsageEvent
+from autovm.resources.drivers import Operation
+from autovm.resources.drivers import Orchestrator
+from autovm.resources.jobs import fail_stalled_jobs
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Transition:
+    """
+    What an action does: the states it starts from, the driver operations it
+    runs with the state of the machines while each runs, the state it ends
+    in, and the history action and description written for the machines it
+    succeeded on.
+    """
+
+    sources: tuple
+    steps: tuple
+    target: str
+    history: tuple = ()
+
+
+TRANSITIONS = {
+    "provision": Transition(
+        ("provisioning",),
+        (("create", "provisioning"), ("start", "provisioning")),
+        "running",
+    ),
+    "start": Transition(
+        ("stopped", "error"),
+        (("start", "starting"),),
+        "running",
+        ("start_vm", "started the virtual machine"),
+    ),
+    "stop": Transition(
+        ("running", "error"),
+        (("stop", "stopping"),),
+        "stopped",
+        ("stop_vm", "stopped the virtual machine"),
+    ),
+    "restart": Transition(
+        ("running",),
+        (("stop", "stopping"), ("start", "starting")),
+        "running",
+        ("start_vm", "restarted the virtual machine"),
+    ),
+}
+
+
+# the states machines are only in while an action or move is carried out
+TRANSITIONAL = ("provisioning", "starting", "stopping", "migrating")
+
+
+def begin(action, machines):
+    """
+    Move ``machines``, a queryset, into the first state of ``action``,
+    returning the ids of those that could.
+    """
+    transition = TRANSITIONS[action]
+    return machines.transition(transition.sources, transition.steps[0][1])
+
+
+def abandon(machine_ids):
+    """
+    Move machines out of the transitional state of an action that won't be
+    carried out to ``error``, from where they can be started or stopped
+    again, returning the ids of those that moved.
+    """
+    machines = VirtualMachine.objects.filter(pk__in=machine_ids)
+    with transaction.atomic():
+        abandoned = machines.transition(TRANSITIONAL, "error")
+        record_usage(
+            VirtualMachine.objects.filter(pk__in=abandoned),
+            UsageEvent.STOPPED,
+        )
+    return abandoned
+
+
+def recover_stalled(before=None):
+    """
+    Move the machines that have been in a transitional state since
+    ``before``, LIFECYCLE_TIMEOUT seconds ago by default, to ``error`` and
+    fail the jobs that stalled with them. Returns the ids of the machines.
+    """
+    before = before or timezone.now() - timedelta(
+        seconds=settings.LIFECYCLE_TIMEOUT,
+    )
+    recovered = abandon(
+        VirtualMachine.objects.filter(
+            state__in=TRANSITIONAL,
+            updated__lt=before,
+        ).values("pk"),
+    )
+    if recovered:
+        logger.warning(f"Moved {len(recovered)} stalled machines to error")
+    fail_stalled_jobs(before)
+    return recovered
+
+
+def host_of(machine):
+    """
+    The hypervisor host of a machine. Machines that weren't placed on one
+    go on a host named after their region, or a default one.
+    """
+    if machine.host:
+        return machine.host.name
+    return machine.region.slug if machine.region else "default"
+
+
+def operation(step, machine):
+    arguments = {}
+    if step == "create":
+        version = machine.operating_system_version
+        arguments = {
+            "name": machine.name,
+            "host": host_of(machine),
+            "disk_size": int(machine.disk_size),
+            "operating_system": str(version) if version else "",
+        }
+    return Operation(step, machine.name, host_of(machine), arguments)
+
+
+def perform(action, machine_ids, user_id, orchestrator=None):
+    """
+    Carry ``action`` out on machines ``begin`` moved, one step after the
+    other for all of them, and record the outcome. Returns the ids of the
+    machines it succeeded and failed on.
+    """
+    transition = TRANSITIONS[action]
+    orchestrator = orchestrator or Orchestrator()
+    machines = list(
+        VirtualMachine.objects.filter(pk__in=machine_ids).select_related(
+            "host",
+            "region",
+            "operating_system_version__operating_system",
+        ),
+    )
+    loaded = {machine.pk: machine for machine in machines}
+    failed = []
+    state = transition.steps[0][1]
+    for step, step_state in transition.steps:
+        if step_state != state:
+            moved = set(
+                VirtualMachine.objects.filter(
+                    pk__in=[machine.pk for machine in machines],
+                ).transition([state], step_state),
+            )
+            machines = [machine for machine in machines if machine.pk in moved]
+            state = step_state
+        results = orchestrator.run_sync(
+            [operation(step, machine) for machine in machines],
+        )
+        for machine, result in zip(machines, results, strict=True):
+            if not result.ok:
+                logger.warning(f"Failed to {action} {machine.name}: {result.error}")
+                failed.append(machine.pk)
+        machines = [
+            machine
+            for machine, result in zip(machines, results, strict=True)
+            if result.ok
+        ]
+
+    with transaction.atomic():
+        succeeded = VirtualMachine.objects.filter(
+            pk__in=[machine.pk for machine in machines],
+        ).transition([state], transition.target)
+        VirtualMachine.objects.filter(pk__in=failed).transition(
+            [step_state for _, step_state in transition.steps],
+            "error",
+        )
+        # failed machines are in error, which isn't metered as running
+        running = transition.target == "running"
+        record_usage(
+            [loaded[pk] for pk in succeeded],
+            UsageEvent.STARTED if running else UsageEvent.STOPPED,
+        )
+        record_usage([loaded[pk] for pk in failed], UsageEvent.STOPPED)
+        if transition.history:
+            history_action, description = transition.history
+            VirtualMachineHistory.objects.bulk_create(
+                VirtualMachineHistory(
+                    virtual_machine_id=pk,
+                    action=history_action,
+                    description=description,
+                    user_id=user_id,
+                )
+                for pk in succeeded
+            )
+    return succeeded, failed
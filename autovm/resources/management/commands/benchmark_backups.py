@@ -0,0 +1,102 @@
+import io
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from autovm.resources.backup_store import BackupEngine
+from autovm.resources.backup_store import FileSystemChunkStore
+from autovm.resources.backup_store import MiB
+
+
+def synthetic_image(rng, size):
+    """
+    A disk image of ``size`` bytes, half random data, a quarter zeros and a
+    quarter text, in blocks of 1 MiB.
+    """
+    text = b"Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20_000
+    blocks = []
+    for number in range(size // MiB):
+        kind = number % 4
+        if kind < 2:  # noqa: PLR2004
+            blocks.append(rng.randbytes(MiB))
+        elif kind == 2:  # noqa: PLR2004
+            blocks.append(bytes(MiB))
+        else:
+            blocks.append(text[:MiB])
+    return bytearray(b"".join(blocks))
+
+
+def mutate(rng, image, change):
+    """
+    Overwrite a ``change`` fraction of the image in blocks of 4 KiB, as
+    writes to files do, and insert a few bytes, which shifts the rest.
+    """
+    block = 4096
+    for _ in range(int(len(image) * change / block)):
+        offset = rng.randrange(0, len(image) - block)
+        image[offset : offset + block] = rng.randbytes(block)
+    for _ in range(2):
+        offset = rng.randrange(0, len(image))
+        image[offset:offset] = rng.randbytes(rng.randrange(1, 100))
+
+
+class Command(BaseCommand):
+    """
+    Measure deduplication and throughput of the backup store
+    """
+
+    help = "Benchmark backups of successive generations of a synthetic disk image"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=64, help="Image size in MiB")
+        parser.add_argument("--generations", type=int, default=5)
+        parser.add_argument(
+            "--change",
+            type=float,
+            default=0.02,
+            help="Fraction of the image overwritten between generations",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """
+        Backups go to a temporary directory, so the store starts empty and
+        what it holds afterwards is what the generations needed.
+        """
+        rng = random.Random(options["seed"])  # noqa: S311
+        image = synthetic_image(rng, options["size"] * MiB)
+
+        self.stdout.write(
+            f"{'gen':>4}{'MiB':>8}{'chunks':>8}{'new':>6}{'stored MiB':>12}"
+            f"{'dedup':>8}{'backup MB/s':>13}{'restore MB/s':>14}",
+        )
+        total = stored = 0
+        with tempfile.TemporaryDirectory() as location:
+            engine = BackupEngine(store=FileSystemChunkStore(location))
+            for generation in range(options["generations"]):
+                if generation:
+                    mutate(rng, image, options["change"])
+
+                started = time.perf_counter()
+                result = engine.backup(io.BytesIO(image))
+                backup_time = time.perf_counter() - started
+
+                started = time.perf_counter()
+                restored = engine.restore_to(result.manifest, io.BytesIO())
+                restore_time = time.perf_counter() - started
+                if restored != len(image):
+                    msg = f"Generation {generation} restored to {restored} bytes"
+                    raise CommandError(msg)
+
+                total += result.size
+                stored += result.stored
+                self.stdout.write(
+                    f"{generation:>4}{result.size / MiB:>8.1f}{result.chunks:>8}"
+                    f"{result.new_chunks:>6}{result.stored / MiB:>12.2f}"
+                    f"{total / stored:>8.1f}"
+                    f"{result.size / backup_time / 1e6:>13.1f}"
+                    f"{result.size / restore_time / 1e6:>14.1f}",
+                )
@@ -0,0 +1,79 @@
+import statistics
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from autovm.middleware.compression import BrotliEncoder
+from autovm.middleware.compression import GzipEncoder
+from autovm.middleware.compression import brotli
+from autovm.resources.api.renderers import ORJSONRenderer
+from autovm.resources.benchmarks import seed_machines
+from autovm.resources.benchmarks import time_calls
+
+
+def compress(encoder_class, level, body):
+    """
+    Compress a response body the way APICompressionMiddleware does.
+    """
+    encoder = encoder_class(level)
+    return encoder.compress(body) + encoder.finish()
+
+
+class Command(BaseCommand):
+    """
+    Measure compression ratio and CPU cost of the API compression encoders
+    """
+
+    help = "Benchmark gzip and brotli on virtual machine list payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            nargs="+",
+            default=[settings.REST_FRAMEWORK["PAGE_SIZE"], 100, 1000],
+            help="Number of machines per payload",
+        )
+        parser.add_argument("--rounds", type=int, default=20)
+
+    def handle(self, *args, **options):
+        """
+        Payloads are rendered like paginated list responses from machines
+        seeded in a transaction that is rolled back.
+        """
+        with transaction.atomic():
+            machines = seed_machines(max(options["pages"]))
+            transaction.set_rollback(True)
+
+        encoders = [(GzipEncoder, level) for level in (1, 6, 9)]
+        if brotli is None:
+            self.stdout.write("brotli is not installed, only gzip is measured")
+        else:
+            encoders += [(BrotliEncoder, quality) for quality in (1, 4, 11)]
+
+        self.stdout.write(
+            f"{'machines':>8}{'bytes':>10}  {'encoding':<10}{'ratio':>8}"
+            f"{'cpu ms':>10}{'MB/s':>10}",
+        )
+        renderer = ORJSONRenderer()
+        for size in options["pages"]:
+            body = renderer.render(
+                {"next": None, "previous": None, "results": machines[:size]},
+            )
+            for encoder_class, level in encoders:
+                compressed = compress(encoder_class, level, body)
+                cpu = statistics.median(
+                    time_calls(
+                        partial(compress, encoder_class, level, body),
+                        options["rounds"],
+                        clock=time.process_time,
+                    ),
+                )
+                self.stdout.write(
+                    f"{size:>8}{len(body):>10}  {encoder_class.name + str(level):<10}"
+                    f"{len(body) / len(compressed):>8.1f}{cpu * 1000:>10.2f}"
+                    f"{len(body) / max(cpu, 1e-9) / 1e6:>10.1f}",
+                )
@@ -0,0 +1,69 @@
+import io
+import statistics
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from autovm.resources.api.parsers import ORJSONParser
+from autovm.resources.api.renderers import ORJSONRenderer
+from autovm.resources.benchmarks import seed_machines
+from autovm.resources.benchmarks import time_calls
+
+
+def parse(parser, body):
+    """
+    Parse a request body the way DRF hands it to parsers.
+    """
+    return parser.parse(io.BytesIO(body))
+
+
+class Command(BaseCommand):
+    """
+    Compare DRF's stdlib JSON renderer and parser with the orjson ones
+    """
+
+    help = "Benchmark rendering and parsing a list of seeded virtual machines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--machines", type=int, default=10_000)
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        """
+        Machines are seeded in a transaction that is rolled back, so the
+        command can be run against any database.
+        """
+        started = time.perf_counter()
+        with transaction.atomic():
+            data = seed_machines(options["machines"])
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f"seeded and serialized {options['machines']} machines "
+            f"in {time.perf_counter() - started:.1f}s",
+        )
+
+        self.stdout.write(
+            f"{'codec':<10}{'step':<8}{'best ms':>10}{'median ms':>12}{'MB/s':>10}",
+        )
+        codecs = [
+            ("json", JSONRenderer(), JSONParser()),
+            ("orjson", ORJSONRenderer(), ORJSONParser()),
+        ]
+        for label, renderer, parser in codecs:
+            body = renderer.render(data)
+            timings = {
+                "render": time_calls(partial(renderer.render, data), options["rounds"]),
+                "parse": time_calls(partial(parse, parser, body), options["rounds"]),
+            }
+            for step, samples in timings.items():
+                best = min(samples)
+                self.stdout.write(
+                    f"{label:<10}{step:<8}{best * 1000:>10.1f}"
+                    f"{statistics.median(samples) * 1000:>12.1f}"
+                    f"{len(body) / best / 1e6:>10.1f}",
+                )
+        self.stdout.write(f"payload: {len(body) / 1e6:.1f} MB")
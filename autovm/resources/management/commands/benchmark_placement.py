@@ -0,0 +1,86 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from autovm.resources.models import VirtualMachine
+from autovm.resources.placement import STRATEGIES
+from autovm.resources.placement import PlacementIndex
+
+
+class Command(BaseCommand):
+    """
+    Measure the latency of placement decisions on the in-memory index
+    """
+
+    help = "Benchmark placing machines on hosts with each placement strategy"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--machines", type=int, default=100_000)
+        parser.add_argument("--hosts", type=int, default=1000)
+        parser.add_argument("--regions", type=int, default=10)
+        parser.add_argument(
+            "--capacity",
+            type=int,
+            nargs=3,
+            default=[512, 2048, 65536],
+            metavar=("CPUS", "MEMORY", "DISK"),
+            help="Virtual CPUs, GB of memory and GB of disk of each host",
+        )
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=1.0,
+            help="Latency each decision should stay under at the p99",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """
+        Each strategy places the same machines, of random storage sizes and
+        regions, on a fresh index of empty hosts. The hosts stay in memory,
+        so that only the decisions are timed, not the reservations.
+        """
+        rng = random.Random(options["seed"])
+        sizes = [size for size, _ in VirtualMachine.STORAGE_CHOICES]
+        machines = [
+            (
+                rng.randrange(options["regions"]),
+                VirtualMachine.resources_of(rng.choice(sizes)),
+            )
+            for _ in range(options["machines"])
+        ]
+        cpus, memory, disk = options["capacity"]
+        target = options["target_ms"]
+
+        self.stdout.write(
+            f"{'strategy':>9}{'placed':>9}{'failed':>8}{'hosts':>7}"
+            f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}  within target",
+        )
+        for strategy in STRATEGIES:
+            index = PlacementIndex()
+            for pk in range(options["hosts"]):
+                index.update(pk, pk % options["regions"], (cpus, memory, disk))
+
+            durations = []
+            used = set()
+            failed = 0
+            for region, resources in machines:
+                started = time.perf_counter()
+                pk = index.find([region], *resources, strategy)
+                if pk is not None:
+                    index.take(pk, *resources)
+                durations.append(time.perf_counter() - started)
+                if pk is None:
+                    failed += 1
+                else:
+                    used.add(pk)
+
+            percentiles = statistics.quantiles(durations, n=100)
+            p99 = percentiles[98] * 1000
+            self.stdout.write(
+                f"{strategy:>9}{len(machines) - failed:>9}{failed:>8}{len(used):>7}"
+                f"{percentiles[49] * 1000:>9.3f}{p99:>9.3f}"
+                f"{max(durations) * 1000:>9.3f}  {'yes' if p99 <= target else 'no'}",
+            )
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from autovm.resources.drivers import FakeDriver
+from autovm.resources.drivers import Operation
+from autovm.resources.drivers import Orchestrator
+
+
+def provisioning(machines, hosts):
+    """
+    Create and start ``machines`` machines spread over ``hosts`` hosts.
+    """
+    specs = [
+        {"name": f"bench{number:06}", "host": f"host{number % hosts}", "disk_size": 200}
+        for number in range(machines)
+    ]
+    return [
+        [Operation("create", spec["name"], spec["host"], spec) for spec in specs],
+        [Operation("start", spec["name"], spec["host"]) for spec in specs],
+    ]
+
+
+class Command(BaseCommand):
+    """
+    Measure provisioning throughput through the orchestrator
+    """
+
+    help = "Benchmark provisioning machines on the fake hypervisor driver"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--machines", type=int, default=1000)
+        parser.add_argument("--hosts", type=int, default=10)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 4, 16, 64],
+            help="Operations at once per host",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            nargs=2,
+            default=[0.01, 0.05],
+            metavar=("MIN", "MAX"),
+            help="Seconds each operation takes",
+        )
+        parser.add_argument("--failure-rate", type=float, default=0.01)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """
+        Each concurrency runs the same batches on a fresh driver, creating
+        the machines and then starting them.
+        """
+        self.stdout.write(
+            f"{'per host':>9}{'ops':>8}{'failed':>8}{'seconds':>9}{'ops/s':>9}"
+            f"{'p50 ms':>9}{'p99 ms':>9}",
+        )
+        for concurrency in options["concurrency"]:
+            driver = FakeDriver(
+                *options["latency"],
+                failure_rate=options["failure_rate"],
+                seed=options["seed"],
+                strict=True,
+            )
+            orchestrator = Orchestrator(driver, host_concurrency=concurrency)
+            results = []
+            started = time.perf_counter()
+            for batch in provisioning(options["machines"], options["hosts"]):
+                results += orchestrator.run_sync(batch)
+            elapsed = time.perf_counter() - started
+
+            durations = [result.duration for result in results]
+            percentiles = statistics.quantiles(durations, n=100)
+            self.stdout.write(
+                f"{concurrency:>9}{len(results):>8}"
+                f"{sum(not result.ok for result in results):>8}"
+                f"{elapsed:>9.2f}{len(results) / elapsed:>9.0f}"
+                f"{percentiles[49] * 1000:>9.1f}{percentiles[98] * 1000:>9.1f}",
+            )
@@ -0,0 +1,130 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from autovm.resources.models import VirtualMachine
+from autovm.users.models import User
+
+
+def percentile(samples, percent):
+    """
+    Nearest-rank percentile of a list of samples.
+    """
+    ordered = sorted(samples)
+    index = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    """
+    Compare the sync DRF views with their async-native variants under load
+    """
+
+    help = "Benchmark throughput and latency of the sync and async API views"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--email",
+            default="customer1@mail.com",
+            help="User to authenticate as, see initializedata",
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--host",
+            default=(settings.ALLOWED_HOSTS or ["localhost"])[0],
+            help="Host to address requests to, must be in ALLOWED_HOSTS",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Requests are driven in-process through the ASGI handler, so the numbers
+        measure the application rather than the network or the server.
+        """
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            msg = f"User {options['email']} does not exist, run initializedata first"
+            raise CommandError(msg)
+
+        endpoints: list[tuple[str, str, str, dict]] = [
+            ("vm list", "api:virtualmachine-list", "api:async-virtualmachine-list", {}),
+            (
+                "vm statistics",
+                "api:virtualmachine-statistics",
+                "api:async-virtualmachine-statistics",
+                {},
+            ),
+            (
+                "notifications",
+                "api:notification-list",
+                "api:async-notification-list",
+                {},
+            ),
+            (
+                "balance",
+                "api:billingaccount-balance",
+                "api:async-billingaccount-balance",
+                {},
+            ),
+        ]
+        machine = VirtualMachine.objects.filter(user=user).first()
+        if machine is not None:
+            endpoints.append(
+                (
+                    "vm detail",
+                    "api:virtualmachine-detail",
+                    "api:async-virtualmachine-detail",
+                    {"pk": machine.pk},
+                ),
+            )
+
+        client = AsyncClient(server=(options["host"], "80"))
+        headers = {"authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+        self.stdout.write(
+            f"{'endpoint':<16}{'view':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}",
+        )
+        for label, sync_name, async_name, kwargs in endpoints:
+            for mode, name in (("sync", sync_name), ("async", async_name)):
+                path = reverse(name, kwargs=kwargs)
+                throughput, latencies = asyncio.run(
+                    self.run(
+                        client,
+                        path,
+                        headers,
+                        options["requests"],
+                        options["concurrency"],
+                    ),
+                )
+                self.stdout.write(
+                    f"{label:<16}{mode:<8}{throughput:>10.1f}"
+                    f"{statistics.median(latencies) * 1000:>10.2f}"
+                    f"{percentile(latencies, 99) * 1000:>10.2f}",
+                )
+
+    async def run(self, client, path, headers, total, concurrency):
+        """
+        Issue ``total`` GET requests with at most ``concurrency`` in flight.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:  # noqa: PLR2004
+                    msg = f"GET {path} returned {response.status_code}"
+                    raise CommandError(msg)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(total)))
+        return total / (time.perf_counter() - started), latencies
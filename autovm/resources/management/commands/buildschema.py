@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from autovm.resources.api.schema import build_schema
+
+
+class Command(BaseCommand):
+    """
+    Precompute the OpenAPI schema served at /api/schema/
+    """
+
+    help = "Generate the OpenAPI schema artifacts served by the schema view"
+
+    def handle(self, *args, **options):
+        paths = build_schema()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {len(paths)} schema artifacts to {settings.API_SCHEMA_DIR}",
+            ),
+        )
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db import models
+from django.db.models import OuterRef
+from django.db.models import Subquery
+
+
+def populate_search_vector(apps, schema_editor):
+    """
+    Compute the search vector of existing machines.
+    """
+    VirtualMachine = apps.get_model("resources", "VirtualMachine")
+    vector = (
+        VirtualMachine.objects.filter(pk=OuterRef("pk"))
+        .annotate(
+            vector=SearchVector("name", weight="A", config="simple")
+            + SearchVector("description", weight="B", config="simple")
+            + SearchVector(
+                "user__name",
+                "region__name",
+                "operating_system_version__operating_system__name",
+                "operating_system_version__version",
+                weight="C",
+                config="simple",
+            ),
+        )
+        .values("vector")
+    )
+    VirtualMachine.objects.update(search_vector=Subquery(vector))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("resources", "0009_idempotencykey"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="virtualmachine",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                null=True,
+            ),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="virtualmachine",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"],
+                name="vm_search_vector_gin",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="virtualmachine",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    models.F("name"),
+                    name="gin_trgm_ops",
+                ),
+                name="vm_name_trgm_gin",
+            ),
+        ),
+    ]
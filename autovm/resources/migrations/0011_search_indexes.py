@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:31
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("resources", "0010_virtualmachine_search_vector"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="backup",
+            index=models.Index(fields=["created"], name="backup_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass("message", name="gin_trgm_ops"),
+                name="notification_message_trgm_gin",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="virtualmachinehistory",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    "description", name="gin_trgm_ops"
+                ),
+                name="vmhistory_description_trgm_gin",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("resources", "0011_search_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="virtualmachine",
+            name="next_backup_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="virtualmachine",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["region", "next_backup_at"],
+                name="vm_next_backup_idx",
+            ),
+        ),
+        # existing machines come due at random over their first interval
+        migrations.RunSQL(
+            """
+            UPDATE resources_virtualmachine
+            SET next_backup_at = now() + random() * CASE backup_freq
+                WHEN 'weekly' THEN interval '7 days'
+                WHEN 'monthly' THEN interval '30 days'
+                ELSE interval '1 day'
+            END
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
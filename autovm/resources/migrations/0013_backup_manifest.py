@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("resources", "0012_backup_schedule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="backup",
+            name="manifest",
+            field=models.CharField(
+                blank=True,
+                help_text="Digest of the manifest of the backed up image in the backup store",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("resources", "0013_backup_manifest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="virtualmachine",
+            name="state",
+            field=models.CharField(
+                choices=[
+                    ("provisioning", "Provisioning"),
+                    ("starting", "Starting"),
+                    ("running", "Running"),
+                    ("stopping", "Stopping"),
+                    ("stopped", "Stopped"),
+                    ("migrating", "Migrating"),
+                    ("error", "Error"),
+                ],
+                default="provisioning",
+                editable=False,
+                max_length=20,
+            ),
+        ),
+        # machines created before lifecycles run as they were
+        migrations.RunSQL(
+            """
+            UPDATE resources_virtualmachine
+            SET state = CASE WHEN is_active THEN 'running' ELSE 'stopped' END
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:29
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("resources", "0015_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Host",
+            fields=[
+                (
+                    "_id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("cpus", models.PositiveIntegerField(help_text="Virtual CPUs")),
+                ("memory", models.PositiveIntegerField(help_text="Memory in GB")),
+                ("disk", models.PositiveIntegerField(help_text="Disk space in GB")),
+                ("used_cpus", models.PositiveIntegerField(default=0, editable=False)),
+                ("used_memory", models.PositiveIntegerField(default=0, editable=False)),
+                ("used_disk", models.PositiveIntegerField(default=0, editable=False)),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "region",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hosts",
+                        to="resources.region",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="virtualmachine",
+            name="host",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="machines",
+                to="resources.host",
+            ),
+        ),
+    ]
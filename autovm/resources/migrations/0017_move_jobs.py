@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("resources", "0016_hosts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="archivedjob",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("provision", "Provision VM"),
+                    ("start", "Start VM"),
+                    ("stop", "Stop VM"),
+                    ("restart", "Restart VM"),
+                    ("backup", "Backup VM"),
+                    ("move", "Move VM"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("provision", "Provision VM"),
+                    ("start", "Start VM"),
+                    ("stop", "Stop VM"),
+                    ("restart", "Restart VM"),
+                    ("backup", "Backup VM"),
+                    ("move", "Move VM"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -1,8 +1,26 @@
+import random
 import uuid
+from datetime import timedelta
 
 import slugify
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
 from django.db import models
-
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from autovm.billing.metering import record_usage
+from autovm.billing.metering import usage_event
+from autovm.billing.models import UsageEvent
 from autovm.resources.utils.generate_vm_name import generate_vm_name
 from autovm.users.models import User
 
@@ -77,6 +95,135 @@ class Region(CommonBaseModel):
         super().save(*args, **kwargs)
 
 
+class HostQuerySet(models.QuerySet):
+    """
+    Host queries
+    """
+
+    def reserve(self, cpus, memory, disk):
+        """
+        Take capacity on the hosts that have enough of it free, in a single
+        conditional UPDATE, returning how many did. Like machine
+        transitions, concurrent reservations need no row locks.
+        """
+        return self.filter(
+            is_active=True,
+            used_cpus__lte=F("cpus") - cpus,
+            used_memory__lte=F("memory") - memory,
+            used_disk__lte=F("disk") - disk,
+        ).update(
+            used_cpus=F("used_cpus") + cpus,
+            used_memory=F("used_memory") + memory,
+            used_disk=F("used_disk") + disk,
+            updated=timezone.now(),
+        )
+
+    def adjust(self, cpus, memory, disk):
+        """
+        Change the capacity used on the hosts by the given amounts, negative
+        ones to release it.
+        """
+        return self.update(
+            used_cpus=F("used_cpus") + cpus,
+            used_memory=F("used_memory") + memory,
+            used_disk=F("used_disk") + disk,
+            updated=timezone.now(),
+        )
+
+
+class Host(CommonBaseModel):
+    """
+    Hypervisor host of a region, with its capacity and how much of it the
+    machines placed on it use, see placement
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name="hosts")
+    cpus = models.PositiveIntegerField(help_text="Virtual CPUs")
+    memory = models.PositiveIntegerField(help_text="Memory in GB")
+    disk = models.PositiveIntegerField(help_text="Disk space in GB")
+    used_cpus = models.PositiveIntegerField(default=0, editable=False)
+    used_memory = models.PositiveIntegerField(default=0, editable=False)
+    used_disk = models.PositiveIntegerField(default=0, editable=False)
+    # inactive hosts keep their machines but get no new ones
+    is_active = models.BooleanField(default=True)
+
+    objects = HostQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+
+# the columns the virtual machine search box matches, most relevant first
+SEARCH_VECTOR = (
+    SearchVector("name", weight="A", config="simple")
+    + SearchVector("description", weight="B", config="simple")
+    + SearchVector(
+        "user__name",
+        "region__name",
+        "operating_system_version__operating_system__name",
+        "operating_system_version__version",
+        weight="C",
+        config="simple",
+    )
+)
+# saving any of these fields changes the search vector
+SEARCH_VECTOR_FIELDS = {
+    "name",
+    "description",
+    "user",
+    "region",
+    "operating_system_version",
+}
+
+
+class VirtualMachineQuerySet(models.QuerySet):
+    """
+    Virtual machine queries
+    """
+
+    def update_search_vector(self, **fields):
+        """
+        Recompute the search vector of the machines in a single UPDATE, along
+        with any other ``fields`` given. The vector is built in a subquery
+        since UPDATE can't reference joined columns directly.
+        """
+        vector = (
+            VirtualMachine.objects.filter(pk=OuterRef("pk"))
+            .annotate(vector=SEARCH_VECTOR)
+            .values("vector")
+        )
+        return self.update(search_vector=Subquery(vector), **fields)
+
+    def transition(self, sources, target):
+        """
+        Move the machines that are in one of the ``sources`` states to
+        ``target`` in a single conditional UPDATE, returning the ids of those
+        that moved. Rows aren't locked beforehand: of concurrent transitions
+        of a machine, the first to update it wins and the state no longer
+        matches the others' condition when Postgres rechecks it.
+        """
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        meta = self.model._meta
+        try:
+            machines, params = (
+                self.order_by().values("pk").query.get_compiler(self.db).as_sql()
+            )
+        except EmptyResultSet:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote_name(meta.db_table)} "  # noqa: S608
+                f"SET {quote_name('state')} = %s, {quote_name('updated')} = %s "
+                f"WHERE {quote_name('state')} = ANY(%s) "
+                f"AND {quote_name(meta.pk.column)} IN ({machines}) "
+                f"RETURNING {quote_name(meta.pk.column)}",
+                [target, timezone.now(), list(sources), *params],
+            )
+            return [pk for (pk,) in cursor.fetchall()]
+
+
 class VirtualMachine(CommonBaseModel):
     """
     Virtual Machine model.
@@ -109,8 +256,32 @@ class VirtualMachine(CommonBaseModel):
         choices=backup_frequency,
         default="daily",
     )
+    BACKUP_INTERVALS = {
+        "daily": timedelta(days=1),
+        "weekly": timedelta(weeks=1),
+        "monthly": timedelta(days=30),
+    }
+    # when the backup scheduler next backs the machine up, see backups
+    next_backup_at = models.DateTimeField(null=True, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
 
+    STATE_CHOICES = [
+        ("provisioning", "Provisioning"),
+        ("starting", "Starting"),
+        ("running", "Running"),
+        ("stopping", "Stopping"),
+        ("stopped", "Stopped"),
+        ("migrating", "Migrating"),
+        ("error", "Error"),
+    ]
+    # only changed by transitions, see lifecycle
+    state = models.CharField(
+        max_length=20,
+        choices=STATE_CHOICES,
+        default="provisioning",
+        editable=False,
+    )
+
     STORAGE_CHOICES = [
         ("200", "200 GB SSD"),
         ("300", "300 GB SSD"),
@@ -120,6 +291,27 @@ class VirtualMachine(CommonBaseModel):
     ]
 
     disk_size = models.CharField(max_length=20, choices=STORAGE_CHOICES, default="200")
+    # virtual CPUs and GB of memory of the machines of each storage size
+    SIZES = {
+        "200": (1, 2),
+        "300": (2, 4),
+        "400": (2, 8),
+        "600": (4, 16),
+        "1000": (8, 32),
+    }
+    # where the machine runs, chosen by the placement engine, see placement
+    host = models.ForeignKey(
+        Host,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="machines",
+    )
+    # kept up to date on save and when related names change, see signals
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = VirtualMachineQuerySet.as_manager()
 
     class Meta:
         """
@@ -127,14 +319,109 @@ class VirtualMachine(CommonBaseModel):
         """
 
         ordering = ["-created"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="vm_search_vector_gin"),
+            # serves fuzzy matches on the name when full-text search misses
+            GinIndex(
+                OpClass(F("name"), name="gin_trgm_ops"),
+                name="vm_name_trgm_gin",
+            ),
+            # serves the backup scheduler's lookup of due machines per region
+            models.Index(
+                fields=["region", "next_backup_at"],
+                condition=Q(is_active=True),
+                name="vm_next_backup_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.user})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the stored backup frequency, so that save can tell when the
+        schedule changes
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._stored_backup_freq = instance.__dict__.get("backup_freq")
+        instance._stored_disk_size = instance.__dict__.get("disk_size")
+        instance._stored_region_id = instance.__dict__.get("region_id")
+        instance._stored_user_id = instance.__dict__.get("user_id")
+        return instance
+
+    @classmethod
+    def resources_of(cls, disk_size):
+        """
+        The virtual CPUs, GB of memory and GB of disk a machine of a storage
+        size takes on its host.
+        """
+        cpus, memory = cls.SIZES[disk_size]
+        return cpus, memory, int(disk_size)
+
     def save(self, *args, **kwargs):
         if not self.name:
             self.name = generate_vm_name(type(self))
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # a transition since the machine was loaded isn't undone
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name != "state"
+                and field.attname not in deferred
+            ]
+        stored_freq = getattr(self, "_stored_backup_freq", self.backup_freq)
+        if self.next_backup_at is None or self.backup_freq != stored_freq:
+            self.schedule_next_backup()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "next_backup_at"}
         super().save(*args, **kwargs)
+        self._stored_backup_freq = self.backup_freq
+        stored_size = getattr(self, "_stored_disk_size", None)
+        resized = stored_size is not None and stored_size != self.disk_size
+        if self.host_id and resized:
+            # resized machines stay on their host, even if that overcommits it
+            resources = zip(
+                self.resources_of(self.disk_size),
+                self.resources_of(stored_size),
+                strict=True,
+            )
+            Host.objects.filter(pk=self.host_id).adjust(
+                *(new - old for new, old in resources),
+            )
+        stored_region_id = getattr(self, "_stored_region_id", self.region_id)
+        stored_user_id = getattr(self, "_stored_user_id", self.user_id)
+        if stored_user_id != self.user_id:
+            # unassigned machines are recorded too, so their last owner is no
+            # longer metered for them
+            usage_event(self, UsageEvent.ASSIGNED).save()
+        elif resized or stored_region_id != self.region_id:
+            record_usage(
+                [self],
+                UsageEvent.RESIZED if resized else UsageEvent.MOVED,
+            )
+        self._stored_disk_size = self.disk_size
+        self._stored_region_id = self.region_id
+        self._stored_user_id = self.user_id
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or SEARCH_VECTOR_FIELDS.intersection(update_fields):
+            type(self).objects.filter(pk=self.pk).update_search_vector()
+
+    def schedule_next_backup(self, after=None):
+        """
+        Set the next backup one backup interval after ``after``, give or take
+        half of BACKUP_JITTER, so that machines created or backed up together
+        drift apart instead of all coming due at the same moment.
+        """
+        jitter = settings.BACKUP_JITTER * (random.random() - 0.5)  # noqa: S311
+        self.next_backup_at = (
+            (after or timezone.now())
+            + self.BACKUP_INTERVALS[self.backup_freq]
+            + timedelta(seconds=jitter)
+        )
 
 
 class VirtualMachineHistory(CommonBaseModel):
@@ -170,6 +457,12 @@ class VirtualMachineHistory(CommonBaseModel):
         """
 
         ordering = ["-created"]
+        indexes = [
+            GinIndex(
+                OpClass("description", name="gin_trgm_ops"),
+                name="vmhistory_description_trgm_gin",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.name} {self.get_action_display()} at {self.created}"
@@ -188,6 +481,18 @@ class Backup(CommonBaseModel):
 
     # since the size of a vm can be edited, we store this at the time of backup
     size = models.IntegerField(help_text="Backup size in GB")
+    manifest = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="Digest of the manifest of the backed up image in the backup store",
+    )
+
+    class Meta:
+        """
+        Backups are searched by day
+        """
+
+        indexes = [models.Index(fields=["created"], name="backup_created_idx")]
 
     def __str__(self):
         return f"Backup of {self.vm.name} at {self.created}"
@@ -212,6 +517,127 @@ class Notification(CommonBaseModel):
         """
 
         ordering = ["-created"]
+        indexes = [
+            GinIndex(
+                OpClass("message", name="gin_trgm_ops"),
+                name="notification_message_trgm_gin",
+            ),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.name}"
+
+
+class IdempotencyKey(CommonBaseModel):
+    """
+    Response of a POST sent with an Idempotency-Key header, replayed when the
+    client retries the request with the same key
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=255)
+    # hash of the method, path and payload the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    body = models.JSONField(null=True, encoder=JSONEncoder)
+    headers = models.JSONField(default=dict)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        """
+        Keys are chosen by clients, so they are only unique per user
+        """
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"],
+                name="unique_idempotency_key_per_user",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} of {self.user}"
+
+
+class BaseJob(CommonBaseModel):
+    """
+    Fields of jobs, shared by live and archived ones
+    """
+
+    ACTION_CHOICES = [
+        ("provision", "Provision VM"),
+        ("start", "Start VM"),
+        ("stop", "Stop VM"),
+        ("restart", "Restart VM"),
+        ("backup", "Backup VM"),
+        ("move", "Move VM"),
+    ]
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("succeeded", "Succeeded"),
+        ("failed", "Failed"),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    # machines the job works on, and how many of them it is done with
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, encoder=JSONEncoder)
+    error = models.TextField(blank=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """
+        Do not create a table for this model
+        """
+
+        abstract = True
+
+
+class Job(BaseJob):
+    """
+    A long-running operation on virtual machines, carried out by a Celery
+    task, see jobs
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="jobs")
+
+    class Meta:
+        """
+        Jobs are listed per user, newest first, and archived once finished
+        """
+
+        ordering = ["-created"]
+        indexes = [
+            models.Index(fields=["user", "-created"], name="job_user_created_idx"),
+            models.Index(
+                fields=["finished"],
+                condition=Q(finished__isnull=False),
+                name="job_finished_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} job of {self.user} ({self.status})"
+
+
+class ArchivedJob(BaseJob):
+    """
+    A finished job moved out of the jobs table, see jobs.archive_jobs
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_jobs",
+    )
+
+    def __str__(self):
+        return f"Archived {self.get_action_display()} job of {self.user}"
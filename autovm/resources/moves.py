@@ -0,0 +1,229 @@
+"""
+Moves of virtual machines between regions.
+
+A move live-migrates machines to hosts of another region, a single machine
+or a whole batch of them, as when a region is evacuated. Like lifecycle
+actions, it first moves the machines from ``running`` or ``stopped`` into
+``migrating`` with conditional UPDATEs, so a machine goes through one move
+at a time, and the ``move_machines`` task carries it out
+MIGRATION_BATCH_SIZE machines at a time. For each batch:
+
+- capacity is reserved for each machine on a host of the destination
+  region, or of any other region when evacuating without one, see
+  autovm.resources.placement;
+- the machines are migrated through the orchestrator, which caps the
+  migrations out of and into each host;
+- in one transaction, the machines that made it are switched to their new
+  host and region, the capacity they took on their old hosts is released,
+  their history is written and they go back to the state they were in.
+
+Machines the hypervisor failed to migrate end up in ``error`` and give
+their reservation back, those no host had room for go back to the state
+they were in. Once the job is done, the owners are notified of how many of
+their machines moved.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from autovm.billing.metering import record_usage
+from autovm.billing.models import UsageEvent
+from autovm.resources import placement
+from autovm.resources.drivers import Operation
+from autovm.resources.drivers import Orchestrator
+from autovm.resources.lifecycle import host_of
+from autovm.resources.models import Host
+from autovm.resources.models import Notification
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+
+logger = logging.getLogger(__name__)
+
+# the states machines can be moved in, and go back to once moved
+MOVABLE = ("running", "stopped")
+
+
+def begin_move(machines, region_id=None):
+    """
+    Move ``machines``, a queryset, into ``migrating``, returning the id and
+    the state it was in of those that could. Machines already in the
+    destination region are left as they are.
+    """
+    if region_id:
+        machines = machines.exclude(region=region_id)
+    return [
+        (pk, state)
+        for state in MOVABLE
+        for pk in machines.transition([state], "migrating")
+    ]
+
+
+def abandon_moves(moves):
+    """
+    Put machines ``begin_move`` moved into ``migrating`` back in the state
+    they were in, when their move won't be carried out.
+    """
+    states = {}
+    for pk, state in moves:
+        states.setdefault(state, []).append(pk)
+    for state, machines in states.items():
+        VirtualMachine.objects.filter(pk__in=machines).transition(
+            ["migrating"],
+            state,
+        )
+
+
+def reserve_destination(machine, region_id):
+    """
+    The host and region a machine moves to, with its capacity reserved
+    there, None if no host has room for it. Machines moving to a region
+    without hosts go there unplaced.
+    """
+    try:
+        reserved = placement.reserve(
+            *machine.resources_of(machine.disk_size),
+            [region_id] if region_id else None,
+            exclude=[machine.region_id] if machine.region_id else (),
+        )
+    except placement.NoCapacityError as error:
+        logger.warning(f"Can't move {machine.name}: {error}")
+        return None
+    if reserved is None and region_id:
+        return None, region_id
+    return reserved
+
+
+def perform_moves(moves, region_id, user_id, orchestrator=None):
+    """
+    Move machines ``begin_move`` moved into ``migrating`` to the region
+    ``region_id``, or out of their region if None, and record the outcome.
+    Returns the ids of the machines that moved and of those that didn't.
+    """
+    orchestrator = orchestrator or Orchestrator()
+    if region_id:
+        # tasks are sent a string, the placement index is keyed by UUID
+        region_id = Region.objects.get(pk=region_id).pk
+    states = {str(pk): state for pk, state in moves}
+    machines = list(
+        VirtualMachine.objects.filter(pk__in=states).select_related("host", "region"),
+    )
+    destinations = {}
+    unplaced = []
+    for machine in machines:
+        destination = reserve_destination(machine, region_id)
+        if destination is None:
+            unplaced.append(machine)
+        else:
+            destinations[machine.pk] = destination
+    placed = [machine for machine in machines if machine.pk in destinations]
+
+    hosts = dict(
+        Host.objects.filter(
+            pk__in=[host for host, _ in destinations.values() if host],
+        ).values_list("pk", "name"),
+    )
+    regions = Region.objects.in_bulk({region for _, region in destinations.values()})
+    results = orchestrator.run_sync(
+        [
+            Operation(
+                "migrate",
+                machine.name,
+                host_of(machine),
+                {
+                    "destination": hosts.get(destinations[machine.pk][0])
+                    or regions[destinations[machine.pk][1]].slug,
+                },
+            )
+            for machine in placed
+        ],
+    )
+    moved = []
+    failed = []
+    for machine, result in zip(placed, results, strict=True):
+        if result.ok:
+            moved.append(machine)
+        else:
+            logger.warning(f"Failed to move {machine.name}: {result.error}")
+            failed.append(machine)
+
+    with transaction.atomic():
+        # the capacity taken on the hosts moved from, and reserved on those
+        # failed to move to
+        placement.release(
+            [(machine.host_id, machine.disk_size) for machine in moved]
+            + [(destinations[machine.pk][0], machine.disk_size) for machine in failed],
+        )
+        history = []
+        now = timezone.now()
+        for machine in moved:
+            source = machine.region.name if machine.region else "no region"
+            machine.host_id, machine.region_id = destinations[machine.pk]
+            machine.updated = now
+            history.append(
+                VirtualMachineHistory(
+                    virtual_machine_id=machine.pk,
+                    action="move_vm",
+                    description="moved the virtual machine from "
+                    f"{source} to {regions[machine.region_id].name}",
+                    user_id=user_id,
+                ),
+            )
+        VirtualMachine.objects.bulk_update(moved, ["host", "region", "updated"])
+        VirtualMachine.objects.filter(
+            pk__in=[machine.pk for machine in moved],
+        ).update_search_vector()
+        VirtualMachineHistory.objects.bulk_create(history)
+        for state in MOVABLE:
+            record_usage(
+                [machine for machine in moved if states[str(machine.pk)] == state],
+                UsageEvent.MOVED,
+                running=state == "running",
+            )
+        record_usage(failed, UsageEvent.STOPPED)
+
+        VirtualMachine.objects.filter(
+            pk__in=[machine.pk for machine in failed],
+        ).transition(["migrating"], "error")
+        succeeded = []
+        for state in MOVABLE:
+            succeeded += VirtualMachine.objects.filter(
+                pk__in=[
+                    machine.pk for machine in moved if states[str(machine.pk)] == state
+                ],
+            ).transition(["migrating"], state)
+            VirtualMachine.objects.filter(
+                pk__in=[
+                    machine.pk
+                    for machine in unplaced
+                    if states[str(machine.pk)] == state
+                ],
+            ).transition(["migrating"], state)
+    return succeeded, [machine.pk for machine in failed + unplaced]
+
+
+def notify_owners(machine_ids, region_id=None):
+    """
+    Tell the owners of machines that moved how many of theirs did, with one
+    notification each. Unassigned machines have no one to tell.
+    """
+    destination = (
+        Region.objects.get(pk=region_id).name if region_id else "other regions"
+    )
+    owners = (
+        VirtualMachine.objects.filter(pk__in=machine_ids, user__isnull=False)
+        .values("user")
+        .annotate(machines=Count("pk"))
+        .order_by()
+    )
+    Notification.objects.bulk_create(
+        Notification(
+            user_id=owner["user"],
+            message=f"{owner['machines']} of your virtual machines "
+            f"moved to {destination}.",
+        )
+        for owner in owners
+    )
@@ -0,0 +1,281 @@
+"""
+Placement of virtual machines on hosts.
+
+Hosts have a capacity of virtual CPUs, memory and disk and keep count of how
+much of it their machines use, a machine taking what its storage size calls
+for, see VirtualMachine.SIZES. A new machine goes on a host of its region
+with enough of each free, or of any region if it has none, picked following
+PLACEMENT_STRATEGY:
+
+- ``binpack`` picks the host with the least memory free that fits, filling
+  hosts up before starting on others, which keeps room for large machines.
+- ``spread`` picks the host with the most memory free, which balances the
+  load and limits how many machines a failing host takes down.
+
+Hosts are picked from a PlacementIndex, the free capacity of the active
+hosts held in the memory of the process, sorted by free memory per region so
+that the fitting hosts are found by bisection. It is refreshed
+incrementally, loading only the hosts updated since the last refresh once
+PLACEMENT_REFRESH_INTERVAL seconds have passed. The capacity is reserved by
+a conditional UPDATE of the host, which fails when other processes took it
+meanwhile, in which case another host is picked and the host reloaded once
+the transaction ends. The index only takes reservations off once their
+transaction commits, as they are rolled back with it otherwise.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from autovm.resources.models import Host
+from autovm.resources.models import VirtualMachine
+
+STRATEGIES = ("binpack", "spread")
+
+
+class NoCapacityError(Exception):
+    """
+    No host has room for a machine.
+    """
+
+
+class PlacementIndex:
+    """
+    Free capacity of the active hosts, see the module docstring. Hosts are
+    entered with their free (cpus, memory, disk).
+    """
+
+    def __init__(self):
+        # (free memory, free cpus, free disk, host id) per region, sorted
+        self.regions = defaultdict(list)
+        # the region and entry of each host
+        self.hosts = {}
+        self.refreshed = None
+        self.checked = None
+
+    def update(self, pk, region_id, free, *, active=True):
+        """
+        Set the free capacity of a host, or remove it if it isn't active.
+        """
+        self.remove(pk)
+        if active:
+            cpus, memory, disk = free
+            entry = (memory, cpus, disk, pk)
+            bisect.insort(self.regions[region_id], entry)
+            self.hosts[pk] = (region_id, entry)
+
+    def remove(self, pk):
+        if pk in self.hosts:
+            region_id, entry = self.hosts.pop(pk)
+            entries = self.regions[region_id]
+            del entries[bisect.bisect_left(entries, entry)]
+
+    def take(self, pk, cpus, memory, disk):
+        """
+        Take capacity off a host, once it is reserved.
+        """
+        region_id, (free_memory, free_cpus, free_disk, _) = self.hosts[pk]
+        self.update(
+            pk,
+            region_id,
+            (free_cpus - cpus, free_memory - memory, free_disk - disk),
+        )
+
+    def candidate(self, region_id, cpus, memory, disk, strategy, skip=()):
+        """
+        The entry of the host of a region that the strategy picks for a
+        machine, None if none but the skipped hosts has room. Hosts with too
+        little memory free are skipped by bisection, the others are tried
+        from the least free for binpack and the most free for spread.
+        """
+        entries = self.regions.get(region_id, [])
+        start = bisect.bisect_left(entries, (memory,))
+        if strategy == "binpack":
+            positions = range(start, len(entries))
+        else:
+            positions = range(len(entries) - 1, start - 1, -1)
+        for position in positions:
+            entry = entries[position]
+            if entry[1] >= cpus and entry[2] >= disk and entry[3] not in skip:
+                return entry
+        return None
+
+    def find(self, regions, cpus, memory, disk, strategy, skip=()):
+        """
+        The host of the given regions that the strategy picks for a machine
+        needing the given capacity, None if none but the skipped hosts has
+        room.
+        """
+        if strategy not in STRATEGIES:
+            msg = f"Unknown placement strategy {strategy}"
+            raise ValueError(msg)
+        candidates = [
+            entry
+            for region_id in regions
+            if (entry := self.candidate(region_id, cpus, memory, disk, strategy, skip))
+        ]
+        if not candidates:
+            return None
+        return (min if strategy == "binpack" else max)(candidates)[-1]
+
+    def region_of(self, pk):
+        return self.hosts[pk][0]
+
+    def refresh(self, hosts=None):
+        """
+        Load the hosts updated since the last refresh, all of them the first
+        time, or only the given ones, dropping those that no longer exist.
+        """
+        started = timezone.now()
+        queryset = Host.objects.all()
+        if hosts is not None:
+            queryset = queryset.filter(pk__in=hosts)
+        elif self.refreshed:
+            # hosts committed late carry an earlier time, so the windows overlap
+            queryset = queryset.filter(
+                updated__gte=self.refreshed
+                - timedelta(seconds=settings.PLACEMENT_REFRESH_OVERLAP),
+            )
+        loaded = set()
+        for host in queryset.values(
+            "pk",
+            "region_id",
+            "is_active",
+            "cpus",
+            "memory",
+            "disk",
+            "used_cpus",
+            "used_memory",
+            "used_disk",
+        ):
+            self.update(
+                host["pk"],
+                host["region_id"],
+                (
+                    host["cpus"] - host["used_cpus"],
+                    host["memory"] - host["used_memory"],
+                    host["disk"] - host["used_disk"],
+                ),
+                active=host["is_active"],
+            )
+            loaded.add(host["pk"])
+        if hosts is not None:
+            for pk in set(hosts) - loaded:
+                self.remove(pk)
+        else:
+            self.refreshed = started
+            self.checked = time.monotonic()
+
+    def refresh_if_stale(self):
+        if (
+            self.checked is None
+            or time.monotonic() - self.checked > settings.PLACEMENT_REFRESH_INTERVAL
+        ):
+            self.refresh()
+
+
+@functools.cache
+def get_placement_index():
+    """
+    The index of this process.
+    """
+    return PlacementIndex()
+
+
+placement_lock = threading.Lock()
+
+
+def _take(pk, cpus, memory, disk):
+    """
+    Take a committed reservation off the index of this process.
+    """
+    with placement_lock:
+        index = get_placement_index()
+        if pk in index.hosts:
+            index.take(pk, cpus, memory, disk)
+
+
+def _reload(pk):
+    with placement_lock:
+        get_placement_index().refresh(hosts=[pk])
+
+
+def reserve(cpus, memory, disk, regions=None, *, exclude=(), strategy=None):
+    """
+    Reserve capacity on the host of ``regions`` the strategy picks, or of
+    any region but those excluded, returning the host's id and region. None
+    is returned when the regions have no host registered, NoCapacityError
+    raised when they have but none has room.
+    """
+    strategy = strategy or settings.PLACEMENT_STRATEGY
+    index = get_placement_index()
+    with placement_lock:
+        index.refresh_if_stale()
+        if regions is None:
+            regions = [region for region in index.regions if region not in exclude]
+    # hosts other transactions took the capacity of meanwhile
+    taken = set()
+    while True:
+        with placement_lock:
+            pk = index.find(regions, cpus, memory, disk, strategy, taken)
+            if pk is None:
+                break
+            region_id = index.region_of(pk)
+        # the UPDATE waits on the row lock of transactions reserving on the
+        # same host, so it runs without holding the lock of the process
+        if Host.objects.filter(pk=pk).reserve(cpus, memory, disk):
+            transaction.on_commit(partial(_take, pk, cpus, memory, disk))
+            return pk, region_id
+        taken.add(pk)
+        # reloaded inside the transaction, the host would keep its
+        # reservations in the index if it rolled back
+        transaction.on_commit(partial(_reload, pk))
+
+    hosts = Host.objects.exclude(region__in=exclude)
+    if regions:
+        hosts = hosts.filter(region__in=regions)
+    if hosts.exists():
+        msg = f"No host has room for {cpus} CPUs, {memory} GB of memory and {disk} GB"
+        raise NoCapacityError(msg)
+    return None
+
+
+def release(machines):
+    """
+    Give back the capacity machines took on their hosts, given as pairs of
+    host id and storage size, with one UPDATE per host.
+    """
+    freed = defaultdict(lambda: [0, 0, 0])
+    for host_id, disk_size in machines:
+        if host_id:
+            for position, amount in enumerate(VirtualMachine.resources_of(disk_size)):
+                freed[host_id][position] += amount
+    for host_id, (cpus, memory, disk) in freed.items():
+        Host.objects.filter(pk=host_id).adjust(-cpus, -memory, -disk)
+
+
+def place(machine, strategy=None):
+    """
+    Place a new machine on a host and save it, returning the host's id. The
+    machine is left unplaced, returning None, when no host is registered in
+    its region, so that regions are usable before their hosts are tracked.
+    NoCapacityError is raised when hosts are but none has room.
+    """
+    reserved = reserve(
+        *machine.resources_of(machine.disk_size),
+        [machine.region_id] if machine.region_id else None,
+        strategy=strategy,
+    )
+    if reserved is None:
+        return None
+    machine.host_id, machine.region_id = reserved
+    machine.save(update_fields=["host", "region"])
+    return machine.host_id
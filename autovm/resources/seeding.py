@@ -0,0 +1,303 @@
+"""
+Bulk seeding of realistic data volumes, for benchmarks and load tests.
+"""
+
+import random
+import string
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import astuple
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import islice
+
+import slugify
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db import transaction
+from django.utils import timezone
+
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.billing.models import Transaction
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.users.models import Customer
+from autovm.users.models import User
+
+# seeded users have emails at this domain and machines names with this prefix
+SEED_DOMAIN = "seed.autovm.test"
+MACHINE_PREFIX = "SEED"
+
+PLANS = [
+    ("bronze", 200, 2, 2),
+    ("silver", 600, 2, 2),
+    ("gold", 800, 3, 3),
+    ("platinum", 1200, 8, 8),
+]
+REGIONS = ["South Africa", "US West", "Germany Central", "EU East"]
+OPERATING_SYSTEMS = {
+    "Ubuntu": ["20.04", "22.04", "24.04"],
+    "CentOS": ["8", "9"],
+    "Fedora": ["39", "40"],
+}
+
+
+@dataclass(frozen=True)
+class Volumes:
+    """
+    Number of rows to seed, the defaults are those of a large deployment.
+    """
+
+    users: int = 10_000
+    machines: int = 100_000
+    history: int = 1_000_000
+    transactions: int = 100_000
+
+    def scale(self, factor):
+        return Volumes(*(max(1, round(count * factor)) for count in astuple(self)))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class BulkSeeder:
+    """
+    Insert users with their customer profile, billing account and active
+    subscription, then machines, history entries and transactions spread
+    over them.
+
+    Rows are inserted ``batch_size`` at a time with ``bulk_create``, which
+    skips ``save()`` and signals, so whatever those maintain is filled in
+    here. Values are drawn from a random generator seeded with ``seed``, so
+    that every run produces the same data. All users share one password
+    hash, computed once.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        batch_size=5_000,
+        password="password",  # noqa: S107
+        log=None,
+    ):
+        self.random = random.Random(seed)  # noqa: S311
+        self.batch_size = batch_size
+        self.password_hash = make_password(password)
+        self.log = log
+
+    @contextmanager
+    def step(self, table, count):
+        started = time.perf_counter()
+        yield
+        if self.log:
+            self.log(f"{table}: {count} rows in {time.perf_counter() - started:.1f}s")
+
+    def uuid(self):
+        return uuid.UUID(int=self.random.getrandbits(128), version=4)
+
+    def code(self, length=10):
+        return "".join(
+            self.random.choices(string.ascii_uppercase + string.digits, k=length),
+        )
+
+    def insert(self, model, objs):
+        """
+        Insert objects in batches, returning them.
+        """
+        inserted = []
+        for chunk in chunked(objs, self.batch_size):
+            inserted += model.objects.bulk_create(chunk)
+        return inserted
+
+    def copy(self, model, objs):
+        """
+        Load objects with COPY, which streams the rows to Postgres instead of
+        sending an INSERT per batch, for the largest tables. The values are
+        prepared by the model fields as they are for ``bulk_create``, so the
+        objects need their primary key set.
+        """
+        quote_name = connection.ops.quote_name
+        fields = model._meta.concrete_fields
+        columns = ", ".join(quote_name(field.column) for field in fields)
+        table = quote_name(model._meta.db_table)
+        with (
+            connection.cursor() as cursor,
+            cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy,
+        ):
+            for obj in objs:
+                values = [field.pre_save(obj, add=True) for field in fields]
+                copy.write_row(
+                    [
+                        field.get_db_prep_save(value, connection)
+                        for field, value in zip(fields, values, strict=True)
+                    ],
+                )
+
+    @transaction.atomic
+    def seed(self, volumes):
+        """
+        Seed ``volumes`` of rows and refresh the planner statistics, so that
+        queries against them are planned as they would be in production.
+        """
+        plans, versions, regions = self.seed_catalog()
+        with self.step("users", volumes.users):
+            accounts = self.seed_users(volumes.users, plans)
+        with self.step("machines", volumes.machines):
+            owners = self.seed_machines(volumes.machines, accounts, versions, regions)
+        with self.step("history", volumes.history):
+            self.seed_history(volumes.history, owners)
+        with self.step("transactions", volumes.transactions):
+            self.seed_transactions(volumes.transactions, accounts)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def seed_catalog(self):
+        plans = [
+            RatePlan.objects.get_or_create(
+                plan=plan,
+                price=price,
+                vm_limit=vm_limit,
+                backup_limit=backup_limit,
+            )[0]
+            for plan, price, vm_limit, backup_limit in PLANS
+        ]
+        # looked up by slug, which is unique, so that regions named with
+        # another casing, as by the fixtures of initializedata, are reused
+        regions = [
+            Region.objects.get_or_create(
+                slug=slugify.slugify(name),
+                defaults={"name": name},
+            )[0]
+            for name in REGIONS
+        ]
+        versions = [
+            OperatingSystemVersion.objects.get_or_create(
+                operating_system=OperatingSystem.objects.get_or_create(name=name)[0],
+                version=version,
+            )[0]
+            for name, numbers in OPERATING_SYSTEMS.items()
+            for version in numbers
+        ]
+        return plans, versions, regions
+
+    def seed_users(self, count, plans):
+        """
+        Seed customers, returning their billing accounts.
+        """
+        users = self.insert(
+            User,
+            (
+                User(
+                    email=f"user{number:07}@{SEED_DOMAIN}",
+                    name=f"Seeded User {number}",
+                    password=self.password_hash,
+                )
+                for number in range(count)
+            ),
+        )
+        self.insert(Customer, (Customer(user_id=user.pk) for user in users))
+        accounts = self.insert(
+            BillingAccount,
+            (
+                BillingAccount(
+                    _id=self.uuid(),
+                    user_id=user.pk,
+                    amount=Decimal(self.random.randrange(0, 100_000)),
+                )
+                for user in users
+            ),
+        )
+        self.insert(
+            Subscription,
+            (
+                Subscription(
+                    _id=self.uuid(),
+                    account_id=account.pk,
+                    plan_id=self.random.choice(plans).pk,
+                )
+                for account in accounts
+            ),
+        )
+        return accounts
+
+    def seed_machines(self, count, accounts, versions, regions):
+        """
+        Seed machines, returning the (machine id, owner id) of each.
+        """
+        owners = []
+        now = timezone.now()
+
+        def machines():
+            for number in range(count):
+                backup_freq = self.random.choice(["daily", "weekly", "monthly"])
+                interval = VirtualMachine.BACKUP_INTERVALS[backup_freq]
+                is_active = self.random.random() < 0.8  # noqa: PLR2004
+                machine = VirtualMachine(
+                    _id=self.uuid(),
+                    name=f"{MACHINE_PREFIX}{number:07}",
+                    description=f"Seeded machine {number}",
+                    user_id=self.random.choice(accounts).user_id,
+                    operating_system_version_id=self.random.choice(versions).pk,
+                    region_id=self.random.choice(regions).pk,
+                    backup_freq=backup_freq,
+                    # spread over the first interval, as the migration does
+                    next_backup_at=now + interval * self.random.random(),
+                    disk_size=self.random.choice(["200", "300", "400", "600", "1000"]),
+                    is_active=is_active,
+                    # as the lifecycle migration sets existing machines
+                    state="running" if is_active else "stopped",
+                )
+                owners.append((machine.pk, machine.user_id))
+                yield machine
+
+        self.copy(VirtualMachine, machines())
+        VirtualMachine.objects.filter(
+            name__startswith=MACHINE_PREFIX,
+        ).update_search_vector()
+        return owners
+
+    def seed_history(self, count, owners):
+        actions = [action for action, _ in VirtualMachineHistory.ACTION_CHOICES]
+        self.copy(
+            VirtualMachineHistory,
+            (
+                VirtualMachineHistory(
+                    _id=self.uuid(),
+                    virtual_machine_id=machine_id,
+                    user_id=user_id,
+                    action=self.random.choice(actions),
+                    description=f"Seeded history entry {number}",
+                )
+                for number in range(count)
+                for machine_id, user_id in [self.random.choice(owners)]
+            ),
+        )
+
+    def seed_transactions(self, count, accounts):
+        statuses = [status for status, _ in Transaction.STATUS]
+        self.copy(
+            Transaction,
+            (
+                Transaction(
+                    _id=self.uuid(),
+                    account_id=self.random.choice(accounts).pk,
+                    amount=self.random.choice(PLANS)[1],
+                    payment_method=self.random.choice(["CARD", "PAYPAL", "STRIPE"]),
+                    transaction_no=self.code(),
+                    receipt_no=self.code(),
+                    payment_ref=self.code(),
+                    status=self.random.choice(statuses),
+                    description="Payment for subscription",
+                )
+                for _ in range(count)
+            ),
+        )
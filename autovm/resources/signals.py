@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from autovm.billing.metering import record_usage
+from autovm.billing.models import UsageEvent
+from autovm.resources.api.catalog import bump_catalog_version
+from autovm.resources.models import Backup
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.resources.placement import release
+from autovm.users.models import User
+
+# Payloads nest related objects, so changes to those touch ``updated`` on the
+# objects they are nested in, which invalidates the API's ETags.
+
+
+@receiver(post_save, sender=User)
+def refresh_user_machines(sender, instance, created, **kwargs):
+    """
+    Keep the search vector of the user's machines in line with the user name,
+    and touch the machines and history entries the user is nested in
+    """
+    if created:
+        return
+    changed = {
+        field
+        for field in ("name", "email", "role")
+        if instance.__dict__.get(field) != getattr(instance, f"_stored_{field}", None)
+    }
+    now = timezone.now()
+    machines = VirtualMachine.objects.filter(user=instance)
+    if "name" in changed:
+        machines.update_search_vector(updated=now)
+    elif changed:
+        machines.update(updated=now)
+    if changed:
+        VirtualMachineHistory.objects.filter(user=instance).update(updated=now)
+
+
+@receiver(post_save, sender=Region)
+def refresh_region_machines(sender, instance, created, **kwargs):
+    """
+    Keep the search vector of machines in the region in line with its name
+    """
+    if not created:
+        VirtualMachine.objects.filter(region=instance).update_search_vector(
+            updated=timezone.now(),
+        )
+
+
+@receiver(post_save, sender=OperatingSystem)
+def refresh_operating_system_machines(sender, instance, created, **kwargs):
+    """
+    Keep the search vector of machines running the operating system in line
+    with its name
+    """
+    if not created:
+        now = timezone.now()
+        OperatingSystemVersion.objects.filter(operating_system=instance).update(
+            updated=now,
+        )
+        VirtualMachine.objects.filter(
+            operating_system_version__operating_system=instance,
+        ).update_search_vector(updated=now)
+
+
+@receiver(post_save, sender=OperatingSystemVersion)
+def refresh_operating_system_version_machines(sender, instance, created, **kwargs):
+    """
+    Keep the search vector of machines running the version in line with it
+    """
+    if not created:
+        VirtualMachine.objects.filter(
+            operating_system_version=instance,
+        ).update_search_vector(updated=timezone.now())
+
+
+@receiver(post_save, sender=Backup)
+@receiver(post_delete, sender=Backup)
+def touch_backup_machine(sender, instance, **kwargs):
+    """
+    Backups are listed in the payload of their machine
+    """
+    VirtualMachine.objects.filter(pk=instance.vm_id).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=VirtualMachineHistory)
+@receiver(post_delete, sender=VirtualMachineHistory)
+def touch_history_machine(sender, instance, **kwargs):
+    """
+    History entries are listed in the payload of their machine
+    """
+    if instance.virtual_machine_id:
+        VirtualMachine.objects.filter(pk=instance.virtual_machine_id).update(
+            updated=timezone.now(),
+        )
+
+
+@receiver(post_save, sender=VirtualMachine)
+def meter_created_machine(sender, instance, created, **kwargs):
+    """
+    Start metering the storage of a new machine
+    """
+    if created:
+        record_usage([instance], UsageEvent.CREATED)
+
+
+@receiver(post_delete, sender=VirtualMachine)
+def meter_deleted_machine(sender, instance, **kwargs):
+    """
+    Stop metering a deleted machine
+    """
+    record_usage([instance], UsageEvent.DELETED)
+
+
+@receiver(post_delete, sender=VirtualMachine)
+def release_machine_host(sender, instance, **kwargs):
+    """
+    Give the capacity a deleted machine took back to its host
+    """
+    disk_size = getattr(instance, "_stored_disk_size", None) or instance.disk_size
+    release([(instance.host_id, disk_size)])
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=OperatingSystem)
+@receiver(post_delete, sender=OperatingSystem)
+@receiver(post_save, sender=OperatingSystemVersion)
+@receiver(post_delete, sender=OperatingSystemVersion)
+def invalidate_catalog(sender, instance, **kwargs):
+    """
+    Invalidate the cached catalog once the change is committed
+    """
+    transaction.on_commit(bump_catalog_version)
@@ -1,10 +1,27 @@
 import logging
+import random
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 
 from config import celery_app
 
 from autovm.users.models import User
+from autovm.resources.backup_store import collect_garbage
+from autovm.resources.backups import (
+    back_up_machine,
+    backup_machines,
+    claim_due_machines,
+    prune_backups,
+)
+from autovm.resources.drivers import Operation, Orchestrator, serialize_result
+from autovm.resources.jobs import advance_job, archive_jobs, job_task
+from autovm.resources.lifecycle import perform
+from autovm.resources.lifecycle import recover_stalled
+from autovm.resources.moves import notify_owners, perform_moves
 from autovm.resources.models import (
+    IdempotencyKey,
+    Job,
     Notification,
     VirtualMachine,
     VirtualMachineHistory,
@@ -71,3 +88,144 @@ def notify_suspended_user(user: int, suspended: str):
         message=f"""Your account has been {status}""",
     ),
     logger.info(f"Customer {user.name} has been {status}")
+
+
+@celery_app.task()
+def purge_idempotency_keys():
+    """
+    Delete stored responses of idempotent requests once they have expired
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires__lte=timezone.now()).delete()
+    logger.info(f"Purged {deleted} expired idempotency keys")
+
+
+@celery_app.task()
+def schedule_backups():
+    """
+    Dispatch the backups of machines that are due in batches, spread over
+    the time until the next run, see autovm.resources.backups
+    """
+    machines = [str(pk) for pk in claim_due_machines()]
+    size = settings.BACKUP_BATCH_SIZE
+    for start in range(0, len(machines), size):
+        run_backups.apply_async(
+            [machines[start : start + size]],
+            countdown=random.uniform(0, settings.BACKUP_SCHEDULE_INTERVAL),  # noqa: S311
+        )
+    logger.info(f"Dispatched backups of {len(machines)} machines")
+
+
+@celery_app.task()
+def run_backups(machines: list[str]):
+    """
+    Back up a batch of machines claimed by schedule_backups
+    """
+    return backup_machines(machines)
+
+
+@celery_app.task()
+def prune_expired_backups():
+    """
+    Delete the backups the retention policies of their plans no longer keep
+    """
+    deleted = prune_backups()
+    logger.info(f"Pruned {deleted} backups")
+
+
+@celery_app.task()
+def collect_backup_garbage():
+    """
+    Delete stored backup data that no backup refers to any more
+    """
+    manifests, chunks = collect_garbage()
+    logger.info(f"Collected {manifests} manifests and {chunks} chunks of backups")
+
+
+@celery_app.task()
+def run_operations(operations: list[dict]):
+    """
+    Run a batch of hypervisor operations concurrently, see
+    autovm.resources.drivers
+    """
+    results = Orchestrator().run_sync(
+        [Operation(**operation) for operation in operations],
+    )
+    return [serialize_result(result) for result in results]
+
+
+def keep_waiting(machines):
+    """
+    Mark the machines of a job still waiting for their batch as updated, so
+    that they aren't taken for stalled, see lifecycle.recover_stalled
+    """
+    if machines:
+        VirtualMachine.objects.filter(pk__in=machines).update(updated=timezone.now())
+
+
+@celery_app.task()
+@job_task
+def perform_lifecycle(job: Job, action: str, machines: list[str]):
+    """
+    Start, stop, restart or provision machines moved into the action's first
+    state, LIFECYCLE_BATCH_SIZE at a time, see autovm.resources.lifecycle
+    """
+    succeeded = []
+    failed = []
+    size = settings.LIFECYCLE_BATCH_SIZE
+    for start in range(0, len(machines), size):
+        done, failures = perform(action, machines[start : start + size], job.user_id)
+        succeeded += [str(pk) for pk in done]
+        failed += [str(pk) for pk in failures]
+        advance_job(job, completed=len(done), failed=len(failures))
+        keep_waiting(machines[start + size :])
+    return {"succeeded": succeeded, "failed": failed}
+
+
+@celery_app.task()
+@job_task
+def move_machines(job: Job, moves: list[list[str]], region: str = None):
+    """
+    Move machines moved into migrating to a region, or out of theirs if
+    None, MIGRATION_BATCH_SIZE at a time, then notify their owners, see
+    autovm.resources.moves
+    """
+    succeeded = []
+    failed = []
+    size = settings.MIGRATION_BATCH_SIZE
+    for start in range(0, len(moves), size):
+        done, failures = perform_moves(moves[start : start + size], region, job.user_id)
+        succeeded += [str(pk) for pk in done]
+        failed += [str(pk) for pk in failures]
+        advance_job(job, completed=len(done), failed=len(failures))
+        keep_waiting([pk for pk, _ in moves[start + size :]])
+    notify_owners(succeeded, region)
+    return {"succeeded": succeeded, "failed": failed}
+
+
+@celery_app.task()
+@job_task
+def back_up(job: Job, machine: str):
+    """
+    Back up a machine at the request of the job's owner
+    """
+    backup = back_up_machine(machine, job.user_id)
+    advance_job(job, completed=1)
+    return {"backup": str(backup.pk), "created": backup.created.isoformat()}
+
+
+@celery_app.task()
+def archive_finished_jobs():
+    """
+    Move jobs that finished a while ago to the archive
+    """
+    archived = archive_jobs()
+    logger.info(f"Archived {archived} jobs")
+
+
+@celery_app.task()
+def recover_stalled_machines():
+    """
+    Move machines stuck in a transitional state to error and fail their
+    jobs, see autovm.resources.lifecycle
+    """
+    recover_stalled()
@@ -0,0 +1,206 @@
+import json
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from autovm.billing.models import BillingAccount
+from autovm.resources.api.serializers import VirtualMachineSerializer
+from autovm.resources.models import Backup
+from autovm.resources.models import Host
+from autovm.resources.models import Notification
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.users.models import User
+
+
+@pytest.fixture
+def customer(db):
+    """
+    A customer with a billing account and a machine that has history and a backup.
+    """
+    user = User.objects.create_user(
+        name="customer1",
+        email="customer1@mail.com",
+        password="password",
+    )
+    BillingAccount.objects.create(user=user, amount=1000)
+    region = Region.objects.create(name="Germany Central")
+    os_version = OperatingSystemVersion.objects.create(
+        operating_system=OperatingSystem.objects.create(name="Ubuntu"),
+        version="20.04",
+    )
+    for i in range(3):
+        vm = VirtualMachine.objects.create(
+            description=f"vm {i}",
+            user=user,
+            region=region,
+            operating_system_version=os_version,
+            is_active=i != 0,
+        )
+        VirtualMachineHistory.objects.create(
+            virtual_machine=vm,
+            description="created a virtual machine",
+            user=user,
+        )
+        Backup.objects.create(vm=vm, size=200)
+    return user
+
+
+@pytest.fixture
+def sync_client(customer):
+    client = APIClient()
+    client.force_authenticate(user=customer)
+    return client
+
+
+@pytest.fixture
+def async_client(customer):
+    client = Client()
+    client.force_login(customer)
+    return client
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+    """
+    The async views return the same payloads as their DRF counterparts.
+    """
+
+    def test_virtual_machine_list(self, sync_client, async_client):
+        expected = sync_client.get(reverse("api:virtualmachine-list")).json()
+        response = async_client.get(reverse("api:async-virtualmachine-list"))
+
+        assert response.status_code == 200
+        assert response.json()["results"] == expected["results"]
+
+    def test_virtual_machine_list_pagination(self, settings, customer, async_client):
+        url = reverse("api:async-virtualmachine-list")
+        for i in range(8):
+            VirtualMachine.objects.create(description=f"extra {i}", user=customer)
+
+        first_page = async_client.get(url).json()
+        second_page = async_client.get(first_page["next"]).json()
+
+        names = [vm["name"] for vm in first_page["results"] + second_page["results"]]
+        assert len(first_page["results"]) == 8
+        assert second_page["next"] is None
+        assert sorted(names) == sorted(
+            VirtualMachine.objects.values_list("name", flat=True),
+        )
+
+    def test_machines_created_at_once_are_all_paged(self, customer, async_client):
+        for i in range(8):
+            VirtualMachine.objects.create(description=f"extra {i}", user=customer)
+        VirtualMachine.objects.update(created=timezone.now())
+        url = reverse("api:async-virtualmachine-list")
+
+        first_page = async_client.get(url).json()
+        second_page = async_client.get(first_page["next"]).json()
+
+        names = [vm["name"] for vm in first_page["results"] + second_page["results"]]
+        assert len(names) == 11
+        assert set(names) == set(VirtualMachine.objects.values_list("name", flat=True))
+
+    def test_virtual_machine_detail(self, customer, sync_client, async_client):
+        vm = VirtualMachine.objects.filter(user=customer).first()
+        expected = sync_client.get(
+            reverse("api:virtualmachine-detail", kwargs={"pk": vm.pk}),
+        ).json()
+        response = async_client.get(
+            reverse("api:async-virtualmachine-detail", kwargs={"pk": vm.pk}),
+        )
+
+        assert response.status_code == 200
+        assert response.json() == expected
+
+    def test_payloads_have_the_fields_of_the_serializer(
+        self,
+        customer,
+        sync_client,
+        async_client,
+    ):
+        vm = VirtualMachine.objects.filter(user=customer).first()
+        host = Host.objects.create(
+            name="eu-1",
+            region=vm.region,
+            cpus=16,
+            memory=64,
+            disk=2000,
+        )
+        VirtualMachine.objects.filter(pk=vm.pk).update(host=host, state="running")
+        expected = sync_client.get(
+            reverse("api:virtualmachine-detail", kwargs={"pk": vm.pk}),
+        ).json()
+        response = async_client.get(
+            reverse("api:async-virtualmachine-detail", kwargs={"pk": vm.pk}),
+        )
+
+        assert list(response.json()) == VirtualMachineSerializer.Meta.fields
+        assert response.json() == expected
+
+    def test_virtual_machine_detail_of_other_user(self, customer, async_client):
+        other = User.objects.create_user(email="other@mail.com", password="password")
+        vm = VirtualMachine.objects.create(description="not mine", user=other)
+        response = async_client.get(
+            reverse("api:async-virtualmachine-detail", kwargs={"pk": vm.pk}),
+        )
+        assert response.status_code == 404
+
+    def test_virtual_machine_statistics(self, sync_client, async_client):
+        expected = sync_client.get(reverse("api:virtualmachine-statistics")).json()
+        response = async_client.get(reverse("api:async-virtualmachine-statistics"))
+
+        assert response.json() == expected == {"total": 3, "active": 2, "inactive": 1}
+
+    def test_notifications_are_marked_read(self, customer, async_client):
+        Notification.objects.create(user=customer, message="hello")
+        url = reverse("api:async-notification-list")
+
+        response = async_client.get(url)
+        assert [n["message"] for n in response.json()] == ["hello"]
+        assert async_client.get(url).json() == []
+
+    def test_balance(self, sync_client, async_client):
+        expected = sync_client.get(reverse("api:billingaccount-balance")).json()
+        response = async_client.get(reverse("api:async-billingaccount-balance"))
+        assert response.json() == expected
+
+    def test_jwt_authentication(self, customer):
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(customer)}")
+        response = client.get(reverse("api:async-virtualmachine-statistics"))
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize("headers", [{}, {"HTTP_AUTHORIZATION": "Bearer invalid"}])
+    def test_credentials_are_rejected_like_drf(self, db, headers):
+        client = Client(**headers)
+        expected = client.get(reverse("api:virtualmachine-statistics"))
+        response = client.get(reverse("api:async-virtualmachine-statistics"))
+
+        assert response.status_code == expected.status_code
+        assert response.get("WWW-Authenticate") == expected.get("WWW-Authenticate")
+        assert response.json() == expected.json()
+
+    def test_requests_are_throttled(self, settings, async_client):
+        settings.REST_FRAMEWORK = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"user": "2/min"},
+        }
+        url = reverse("api:async-virtualmachine-statistics")
+        statuses = [async_client.get(url).status_code for _ in range(3)]
+
+        assert statuses == [200, 200, 429]
+        assert async_client.get(url)["Retry-After"] == "30"
+
+    def test_unauthenticated(self, db, client):
+        response = client.get(reverse("api:async-virtualmachine-list"))
+        assert response.status_code == 403
+        assert json.loads(response.content) == {
+            "detail": "Authentication credentials were not provided.",
+        }
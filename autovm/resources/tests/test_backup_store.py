@@ -0,0 +1,174 @@
+import io
+import random
+import zlib
+
+import pytest
+
+from autovm.resources.backup_store import BackupEngine
+from autovm.resources.backup_store import Chunker
+from autovm.resources.backup_store import CorruptBackupError
+from autovm.resources.backup_store import FileSystemChunkStore
+from autovm.resources.backup_store import backup_image
+from autovm.resources.backup_store import collect_garbage
+from autovm.resources.backup_store import get_backup_store
+from autovm.resources.models import Backup
+from autovm.resources.models import VirtualMachine
+from autovm.users.models import User
+
+# small chunks keep the images small
+MIN_SIZE, AVG_SIZE, MAX_SIZE = 256, 1024, 4096
+
+
+def image(seed=0, size=64 * 1024):
+    return bytearray(random.Random(seed).randbytes(size))  # noqa: S311
+
+
+def chunk_sizes(data):
+    chunker = Chunker(MIN_SIZE, AVG_SIZE, MAX_SIZE)
+    return [len(chunk) for chunk in chunker.chunks(io.BytesIO(data), read_size=5000)]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return BackupEngine(
+        store=FileSystemChunkStore(tmp_path),
+        chunker=Chunker(MIN_SIZE, AVG_SIZE, MAX_SIZE),
+    )
+
+
+class TestChunker:
+    def test_chunks_cover_the_stream(self):
+        data = image()
+        chunker = Chunker(MIN_SIZE, AVG_SIZE, MAX_SIZE)
+
+        chunks = list(chunker.chunks(io.BytesIO(data), read_size=5000))
+
+        assert b"".join(chunks) == data
+        assert all(MIN_SIZE <= len(chunk) <= MAX_SIZE for chunk in chunks[:-1])
+
+    def test_chunks_are_content_defined(self):
+        data = image()
+        shifted = b"inserted" + data
+
+        sizes = chunk_sizes(data)
+        shifted_sizes = chunk_sizes(shifted)
+
+        # boundaries line up again after the inserted bytes
+        assert shifted_sizes[1:] == sizes[1:]
+
+    def test_uniform_data_is_cut_at_max_size(self):
+        assert chunk_sizes(bytes(3 * MAX_SIZE)) == [MAX_SIZE] * 3
+
+    def test_empty_stream_has_no_chunks(self):
+        assert chunk_sizes(b"") == []
+
+
+class TestBackupEngine:
+    def test_backups_restore(self, engine):
+        data = image()
+
+        result = engine.backup(io.BytesIO(data))
+
+        assert result.size == len(data)
+        assert b"".join(engine.restore(result.manifest)) == data
+
+    def test_unchanged_chunks_are_stored_once(self, engine):
+        data = image()
+        first = engine.backup(io.BytesIO(data))
+        data[30_000:30_010] = b"x" * 10
+
+        second = engine.backup(io.BytesIO(data))
+
+        assert first.new_chunks == first.chunks
+        assert second.new_chunks < first.chunks / 10
+        assert second.stored < first.stored / 5
+        assert b"".join(engine.restore(second.manifest)) == data
+        assert b"".join(engine.restore(first.manifest)) != data
+
+    def test_identical_images_share_their_manifest(self, engine):
+        first = engine.backup(io.BytesIO(image()))
+        second = engine.backup(io.BytesIO(image()))
+
+        assert first.manifest == second.manifest
+        assert second.new_chunks == 0
+
+    def test_corrupt_chunks_are_detected(self, engine):
+        result = engine.backup(io.BytesIO(image()))
+        digest = engine.chunk_digests(result.manifest)[0]
+        engine.store.write("chunks", digest, zlib.compress(b"tampered"))
+
+        with pytest.raises(CorruptBackupError):
+            engine.restore_to(result.manifest, io.BytesIO())
+
+
+class TestFileSystemChunkStore:
+    def test_objects_round_trip(self, tmp_path):
+        store = FileSystemChunkStore(tmp_path)
+
+        store.write("chunks", "ab12", b"data")
+
+        assert store.exists("chunks", "ab12")
+        assert store.read("chunks", "ab12") == b"data"
+        assert list(store.digests("chunks")) == ["ab12"]
+        assert not store.exists("manifests", "ab12")
+
+    def test_deleted_objects_are_missing(self, tmp_path):
+        store = FileSystemChunkStore(tmp_path)
+        store.write("chunks", "ab12", b"data")
+
+        store.delete("chunks", "ab12")
+
+        with pytest.raises(KeyError):
+            store.read("chunks", "ab12")
+        assert list(store.digests("chunks")) == []
+
+
+@pytest.mark.django_db
+def test_backup_image_records_the_manifest():
+    user = User.objects.create_user(email="customer@mail.com", password="password")
+    machine = VirtualMachine.objects.create(user=user)
+    data = image()
+
+    backup = backup_image(machine, io.BytesIO(data))
+
+    restored = BackupEngine(store=get_backup_store()).restore(backup.manifest)
+    assert b"".join(restored) == data
+    assert machine.backups.get() == backup
+
+
+@pytest.mark.django_db
+class TestCollectGarbage:
+    @pytest.fixture
+    def machine(self):
+        user = User.objects.create_user(email="customer@mail.com", password="password")
+        return VirtualMachine.objects.create(user=user)
+
+    def test_data_of_deleted_backups_is_collected(self, engine, machine):
+        kept = backup_image(machine, io.BytesIO(image(1)), engine)
+        deleted = backup_image(machine, io.BytesIO(image(2)), engine)
+        deleted_chunks = set(engine.chunk_digests(deleted.manifest))
+        Backup.objects.filter(pk=deleted.pk).delete()
+
+        manifests, chunks = collect_garbage(engine.store, grace=-1)
+
+        assert manifests == 1
+        assert chunks == len(deleted_chunks)
+        assert not engine.store.exists("manifests", deleted.manifest)
+        assert b"".join(engine.restore(kept.manifest)) == image(1)
+
+    def test_shared_chunks_are_kept(self, engine, machine):
+        data = image()
+        first = backup_image(machine, io.BytesIO(data), engine)
+        data[:10] = b"x" * 10
+        second = backup_image(machine, io.BytesIO(data), engine)
+        Backup.objects.filter(pk=first.pk).delete()
+
+        collect_garbage(engine.store, grace=-1)
+
+        assert b"".join(engine.restore(second.manifest)) == data
+
+    def test_recent_data_is_kept(self, engine):
+        result = engine.backup(io.BytesIO(image()))
+
+        assert collect_garbage(engine.store, grace=60) == (0, 0)
+        assert b"".join(engine.restore(result.manifest)) == image()
@@ -0,0 +1,287 @@
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.utils import timezone
+
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.resources.backup_store import BackupEngine
+from autovm.resources.backups import backup_machines
+from autovm.resources.backups import claim_due_machines
+from autovm.resources.backups import prune_backups
+from autovm.resources.backups import retained_backups
+from autovm.resources.drivers import FakeDriver
+from autovm.resources.drivers import Orchestrator
+from autovm.resources.models import Backup
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.tasks import schedule_backups
+from autovm.users.models import Customer
+
+
+def backups_at(machine, *days_ago):
+    """
+    Backups of a machine made the given number of days ago, newest first.
+    """
+    now = timezone.now()
+    backups = []
+    for days in sorted(days_ago):
+        backup = Backup.objects.create(vm=machine, size=200)
+        Backup.objects.filter(pk=backup.pk).update(created=now - timedelta(days=days))
+        backups.append(backup.pk)
+    return backups
+
+
+def create_due_machine(user, region=None, **fields):
+    machine = VirtualMachine.objects.create(user=user, region=region, **fields)
+    VirtualMachine.objects.filter(pk=machine.pk).update(
+        next_backup_at=timezone.now() - timedelta(minutes=1),
+    )
+    return machine
+
+
+@pytest.mark.django_db
+class TestBackupSchedule:
+    def test_new_machines_are_scheduled(self, subscribed_customer, settings):
+        settings.BACKUP_JITTER = 0
+        machine = VirtualMachine.objects.create(
+            user=subscribed_customer,
+            backup_freq="weekly",
+        )
+
+        interval = machine.next_backup_at - machine.created
+        assert abs(interval - timedelta(weeks=1)) < timedelta(seconds=1)
+
+    def test_changing_the_frequency_reschedules(self, subscribed_customer, settings):
+        settings.BACKUP_JITTER = 0
+        machine = VirtualMachine.objects.create(
+            user=subscribed_customer,
+            backup_freq="monthly",
+        )
+        machine = VirtualMachine.objects.get(pk=machine.pk)
+
+        machine.backup_freq = "daily"
+        machine.save(update_fields=["backup_freq"])
+
+        machine.refresh_from_db()
+        assert machine.next_backup_at - timezone.now() < timedelta(days=1)
+
+    def test_jitter_spreads_machines(self, subscribed_customer):
+        machines = [
+            VirtualMachine.objects.create(user=subscribed_customer) for _ in range(3)
+        ]
+
+        assert len({machine.next_backup_at for machine in machines}) == 3
+
+
+@pytest.mark.django_db
+class TestClaimDueMachines:
+    def test_only_due_active_owned_machines_are_claimed(self, subscribed_customer):
+        due = create_due_machine(subscribed_customer)
+        create_due_machine(subscribed_customer, is_active=False)
+        create_due_machine(None)
+        VirtualMachine.objects.create(user=subscribed_customer)
+
+        assert claim_due_machines() == [due.pk]
+
+    def test_claimed_machines_are_rescheduled(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+
+        claim_due_machines()
+
+        machine.refresh_from_db()
+        assert machine.next_backup_at > timezone.now()
+        assert claim_due_machines() == []
+
+    def test_claims_are_limited_per_region(self, subscribed_customer, settings):
+        settings.BACKUP_REGION_CONCURRENCY = 2
+        north = Region.objects.create(name="North")
+        south = Region.objects.create(name="South")
+        for region in [north, north, north, south]:
+            create_due_machine(subscribed_customer, region)
+
+        claimed = claim_due_machines()
+
+        regions = VirtualMachine.objects.filter(pk__in=claimed).values_list(
+            "region__name",
+            flat=True,
+        )
+        assert sorted(regions) == ["North", "North", "South"]
+        assert len(claim_due_machines()) == 1
+
+
+@pytest.mark.django_db
+class TestBackupMachines:
+    def test_machines_are_backed_up(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+
+        assert backup_machines([machine.pk]) == 1
+        assert machine.backups.count() == 1
+        assert machine.history.filter(action="backup_vm").exists()
+
+    def test_backups_restore_the_snapshot(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+        orchestrator = Orchestrator(FakeDriver(image_size=4096, seed=1))
+        # a driver seeded the same way takes the same snapshot
+        image = async_to_sync(FakeDriver(image_size=4096, seed=1).snapshot)(
+            machine.name,
+        ).read()
+
+        backup_machines([machine.pk], orchestrator)
+
+        manifest = machine.backups.get().manifest
+        assert b"".join(BackupEngine().restore(manifest)) == image
+
+    def test_failed_snapshots_make_no_backup(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+        orchestrator = Orchestrator(FakeDriver(failure_rate=1))
+
+        assert backup_machines([machine.pk], orchestrator) == 0
+        assert not machine.backups.exists()
+
+    def test_backup_limit_of_the_plan_is_respected(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+        Backup.objects.create(vm=machine, size=200)
+        Backup.objects.create(vm=machine, size=200)
+
+        assert backup_machines([machine.pk]) == 0
+        assert machine.backups.count() == 2
+
+    def test_a_single_backup_is_replaced(self, subscribed_customer):
+        RatePlan.objects.update(backup_limit=1)
+        machine = create_due_machine(subscribed_customer)
+        [old] = backups_at(machine, 1)
+
+        prune_backups()
+        assert backup_machines([machine.pk]) == 1
+
+        backup = machine.backups.get()
+        assert backup.pk != old
+        assert backup.manifest
+
+    def test_plans_without_backups_are_skipped(self, subscribed_customer):
+        RatePlan.objects.update(backup_limit=0)
+        machine = create_due_machine(subscribed_customer)
+
+        assert backup_machines([machine.pk]) == 0
+
+    def test_suspended_customers_are_skipped(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+        Customer.objects.filter(user=subscribed_customer).update(suspended=True)
+
+        assert backup_machines([machine.pk]) == 0
+
+    def test_customers_without_subscription_are_skipped(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+        Subscription.objects.update(status="inactive")
+
+        assert backup_machines([machine.pk]) == 0
+
+    def test_batch_runs_in_constant_queries(
+        self,
+        subscribed_customer,
+        django_assert_num_queries,
+    ):
+        machines = [create_due_machine(subscribed_customer) for _ in range(5)]
+
+        # select, backups, history, touch, in a savepoint
+        with django_assert_num_queries(6):
+            backup_machines([machine.pk for machine in machines])
+
+
+@pytest.mark.django_db
+def test_schedule_backups_dispatches_batches(subscribed_customer, settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    settings.BACKUP_BATCH_SIZE = 2
+    machines = [create_due_machine(subscribed_customer) for _ in range(3)]
+
+    schedule_backups()
+
+    assert Backup.objects.filter(vm__in=machines).count() == 3
+
+
+class TestRetainedBackups:
+    def policy(self, daily=0, weekly=0, monthly=0, limit=100):
+        return RatePlan(
+            keep_daily=daily,
+            keep_weekly=weekly,
+            keep_monthly=monthly,
+            backup_limit=limit,
+        )
+
+    def history(self, *days_ago):
+        now = timezone.now()
+        return [(days, now - timedelta(days=days)) for days in sorted(days_ago)]
+
+    def test_newest_of_each_day_is_kept(self):
+        backups = self.history(0, 1, 1.01, 2, 3)
+
+        assert retained_backups(backups, self.policy(daily=3)) == {0, 1, 2}
+
+    def test_periods_add_up(self):
+        backups = self.history(*range(0, 120, 3))
+
+        kept = retained_backups(backups, self.policy(daily=2, weekly=3, monthly=3))
+
+        # the months reach further back than the days and weeks
+        assert {0, 3} <= kept
+        assert max(kept) > 30  # noqa: PLR2004
+        assert len(kept) <= 2 + 3 + 3
+
+    def test_room_is_left_under_the_backup_limit(self):
+        backups = self.history(0, 1, 2, 3)
+
+        assert retained_backups(backups, self.policy(daily=7, limit=3)) == {0, 1}
+
+    def test_newest_backup_is_always_kept(self):
+        backups = self.history(0, 1)
+
+        assert retained_backups(backups, self.policy(limit=1)) == {0}
+
+
+@pytest.mark.django_db
+class TestPruneBackups:
+    def test_backups_outside_the_policy_are_deleted(self, subscribed_customer):
+        RatePlan.objects.update(
+            keep_daily=2,
+            keep_weekly=0,
+            keep_monthly=0,
+            backup_limit=10,
+        )
+        machine = VirtualMachine.objects.create(user=subscribed_customer)
+        newest, second, *_ = backups_at(machine, 0, 1, 2, 3)
+
+        assert prune_backups(batch_size=1) == 2
+        assert set(machine.backups.values_list("pk", flat=True)) == {newest, second}
+
+    def test_backups_are_pruned_in_batches(self, subscribed_customer):
+        RatePlan.objects.update(keep_daily=1, keep_weekly=0, keep_monthly=0)
+        machines = [
+            VirtualMachine.objects.create(user=subscribed_customer) for _ in range(3)
+        ]
+        for machine in machines:
+            backups_at(machine, 0, 1)
+
+        assert prune_backups(batch_size=2) == 3
+        assert Backup.objects.count() == 3
+
+    def test_machines_without_subscription_keep_their_backups(
+        self,
+        subscribed_customer,
+    ):
+        RatePlan.objects.update(keep_daily=1, keep_weekly=0, keep_monthly=0)
+        Subscription.objects.update(status="inactive")
+        machine = VirtualMachine.objects.create(user=subscribed_customer)
+        backups_at(machine, 0, 1, 2)
+
+        assert prune_backups() == 0
+
+    def test_pruning_makes_room_for_scheduled_backups(self, subscribed_customer):
+        machine = create_due_machine(subscribed_customer)
+        backups_at(machine, 1, 2)
+        assert backup_machines([machine.pk]) == 0
+
+        prune_backups()
+
+        assert backup_machines([machine.pk]) == 1
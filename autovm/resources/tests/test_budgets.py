@@ -0,0 +1,109 @@
+import logging
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+
+from autovm.middleware.budgets import QueryBudgetExceeded
+from autovm.middleware.budgets import QueryBudgetMiddleware
+from autovm.resources.api.views import VirtualMachineViewSet
+from autovm.resources.models import Backup
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.users.models import User
+
+
+def create_machines(user, count):
+    os_version = OperatingSystemVersion.objects.create(
+        operating_system=OperatingSystem.objects.create(name=f"Ubuntu {count}"),
+        version="24.04",
+    )
+    region = Region.objects.create(name=f"Region {count}")
+    for _ in range(count):
+        machine = VirtualMachine.objects.create(
+            user=user,
+            region=region,
+            operating_system_version=os_version,
+        )
+        Backup.objects.create(vm=machine, size=20)
+        VirtualMachineHistory.objects.create(
+            virtual_machine=machine,
+            user=User.objects.create_user(
+                email=f"{machine.name.lower()}@mail.com",
+                password="password",
+            ),
+            description="created a virtual machine",
+        )
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    def test_machine_list_queries_do_not_grow_with_the_page(
+        self,
+        api_client,
+        admin,
+        query_budgets,
+    ):
+        url = reverse("api:virtualmachine-list")
+        create_machines(admin, 1)
+        api_client.get(url)
+        create_machines(admin, 7)
+        response = api_client.get(url)
+
+        assert len(response.json()["results"]) == 8
+        assert [check.view for check in query_budgets] == [
+            "VirtualMachineViewSet.list",
+        ] * 2
+        assert query_budgets[0].queries == query_budgets[1].queries
+
+    def test_budgets_are_declared_per_action(self, api_client, admin, query_budgets):
+        create_machines(admin, 1)
+        machine = VirtualMachine.objects.get()
+
+        api_client.get(reverse("api:virtualmachine-detail", args=[machine.pk]))
+        api_client.get(reverse("api:virtualmachine-statistics"))
+
+        assert [check.budget for check in query_budgets] == [
+            VirtualMachineViewSet.query_budgets["retrieve"],
+            VirtualMachineViewSet.statistics.query_budget,
+        ]
+
+    def test_exceeded_budget_raises(self, api_client, admin, settings, monkeypatch):
+        settings.QUERY_BUDGET_MODE = "raise"
+        monkeypatch.setitem(VirtualMachineViewSet.query_budgets, "list", 1)
+        create_machines(admin, 1)
+
+        with pytest.raises(QueryBudgetExceeded, match="VirtualMachineViewSet.list"):
+            api_client.get(reverse("api:virtualmachine-list"))
+
+    def test_exceeded_budget_is_logged(
+        self,
+        api_client,
+        admin,
+        settings,
+        monkeypatch,
+        caplog,
+    ):
+        settings.QUERY_BUDGET_MODE = "log"
+        monkeypatch.setitem(VirtualMachineViewSet.query_budgets, "list", 1)
+
+        with caplog.at_level(logging.WARNING, logger="autovm.middleware.budgets"):
+            response = api_client.get(reverse("api:virtualmachine-list"))
+
+        assert response.status_code == 200
+        assert "the budget of VirtualMachineViewSet.list is 1" in caplog.text
+
+    def test_budgets_are_not_checked_when_off(self, api_client, settings, monkeypatch):
+        settings.QUERY_BUDGET_MODE = "off"
+        monkeypatch.setitem(VirtualMachineViewSet.query_budgets, "list", 0)
+
+        assert api_client.get(reverse("api:virtualmachine-list")).status_code == 200
+
+    def test_unknown_mode_is_rejected(self, settings):
+        settings.QUERY_BUDGET_MODE = "strict"
+
+        with pytest.raises(ImproperlyConfigured):
+            QueryBudgetMiddleware(lambda request: None)
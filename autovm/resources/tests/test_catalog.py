@@ -0,0 +1,153 @@
+import pytest
+import redis
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from autovm.billing.models import RatePlan
+from autovm.resources.api import catalog
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.users.models import User
+
+
+@pytest.fixture
+def regions(db):
+    return [
+        Region.objects.create(name="Germany Central"),
+        Region.objects.create(name="Iceland North"),
+    ]
+
+
+def region_names(client):
+    response = client.get(reverse("api:region-list"))
+    assert response.status_code == 200
+    return sorted(region["name"] for region in response.json()["results"])
+
+
+@pytest.mark.django_db
+class TestCatalogCache:
+    def test_repeated_reads_skip_the_database(self, api_client, regions):
+        url = reverse("api:region-detail", args=[regions[0].pk])
+        first = api_client.get(url)
+
+        with CaptureQueriesContext(connection) as context:
+            second = api_client.get(url)
+
+        # only the request's savepoint is left
+        assert all("SAVEPOINT" in query["sql"] for query in context)
+
+        assert second.status_code == 200
+        assert second.json() == first.json()
+        assert second["ETag"] == first["ETag"]
+
+    def test_cached_response_is_conditional(self, api_client, regions):
+        url = reverse("api:region-list")
+        etag = api_client.get(url)["ETag"]
+
+        response = api_client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+
+    def test_etag_is_shared_by_users(self, api_client, regions):
+        url = reverse("api:region-list")
+        other = User.objects.create_user(email="other@mail.com", password="password")
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+
+        assert other_client.get(url)["ETag"] == api_client.get(url)["ETag"]
+
+    def test_saves_and_deletes_bump_the_version(
+        self,
+        api_client,
+        regions,
+        django_capture_on_commit_callbacks,
+    ):
+        assert region_names(api_client) == ["Germany Central", "Iceland North"]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Region.objects.create(name="Nigeria West")
+        assert region_names(api_client) == [
+            "Germany Central",
+            "Iceland North",
+            "Nigeria West",
+        ]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            regions[0].delete()
+        assert region_names(api_client) == ["Iceland North", "Nigeria West"]
+
+    def test_uncommitted_changes_keep_the_cache(self, api_client, regions):
+        region_names(api_client)
+
+        Region.objects.create(name="Nigeria West")
+
+        assert region_names(api_client) == ["Germany Central", "Iceland North"]
+
+    def test_version_is_checked_after_the_ttl(
+        self,
+        api_client,
+        regions,
+        settings,
+        catalog_redis,
+    ):
+        settings.CATALOG_CACHE_TTL = 60
+        region_names(api_client)
+        Region.objects.create(name="Nigeria West")
+        # bumped by another worker
+        catalog_redis.incr(catalog.CATALOG_VERSION_KEY)
+
+        assert len(region_names(api_client)) == 2
+
+        settings.CATALOG_CACHE_TTL = 0
+        assert len(region_names(api_client)) == 3
+
+    def test_related_changes_invalidate_nested_data(
+        self,
+        api_client,
+        django_capture_on_commit_callbacks,
+    ):
+        version = OperatingSystemVersion.objects.create(
+            operating_system=OperatingSystem.objects.create(name="Ubuntu"),
+            version="24.04",
+        )
+        url = reverse("api:operatingsystemversion-detail", args=[version.pk])
+        api_client.get(url)
+
+        operating_system = version.operating_system
+        operating_system.name = "Kubuntu"
+        with django_capture_on_commit_callbacks(execute=True):
+            operating_system.save()
+
+        assert api_client.get(url).json()["operating_system"]["name"] == "Kubuntu"
+
+    def test_rate_plans_are_cached(
+        self,
+        api_client,
+        django_capture_on_commit_callbacks,
+    ):
+        plan = RatePlan.objects.create(plan="gold", price=800)
+        url = reverse("api:rateplan-detail", args=[plan.pk])
+        api_client.get(url)
+
+        plan.price = 900
+        with django_capture_on_commit_callbacks(execute=True):
+            plan.save()
+
+        assert api_client.get(url).json()["price"] == "900.00"
+
+    def test_redis_outage_serves_the_database(self, api_client, regions, monkeypatch):
+        region_names(api_client)
+
+        def unavailable(self):
+            raise redis.ConnectionError
+
+        monkeypatch.setattr(catalog.LocalCatalog, "read_version", unavailable)
+        monkeypatch.setattr(catalog.local_catalog, "checked", None)
+        Region.objects.create(name="Nigeria West")
+
+        assert len(region_names(api_client)) == 3
+        assert not catalog.local_catalog.entries
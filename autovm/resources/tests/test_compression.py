@@ -0,0 +1,149 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from autovm.middleware import compression
+from autovm.middleware.compression import APICompressionMiddleware
+from autovm.middleware.compression import GzipEncoder
+from autovm.middleware.compression import negotiate
+from autovm.resources.models import Region
+from autovm.users.models import User
+
+BODY = b'{"name": "webserver01", "region": "Germany Central"}' * 100
+
+
+def respond(response, path="/api/vms/", accept_encoding="gzip"):
+    request = RequestFactory().get(path, headers={"accept-encoding": accept_encoding})
+    return APICompressionMiddleware(lambda request: response)(request)
+
+
+def json_response(body=BODY, **kwargs):
+    return HttpResponse(body, content_type="application/json", **kwargs)
+
+
+class TestNegotiate:
+    @pytest.mark.parametrize(
+        ("accept_encoding", "expected"),
+        [
+            ("gzip", "gzip"),
+            ("deflate, gzip;q=0.5", "gzip"),
+            ("*", "gzip"),
+            ("gzip;q=0", None),
+            ("*;q=0", None),
+            ("identity", None),
+            ("", None),
+        ],
+    )
+    def test_gzip(self, accept_encoding, expected):
+        encoder = negotiate(accept_encoding)
+        assert (encoder and encoder.name) == expected
+
+    def test_brotli_preferred(self, monkeypatch):
+        class Brotli:
+            name = "br"
+
+        monkeypatch.setattr(compression, "ENCODERS", [Brotli, GzipEncoder])
+
+        assert negotiate("gzip, br") is Brotli
+        assert negotiate("gzip, br;q=0.5") is GzipEncoder
+        assert negotiate("gzip") is GzipEncoder
+
+
+class TestAPICompressionMiddleware:
+    def test_compresses_api_responses(self):
+        response = respond(json_response(headers={"ETag": '"abc"'}))
+
+        assert response["Content-Encoding"] == "gzip"
+        assert response["Vary"] == "Accept-Encoding"
+        assert response["ETag"] == 'W/"abc"'
+        assert int(response["Content-Length"]) == len(response.content)
+        assert gzip.decompress(response.content) == BODY
+
+    @pytest.mark.parametrize(
+        "response",
+        [
+            json_response(b'{"detail": "tiny"}'),
+            json_response(headers={"Content-Encoding": "br"}),
+            HttpResponse(BODY, content_type="image/png"),
+        ],
+    )
+    def test_skipped_responses(self, response):
+        content = response.content
+        response = respond(response)
+
+        assert response.content == content
+        assert response.get("Content-Encoding") != "gzip"
+
+    def test_other_paths_are_left_alone(self):
+        assert not respond(json_response(), path="/admin/").has_header(
+            "Content-Encoding",
+        )
+
+    def test_not_accepted(self):
+        response = respond(json_response(), accept_encoding="identity")
+
+        assert not response.has_header("Content-Encoding")
+        assert response["Vary"] == "Accept-Encoding"
+        assert response.content == BODY
+
+    def test_streaming_is_compressed_incrementally(self):
+        response = respond(
+            StreamingHttpResponse(
+                (BODY for _ in range(3)),
+                content_type="application/json",
+            ),
+        )
+        decompressor = zlib.decompressobj(31)
+
+        # each chunk can be decompressed as soon as it is received
+        assert [
+            decompressor.decompress(chunk) for chunk in response.streaming_content
+        ] == [BODY, BODY, BODY, b""]
+        assert decompressor.eof
+        assert response["Content-Encoding"] == "gzip"
+        assert not response.has_header("Content-Length")
+
+    def test_async_streaming(self):
+        async def chunks():
+            for _ in range(3):
+                yield BODY
+
+        async def receive(response):
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        response = respond(
+            StreamingHttpResponse(chunks(), content_type="application/json"),
+        )
+
+        assert gzip.decompress(asyncio.run(receive(response))) == BODY * 3
+
+    def test_brotli(self):
+        brotli = pytest.importorskip("brotli")
+        response = respond(json_response(), accept_encoding="gzip, br")
+
+        assert response["Content-Encoding"] == "br"
+        assert brotli.decompress(response.content) == BODY
+
+
+@pytest.mark.django_db
+def test_api_list_is_compressed():
+    user = User.objects.create_user(email="admin@mail.com", password="password")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    for i in range(8):
+        Region.objects.create(name=f"Region {i}")
+
+    response = client.get(
+        reverse("api:region-list"),
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    assert response["Content-Encoding"] == "gzip"
+    assert len(gzip.decompress(response.content)) > len(response.content)
@@ -0,0 +1,158 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.resources.models import Backup
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import VirtualMachine
+from autovm.users.models import User
+
+
+@pytest.fixture
+def vm(admin):
+    return VirtualMachine.objects.create(
+        name="webserver01",
+        user=admin,
+        operating_system_version=OperatingSystemVersion.objects.create(
+            operating_system=OperatingSystem.objects.create(name="Ubuntu"),
+            version="24.04",
+        ),
+    )
+
+
+def get(client, url, **headers):
+    return client.get(url, headers=headers)
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    def test_validators_are_sent(self, api_client, vm):
+        detail = get(api_client, reverse("api:virtualmachine-detail", args=[vm.pk]))
+        listing = get(api_client, reverse("api:virtualmachine-list"))
+
+        assert detail["ETag"].startswith('"')
+        assert detail.has_header("Last-Modified")
+        assert listing["ETag"].startswith('"')
+        # deletions don't move the latest update of a list
+        assert not listing.has_header("Last-Modified")
+
+    def test_lists_ignore_if_modified_since(self, api_client, vm):
+        url = reverse("api:virtualmachine-list")
+        since = http_date(vm.updated.timestamp())
+
+        assert get(api_client, url, if_modified_since=since).status_code == 200
+
+    def test_unchanged_list_is_not_modified(self, api_client, vm):
+        url = reverse("api:virtualmachine-list")
+        etag = get(api_client, url)["ETag"]
+
+        with CaptureQueriesContext(connection) as context:
+            response = get(api_client, url, if_none_match=etag)
+
+        # the request's savepoint aside, only the aggregate is run
+        queries = [q["sql"] for q in context if "SAVEPOINT" not in q["sql"]]
+        assert len(queries) == 1
+
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+        assert not response.content
+
+    def test_changes_invalidate_the_list(self, api_client, vm, admin):
+        url = reverse("api:virtualmachine-list")
+        etag = get(api_client, url)["ETag"]
+
+        vm.description = "changed"
+        vm.save()
+        assert get(api_client, url, if_none_match=etag).status_code == 200
+
+        etag = get(api_client, url)["ETag"]
+        vm.delete()
+        assert get(api_client, url, if_none_match=etag).status_code == 200
+
+    def test_query_string_is_part_of_the_etag(self, api_client, vm):
+        url = reverse("api:virtualmachine-list")
+        etag = get(api_client, url)["ETag"]
+
+        assert get(api_client, f"{url}?search=web")["ETag"] != etag
+
+    def test_nested_changes_invalidate_the_parent(self, api_client, vm):
+        url = reverse("api:virtualmachine-detail", args=[vm.pk])
+        etag = get(api_client, url)["ETag"]
+
+        Backup.objects.create(vm=vm, size=200)
+
+        response = get(api_client, url, if_none_match=etag)
+        assert response.status_code == 200
+        assert len(response.json()["backups"]) == 1
+
+    def test_renamed_operating_system_invalidates_versions(
+        self,
+        api_client,
+        vm,
+        django_capture_on_commit_callbacks,
+    ):
+        url = reverse("api:operatingsystemversion-list")
+        etag = get(api_client, url)["ETag"]
+
+        operating_system = OperatingSystem.objects.get()
+        operating_system.name = "Kubuntu"
+        with django_capture_on_commit_callbacks(execute=True):
+            operating_system.save()
+
+        assert get(api_client, url, if_none_match=etag).status_code == 200
+
+    def test_changed_email_invalidates_machines(self, api_client, vm, admin):
+        url = reverse("api:virtualmachine-detail", args=[vm.pk])
+        etag = get(api_client, url)["ETag"]
+
+        user = User.objects.get(pk=admin.pk)
+        user.email = "changed@mail.com"
+        user.save()
+
+        response = get(api_client, url, if_none_match=etag)
+        assert response.status_code == 200
+        assert response.json()["user_info"]["email"] == "changed@mail.com"
+
+    def test_changed_plan_invalidates_subscriptions(self, api_client, admin):
+        plan = RatePlan.objects.create(plan="gold", price=800)
+        account = BillingAccount.objects.create(user=admin, amount=0)
+        Subscription.objects.create(account=account, plan=plan)
+        url = reverse("api:subscription-list")
+        etag = get(api_client, url)["ETag"]
+
+        plan.price = 900
+        plan.save()
+
+        assert get(api_client, url, if_none_match=etag).status_code == 200
+
+    def test_if_modified_since(self, api_client, vm):
+        url = reverse("api:virtualmachine-detail", args=[vm.pk])
+
+        since = http_date(vm.updated.timestamp())
+        assert get(api_client, url, if_modified_since=since).status_code == 304
+
+        before = http_date((vm.updated - timedelta(seconds=5)).timestamp())
+        assert get(api_client, url, if_modified_since=before).status_code == 200
+
+    def test_etags_are_per_user(self, api_client, vm):
+        url = reverse("api:virtualmachine-detail", args=[vm.pk])
+        etag = get(api_client, url)["ETag"]
+
+        other = User.objects.create_user(
+            email="other@mail.com",
+            password="password",
+            role="admin",
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+
+        assert get(other_client, url, if_none_match=etag).status_code == 200
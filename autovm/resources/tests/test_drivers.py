@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from autovm.resources.drivers import DriverError
+from autovm.resources.drivers import FakeDriver
+from autovm.resources.drivers import MachineSpec
+from autovm.resources.drivers import Operation
+from autovm.resources.drivers import Orchestrator
+from autovm.resources.drivers import get_driver
+from autovm.resources.tasks import run_operations
+
+
+def create(name, host="host0"):
+    return Operation(
+        "create",
+        name,
+        host,
+        {"name": name, "host": host, "disk_size": 200},
+    )
+
+
+class CountingDriver(FakeDriver):
+    """
+    Records the most operations running at once on each host.
+    """
+
+    def __init__(self):
+        super().__init__(min_latency=0.01, max_latency=0.01)
+        self.running = {}
+        self.peak = {}
+
+    def enter(self, *keys):
+        for key in keys:
+            self.running[key] = self.running.get(key, 0) + 1
+            self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+
+    def leave(self, *keys):
+        for key in keys:
+            self.running[key] -= 1
+
+    async def create(self, spec):
+        self.enter(spec.host)
+        try:
+            await super().create(spec)
+        finally:
+            self.leave(spec.host)
+
+    async def migrate(self, name, destination):
+        keys = (("from", self.machines[name]["host"]), ("to", destination))
+        self.enter(*keys)
+        try:
+            await super().migrate(name, destination)
+        finally:
+            self.leave(*keys)
+
+
+class TestFakeDriver:
+    def test_machines_go_through_their_lifecycle(self):
+        driver = FakeDriver()
+
+        async def lifecycle():
+            await driver.create(MachineSpec("vm1", "host0", 200))
+            await driver.start("vm1")
+            await driver.migrate("vm1", "host1")
+            image = await driver.snapshot("vm1")
+            await driver.stop("vm1")
+            return image
+
+        image = asyncio.run(lifecycle())
+
+        assert driver.machines == {"vm1": {"host": "host1", "running": False}}
+        assert len(image.read()) == driver.image_size
+
+    def test_unknown_machines_fail(self):
+        with pytest.raises(DriverError):
+            asyncio.run(FakeDriver(strict=True).start("vm1"))
+
+    def test_unknown_machines_are_adopted(self):
+        driver = FakeDriver()
+
+        asyncio.run(driver.start("vm1"))
+
+        assert driver.machines["vm1"]["running"]
+
+    def test_failures_are_simulated(self):
+        driver = FakeDriver(failure_rate=1)
+
+        with pytest.raises(DriverError):
+            asyncio.run(driver.create(MachineSpec("vm1", "host0", 200)))
+
+
+class TestOrchestrator:
+    def test_results_follow_the_operations(self):
+        orchestrator = Orchestrator(FakeDriver(strict=True))
+
+        results = orchestrator.run_sync(
+            [create("vm1"), create("vm2"), Operation("start", "vm3", "host0")],
+        )
+
+        assert [result.operation.machine for result in results] == ["vm1", "vm2", "vm3"]
+        assert [result.ok for result in results] == [True, True, False]
+        assert "does not exist" in results[2].error
+
+    def test_concurrency_is_capped_per_host(self):
+        driver = CountingDriver()
+        orchestrator = Orchestrator(driver, host_concurrency=3)
+        operations = [create(f"vm{n}", f"host{n % 2}") for n in range(20)]
+
+        results = orchestrator.run_sync(operations)
+
+        assert all(result.ok for result in results)
+        assert driver.peak == {"host0": 3, "host1": 3}
+
+    @pytest.mark.parametrize(
+        ("source", "destination", "peak"),
+        [
+            (lambda n: "host0", lambda n: f"host{n + 1}", ("from", "host0")),
+            (lambda n: f"host{n + 1}", lambda n: "host0", ("to", "host0")),
+        ],
+    )
+    def test_migrations_are_capped_per_source_and_destination(
+        self,
+        source,
+        destination,
+        peak,
+    ):
+        driver = CountingDriver()
+        driver.machines = {
+            f"vm{n}": {"host": source(n), "running": True} for n in range(20)
+        }
+        orchestrator = Orchestrator(
+            driver,
+            source_concurrency=3,
+            destination_concurrency=3,
+        )
+        operations = [
+            Operation("migrate", f"vm{n}", source(n), {"destination": destination(n)})
+            for n in range(20)
+        ]
+
+        results = orchestrator.run_sync(operations)
+
+        assert all(result.ok for result in results)
+        assert driver.peak[peak] == 3
+
+    def test_unknown_actions_are_rejected(self):
+        with pytest.raises(ValueError, match="reboot"):
+            Operation("reboot", "vm1", "host0")
+
+
+def test_run_operations_task(settings):
+    settings.HYPERVISOR_DRIVER = {"BACKEND": "autovm.resources.drivers.FakeDriver"}
+
+    results = run_operations(
+        [
+            {
+                "action": "create",
+                "machine": "vm1",
+                "host": "host0",
+                "arguments": {"name": "vm1", "host": "host0", "disk_size": 200},
+            },
+        ],
+    )
+
+    assert results[0]["ok"]
+    assert "vm1" in get_driver().machines
@@ -0,0 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import Transaction
+from autovm.resources.models import IdempotencyKey
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import VirtualMachine
+from autovm.resources.tasks import purge_idempotency_keys
+from autovm.users.models import User
+
+
+def make_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def customer(customer):
+    BillingAccount.objects.create(user=customer, amount=0)
+    return customer
+
+
+@pytest.fixture
+def deposit(customer):
+    client = make_client(customer)
+    url = reverse("api:billingaccount-deposit")
+
+    def post(key=None, amount=100):
+        headers = {"Idempotency-Key": key} if key else {}
+        return client.post(url, {"amount": amount}, format="json", headers=headers)
+
+    return post
+
+
+def balance(user):
+    return BillingAccount.objects.get(user=user).amount
+
+
+@pytest.mark.django_db
+class TestIdempotency:
+    def test_retry_is_replayed(self, customer, deposit):
+        first = deposit(key="a")
+        second = deposit(key="a")
+
+        assert balance(customer) == 100
+        assert Transaction.objects.count() == 1
+        assert second.status_code == first.status_code == 200
+        assert second.json() == first.json()
+        assert second["Idempotent-Replayed"] == "true"
+        assert not first.has_header("Idempotent-Replayed")
+
+    def test_requests_without_key_are_not_deduplicated(self, customer, deposit):
+        deposit()
+        deposit()
+
+        assert balance(customer) == 200
+
+    def test_key_reused_for_different_request(self, customer, deposit):
+        deposit(key="a")
+        response = deposit(key="a", amount=50)
+
+        assert response.status_code == 422
+        assert balance(customer) == 100
+
+    def test_keys_are_per_user(self, customer, deposit):
+        other = User.objects.create_user(email="other@mail.com", password="password")
+        BillingAccount.objects.create(user=other, amount=0)
+        url = reverse("api:billingaccount-deposit")
+
+        deposit(key="a")
+        make_client(other).post(
+            url,
+            {"amount": 100},
+            format="json",
+            headers={"Idempotency-Key": "a"},
+        )
+
+        assert balance(customer) == balance(other) == 100
+
+    def test_expired_key_runs_the_view_again(self, customer, deposit):
+        deposit(key="a")
+        IdempotencyKey.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        response = deposit(key="a")
+
+        assert not response.has_header("Idempotent-Replayed")
+        assert balance(customer) == 200
+        assert IdempotencyKey.objects.get().expires > timezone.now()
+
+    def test_failed_request_is_not_stored(self, admin):
+        client = make_client(admin)
+        url = reverse("api:virtualmachine-list")
+        headers = {"Idempotency-Key": "vm"}
+
+        failed = client.post(url, {"disk_size": "5"}, format="json", headers=headers)
+        assert failed.status_code == 400
+        assert not IdempotencyKey.objects.exists()
+
+        os_version = OperatingSystemVersion.objects.create(
+            operating_system=OperatingSystem.objects.create(name="Ubuntu"),
+            version="24.04",
+        )
+        data = {"description": "retried", "operating_system_version": os_version.pk}
+        created = client.post(url, data, format="json", headers=headers)
+        replayed = client.post(url, data, format="json", headers=headers)
+
+        assert created.status_code == replayed.status_code == 201
+        assert replayed.json()["_id"] == created.json()["_id"]
+        assert VirtualMachine.objects.count() == 1
+
+    def test_purge_expired_keys(self, customer, deposit):
+        deposit(key="a")
+        deposit(key="b")
+        IdempotencyKey.objects.filter(key="a").update(
+            expires=timezone.now() - timedelta(seconds=1),
+        )
+
+        purge_idempotency_keys()
+
+        assert list(IdempotencyKey.objects.values_list("key", flat=True)) == ["b"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_duplicates_run_once(customer):
+    url = reverse("api:billingaccount-deposit")
+
+    def post(_):
+        try:
+            return make_client(customer).post(
+                url,
+                {"amount": 100},
+                format="json",
+                headers={"Idempotency-Key": "a"},
+            )
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(post, range(4)))
+
+    assert [response.status_code for response in responses] == [200] * 4
+    assert (
+        sum(response.has_header("Idempotent-Replayed") for response in responses) == 3
+    )
+    assert balance(customer) == 100
+    assert Transaction.objects.count() == 1
@@ -0,0 +1,99 @@
+import re
+
+import pytest
+from celery.signals import before_task_publish
+from django.urls import reverse
+
+from autovm.middleware.instrumentation import RequestMetrics
+from autovm.middleware.instrumentation import current_metrics
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+
+
+def server_timing(response):
+    """
+    The Server-Timing metrics of a response, by name.
+    """
+    return {
+        metric.split(";")[0]: metric for metric in response["Server-Timing"].split(", ")
+    }
+
+
+@pytest.mark.django_db
+class TestRequestMetrics:
+    def test_server_timing(self, api_client, admin):
+        VirtualMachine.objects.create(
+            user=admin,
+            operating_system_version=OperatingSystemVersion.objects.create(
+                operating_system=OperatingSystem.objects.create(name="Ubuntu"),
+                version="24.04",
+            ),
+        )
+
+        timing = server_timing(api_client.get(reverse("api:virtualmachine-list")))
+
+        queries = int(re.search(r'"(\d+) queries"', timing["db"]).group(1))
+        assert queries > 1
+        assert float(re.search(r"dur=([\d.]+)", timing["serialize"]).group(1)) > 0
+        assert timing["total"].startswith("total;dur=")
+
+    def test_cache_lookups(self, api_client):
+        Region.objects.create(name="Germany Central")
+        url = reverse("api:region-list")
+
+        first = server_timing(api_client.get(url))
+        second = server_timing(api_client.get(url))
+
+        assert first["cache"] == 'cache;desc="hits=0 misses=1"'
+        assert second["cache"] == 'cache;desc="hits=1 misses=0"'
+
+    def test_tasks_enqueued(self):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            before_task_publish.send(sender="autovm.resources.tasks.notify_user")
+        finally:
+            current_metrics.reset(token)
+
+        assert metrics.tasks == {"autovm.resources.tasks.notify_user": 1}
+
+    def test_header_can_be_disabled(self, api_client, settings):
+        settings.SERVER_TIMING_HEADER = False
+
+        response = api_client.get(reverse("api:region-list"))
+
+        assert not response.has_header("Server-Timing")
+
+    def test_metrics_are_aggregated_per_action(self, api_client, settings):
+        settings.METRICS_TOKEN = "secret"  # noqa: S105
+        api_client.get(reverse("api:region-list"))
+
+        metrics = api_client.get(
+            reverse("metrics"),
+            headers={"Authorization": "Bearer secret"},
+        ).content.decode()
+
+        assert re.search(
+            r'autovm_http_requests_total\{method="GET",status="200",'
+            r'view="RegionViewSet.list"\} \d',
+            metrics,
+        )
+        assert (
+            'autovm_db_queries_per_request_bucket{le="+Inf",view="RegionViewSet.list"}'
+            in (metrics)
+        )
+
+    def test_metrics_token(self, api_client, settings):
+        url = reverse("metrics")
+
+        assert api_client.get(url).status_code == 404
+
+        settings.METRICS_TOKEN = "secret"  # noqa: S105
+
+        assert api_client.get(url).status_code == 401
+        assert (
+            api_client.get(url, headers={"Authorization": "Bearer secret"}).status_code
+            == 200
+        )
@@ -0,0 +1,247 @@
+import asyncio
+import json
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from autovm.resources.jobs import advance_job
+from autovm.resources.jobs import archive_jobs
+from autovm.resources.jobs import job_channel
+from autovm.resources.jobs import job_task
+from autovm.resources.jobs import publish
+from autovm.resources.models import ArchivedJob
+from autovm.resources.models import Job
+from autovm.resources.models import VirtualMachine
+from autovm.users.models import User
+from config.websocket import websocket_application
+
+
+@pytest.fixture
+def api_user(subscribed_customer):
+    return subscribed_customer
+
+
+@pytest.fixture
+def job(subscribed_customer):
+    return Job.objects.create(user=subscribed_customer, action="start", total=2)
+
+
+@pytest.mark.django_db
+class TestJobTask:
+    def test_results_are_recorded(self, job):
+        @job_task
+        def work(job, count):
+            advance_job(job, completed=count)
+            return {"count": count}
+
+        work(str(job.pk), 2)
+
+        job.refresh_from_db()
+        assert job.status == "succeeded"
+        assert job.completed == 2
+        assert job.result == {"count": 2}
+        assert job.started <= job.finished
+
+    def test_errors_fail_the_job(self, job):
+        @job_task
+        def work(job):
+            msg = "hypervisor unreachable"
+            raise RuntimeError(msg)
+
+        with pytest.raises(RuntimeError):
+            work(str(job.pk))
+
+        job.refresh_from_db()
+        assert job.status == "failed"
+        assert job.error == "hypervisor unreachable"
+
+    def test_failures_on_machines_fail_the_job(self, job):
+        @job_task
+        def work(job):
+            advance_job(job, completed=1, failed=1)
+
+        work(str(job.pk))
+
+        job.refresh_from_db()
+        assert (job.status, job.completed, job.failed) == ("failed", 1, 1)
+
+    def test_changes_are_published(self, job, jobs_redis):
+        pubsub = jobs_redis.pubsub()
+        pubsub.subscribe(job_channel(job.user_id))
+
+        advance_job(job, completed=1)
+
+        subscribed, message = pubsub.get_message(), pubsub.get_message()
+        assert subscribed["type"] == "subscribe"
+        assert json.loads(message["data"])["completed"] == 1
+
+
+@pytest.mark.django_db
+def test_finished_jobs_are_archived(subscribed_customer):
+    old = Job.objects.create(
+        user=subscribed_customer,
+        action="stop",
+        status="succeeded",
+        finished=timezone.now() - timedelta(days=30),
+    )
+    Job.objects.create(user=subscribed_customer, action="stop", status="running")
+    Job.objects.create(
+        user=subscribed_customer,
+        action="stop",
+        status="succeeded",
+        finished=timezone.now(),
+    )
+
+    assert archive_jobs(batch_size=1) == 1
+
+    assert Job.objects.count() == 2
+    archived = ArchivedJob.objects.get()
+    assert (archived.pk, archived.status) == (old.pk, "succeeded")
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("_eager_celery")
+class TestJobEndpoints:
+    def test_jobs_are_listed_per_user(self, api_client, job):
+        other = User.objects.create_user(email="other@mail.com", password="password")
+        Job.objects.create(user=other, action="stop")
+
+        response = api_client.get(reverse("api:job-list"))
+
+        assert [entry["_id"] for entry in response.json()["results"]] == [str(job.pk)]
+
+    def test_backups_run_as_jobs(
+        self,
+        api_client,
+        subscribed_customer,
+        django_capture_on_commit_callbacks,
+    ):
+        machine = VirtualMachine.objects.create(user=subscribed_customer)
+        url = reverse("api:virtualmachine-backup", kwargs={"pk": machine.pk})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(url)
+
+        assert response.status_code == 202
+        job = api_client.get(
+            reverse("api:job-detail", kwargs={"pk": response.json()["job"]}),
+        ).json()
+        assert job["status"] == "succeeded"
+        assert job["result"]["backup"] == str(machine.backups.get().pk)
+
+    def test_lifecycle_actions_run_as_jobs(
+        self,
+        api_client,
+        subscribed_customer,
+        django_capture_on_commit_callbacks,
+    ):
+        machine = VirtualMachine.objects.create(user=subscribed_customer)
+        VirtualMachine.objects.filter(pk=machine.pk).update(state="stopped")
+        url = reverse("api:virtualmachine-start", kwargs={"pk": machine.pk})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(url)
+
+        job = Job.objects.get(pk=response.json()["job"])
+        assert (job.action, job.status, job.completed) == ("start", "succeeded", 1)
+        assert job.result == {"succeeded": [str(machine.pk)], "failed": []}
+
+
+def connect(query_string, on_accept, headers=()):
+    """
+    Open a websocket to the job events and return what was sent to it,
+    calling ``on_accept`` once it is accepted and disconnecting after the
+    first message.
+    """
+    sent = []
+    messages = asyncio.Queue()
+
+    async def receive():
+        return await messages.get()
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "websocket.accept":
+            on_accept()
+        if message["type"] == "websocket.send":
+            messages.put_nowait({"type": "websocket.disconnect"})
+
+    async def run():
+        messages.put_nowait({"type": "websocket.connect"})
+        await websocket_application(
+            {
+                "type": "websocket",
+                "path": "/ws/jobs/",
+                "query_string": query_string,
+                "headers": list(headers),
+            },
+            receive,
+            send,
+        )
+
+    async_to_sync(run)()
+    return sent
+
+
+@pytest.mark.django_db
+class TestJobEvents:
+    def test_changes_of_jobs_are_sent(self, api_client, job):
+        ticket = api_client.post(reverse("api:job-ticket")).json()["ticket"]
+
+        sent = connect(f"ticket={ticket}".encode(), lambda: publish(job))
+
+        assert sent[0] == {"type": "websocket.accept"}
+        assert json.loads(sent[1]["text"])["_id"] == str(job.pk)
+
+    def test_tickets_open_one_socket(self, api_client, job):
+        ticket = api_client.post(reverse("api:job-ticket")).json()["ticket"]
+        connect(f"ticket={ticket}".encode(), lambda: publish(job))
+
+        sent = connect(f"ticket={ticket}".encode(), lambda: publish(job))
+
+        assert [message["type"] for message in sent] == ["websocket.close"]
+
+    def test_tickets_expire(self, api_client, jobs_redis, query_budgets):
+        ticket = api_client.post(reverse("api:job-ticket")).json()["ticket"]
+
+        assert 0 < jobs_redis.ttl(f"job-ticket:{ticket}") <= 30
+
+    def test_tokens_are_not_taken_from_the_query_string(self, job):
+        token = str(AccessToken.for_user(job.user))
+
+        sent = connect(f"token={token}".encode(), lambda: publish(job))
+
+        assert [message["type"] for message in sent] == ["websocket.close"]
+
+    def test_unauthenticated_sockets_are_closed(self):
+        sent = connect(b"ticket=invalid", lambda: None)
+
+        assert [message["type"] for message in sent] == ["websocket.close"]
+
+    @pytest.mark.parametrize(
+        ("origin", "accepted"),
+        [(b"https://example.com", True), (b"https://evil.example.org", False)],
+    )
+    def test_cookies_are_only_taken_from_this_site(
+        self,
+        job,
+        settings,
+        origin,
+        accepted,
+    ):
+        settings.ALLOWED_HOSTS = ["example.com"]
+        token = str(AccessToken.for_user(job.user))
+        cookie = f"{rest_auth_settings.JWT_AUTH_COOKIE}={token}".encode()
+
+        sent = connect(
+            b"",
+            lambda: publish(job),
+            [(b"origin", origin), (b"cookie", cookie)],
+        )
+
+        assert (sent[0]["type"] == "websocket.accept") is accepted
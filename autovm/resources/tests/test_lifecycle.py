@@ -0,0 +1,223 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from autovm.resources.drivers import FakeDriver
+from autovm.resources.drivers import Orchestrator
+from autovm.resources.lifecycle import begin
+from autovm.resources.lifecycle import perform
+from autovm.resources.lifecycle import recover_stalled
+from autovm.resources.models import Job
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.resources.tasks import perform_lifecycle
+from autovm.users.models import User
+
+
+@pytest.fixture
+def api_user(customer):
+    return customer
+
+
+def create_machine(user, state="running", **fields):
+    machine = VirtualMachine.objects.create(user=user, **fields)
+    VirtualMachine.objects.filter(pk=machine.pk).update(state=state)
+    machine.refresh_from_db()
+    return machine
+
+
+def states(*machines):
+    return [
+        VirtualMachine.objects.values_list("state", flat=True).get(pk=machine.pk)
+        for machine in machines
+    ]
+
+
+@pytest.mark.django_db
+class TestTransitions:
+    def test_only_machines_in_a_source_state_move(self, customer):
+        running = create_machine(customer, "running")
+        stopped = create_machine(customer, "stopped")
+
+        moved = VirtualMachine.objects.all().transition(["running"], "stopping")
+
+        assert moved == [running.pk]
+        assert states(running, stopped) == ["stopping", "stopped"]
+
+    def test_a_machine_moves_once(self, customer):
+        machine = create_machine(customer, "running")
+        machines = VirtualMachine.objects.filter(pk=machine.pk)
+
+        assert begin("stop", machines) == [machine.pk]
+        assert begin("stop", machines) == []
+        assert begin("restart", machines) == []
+
+    def test_saving_a_stale_machine_keeps_its_state(self, customer):
+        machine = create_machine(customer, "running")
+        begin("stop", VirtualMachine.objects.filter(pk=machine.pk))
+
+        machine.description = "edited"
+        machine.save()
+
+        assert states(machine) == ["stopping"]
+
+
+@pytest.mark.django_db
+class TestPerform:
+    def test_machines_reach_the_target_state(self, customer):
+        region = Region.objects.create(name="Eu West")
+        machines = [
+            create_machine(customer, "stopped", region=region) for _ in range(3)
+        ]
+        moved = begin("start", VirtualMachine.objects.all())
+
+        succeeded, failed = perform("start", moved, customer.pk)
+
+        assert sorted(succeeded) == sorted(moved)
+        assert failed == []
+        assert states(*machines) == ["running"] * 3
+        assert VirtualMachineHistory.objects.filter(action="start_vm").count() == 3
+
+    def test_failed_machines_are_in_error(self, customer):
+        machine = create_machine(customer, "running")
+        moved = begin("restart", VirtualMachine.objects.all())
+        orchestrator = Orchestrator(FakeDriver(failure_rate=1))
+
+        succeeded, failed = perform("restart", moved, customer.pk, orchestrator)
+
+        assert (succeeded, failed) == ([], [machine.pk])
+        assert states(machine) == ["error"]
+        assert not VirtualMachineHistory.objects.filter(action="start_vm").exists()
+
+    def test_provisioned_machines_run(self, customer):
+        machine = VirtualMachine.objects.create(user=customer)
+
+        perform("provision", [machine.pk], customer.pk)
+
+        assert states(machine) == ["running"]
+
+
+@pytest.mark.django_db
+class TestRecovery:
+    def test_stalled_machines_and_jobs_are_given_up_on(self, customer):
+        stalled = create_machine(customer, "starting")
+        moving = create_machine(customer, "migrating")
+        job = Job.objects.create(user=customer, action="start", status="running")
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        VirtualMachine.objects.update(updated=an_hour_ago)
+        Job.objects.update(updated=an_hour_ago)
+        busy = create_machine(customer, "stopping")
+        running = create_machine(customer, "running")
+
+        recovered = recover_stalled(timezone.now() - timedelta(minutes=30))
+
+        assert sorted(recovered) == sorted([stalled.pk, moving.pk])
+        assert states(stalled, moving, busy, running) == [
+            "error",
+            "error",
+            "stopping",
+            "running",
+        ]
+        job.refresh_from_db()
+        assert (job.status, job.error) == ("failed", "The job stalled")
+
+    @pytest.mark.usefixtures("_eager_celery")
+    def test_machines_are_put_back_when_the_broker_is_down(
+        self,
+        api_client,
+        customer,
+        monkeypatch,
+        django_capture_on_commit_callbacks,
+    ):
+        def unavailable(*args, **kwargs):
+            msg = "Connection refused"
+            raise OperationalError(msg)
+
+        monkeypatch.setattr(perform_lifecycle, "apply_async", unavailable)
+        machine = create_machine(customer, "running")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse("api:virtualmachine-stop", kwargs={"pk": machine.pk}),
+            )
+
+        assert response.status_code == 202
+        assert states(machine) == ["error"]
+        assert Job.objects.get().status == "failed"
+
+        # the machine isn't stuck, it can be stopped again
+        monkeypatch.delattr(perform_lifecycle, "apply_async")
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(
+                reverse("api:virtualmachine-stop", kwargs={"pk": machine.pk}),
+            )
+        assert states(machine) == ["stopped"]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("_eager_celery")
+class TestLifecycleEndpoints:
+    def test_stop(self, api_client, customer, django_capture_on_commit_callbacks):
+        machine = create_machine(customer, "running")
+        url = reverse("api:virtualmachine-stop", kwargs={"pk": machine.pk})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(url)
+
+        assert response.status_code == 202
+        assert response.json()["state"] == "stopping"
+        assert states(machine) == ["stopped"]
+
+    def test_invalid_transitions_conflict(self, api_client, customer):
+        machine = create_machine(customer, "stopped")
+        url = reverse("api:virtualmachine-restart", kwargs={"pk": machine.pk})
+
+        response = api_client.post(url)
+
+        assert response.status_code == 409
+        assert states(machine) == ["stopped"]
+
+    def test_bulk_start(self, api_client, customer, django_capture_on_commit_callbacks):
+        stopped = [create_machine(customer, "stopped") for _ in range(3)]
+        running = create_machine(customer, "running")
+        other = create_machine(
+            User.objects.create_user(email="other@mail.com", password="password"),
+            "stopped",
+        )
+        requested = [*stopped, running, other]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse("api:virtualmachine-bulk-start"),
+                {"machines": [str(machine.pk) for machine in requested]},
+                format="json",
+            )
+
+        body = response.json()
+        assert response.status_code == 202
+        assert body["job"]
+        assert sorted(body["accepted"]) == sorted(
+            str(machine.pk) for machine in stopped
+        )
+        assert body["rejected"] == [str(running.pk), str(other.pk)]
+        assert states(*requested) == ["running"] * 4 + ["stopped"]
+
+    def test_bulk_actions_report_machines_they_rejected(self, api_client, customer):
+        machine = create_machine(customer, "stopped")
+
+        response = api_client.post(
+            reverse("api:virtualmachine-bulk-stop"),
+            {"machines": [str(machine.pk)]},
+            format="json",
+        )
+
+        assert response.status_code == 409
+        assert response.json() == {
+            "job": None,
+            "accepted": [],
+            "rejected": [str(machine.pk)],
+        }
@@ -0,0 +1,219 @@
+import pytest
+from django.urls import reverse
+
+from autovm.resources.drivers import FakeDriver
+from autovm.resources.drivers import Orchestrator
+from autovm.resources.models import Host
+from autovm.resources.models import Job
+from autovm.resources.models import Notification
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.resources.moves import begin_move
+from autovm.resources.moves import perform_moves
+
+
+@pytest.fixture
+def api_user(customer):
+    return customer
+
+
+@pytest.fixture
+def regions(db):
+    return Region.objects.create(name="Eu West"), Region.objects.create(name="Us East")
+
+
+def create_host(region, name, memory=64):
+    return Host.objects.create(
+        name=name,
+        region=region,
+        cpus=16,
+        memory=memory,
+        disk=2000,
+    )
+
+
+def create_machine(user, region, host=None, state="running"):
+    machine = VirtualMachine.objects.create(user=user, region=region)
+    if host:
+        Host.objects.filter(pk=host.pk).reserve(1, 2, 200)
+    VirtualMachine.objects.filter(pk=machine.pk).update(state=state, host=host)
+    machine.refresh_from_db()
+    return machine
+
+
+def usage(host):
+    host.refresh_from_db()
+    return host.used_cpus, host.used_memory, host.used_disk
+
+
+@pytest.mark.django_db
+class TestPerformMoves:
+    def test_machines_move_to_a_host_of_the_region(self, customer, regions):
+        source, destination = regions
+        old = create_host(source, "eu-1")
+        new = create_host(destination, "us-1")
+        running = create_machine(customer, source, old)
+        stopped = create_machine(customer, source, old, "stopped")
+        moves = begin_move(VirtualMachine.objects.all(), destination.pk)
+
+        succeeded, failed = perform_moves(moves, destination.pk, customer.pk)
+
+        assert sorted(succeeded) == sorted([running.pk, stopped.pk])
+        assert failed == []
+        assert sorted(
+            VirtualMachine.objects.values_list("state", "region", "host"),
+        ) == [
+            ("running", destination.pk, new.pk),
+            ("stopped", destination.pk, new.pk),
+        ]
+        assert usage(old) == (0, 0, 0)
+        assert usage(new) == (2, 4, 400)
+        history = VirtualMachineHistory.objects.filter(action="move_vm")
+        assert history.count() == 2
+        assert history.first().description == (
+            "moved the virtual machine from Eu West to Us East"
+        )
+
+    def test_failed_migrations_give_their_reservation_back(self, customer, regions):
+        source, destination = regions
+        old = create_host(source, "eu-1")
+        new = create_host(destination, "us-1")
+        machine = create_machine(customer, source, old)
+        moves = begin_move(VirtualMachine.objects.all(), destination.pk)
+        orchestrator = Orchestrator(FakeDriver(failure_rate=1))
+
+        succeeded, failed = perform_moves(
+            moves,
+            destination.pk,
+            customer.pk,
+            orchestrator,
+        )
+
+        assert (succeeded, failed) == ([], [machine.pk])
+        machine.refresh_from_db()
+        assert (machine.state, machine.host) == ("error", old)
+        assert usage(old) == (1, 2, 200)
+        assert usage(new) == (0, 0, 0)
+
+    def test_machines_without_room_stay_as_they_were(self, customer, regions):
+        source, destination = regions
+        create_host(destination, "us-1", memory=1)
+        machine = create_machine(customer, source, state="stopped")
+        moves = begin_move(VirtualMachine.objects.all(), destination.pk)
+
+        succeeded, failed = perform_moves(moves, destination.pk, customer.pk)
+
+        assert (succeeded, failed) == ([], [machine.pk])
+        machine.refresh_from_db()
+        assert (machine.state, machine.region) == ("stopped", source)
+
+    def test_machines_in_other_states_are_not_moved(self, customer, regions):
+        source, destination = regions
+        create_machine(customer, source, state="provisioning")
+        create_machine(customer, destination)
+
+        assert begin_move(VirtualMachine.objects.all(), destination.pk) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("_eager_celery")
+class TestMoveEndpoints:
+    def test_move(
+        self,
+        api_client,
+        customer,
+        regions,
+        django_capture_on_commit_callbacks,
+    ):
+        source, destination = regions
+        machine = create_machine(customer, source)
+        url = reverse("api:virtualmachine-move", kwargs={"pk": machine.pk})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(url, {"region": destination.pk}, format="json")
+
+        assert response.status_code == 202
+        assert response.json()["state"] == "migrating"
+        job = Job.objects.get(pk=response.json()["job"])
+        assert (job.action, job.status, job.completed) == ("move", "succeeded", 1)
+        machine.refresh_from_db()
+        assert (machine.region, machine.state) == (destination, "running")
+        assert Notification.objects.get(user=customer).message == (
+            "1 of your virtual machines moved to Us East."
+        )
+
+    def test_moving_to_the_same_region_is_rejected(self, api_client, customer, regions):
+        source, _ = regions
+        machine = create_machine(customer, source)
+        url = reverse("api:virtualmachine-move", kwargs={"pk": machine.pk})
+
+        response = api_client.post(
+            url,
+            {"region": source.pk},
+            format="json",
+        )
+
+        assert response.status_code == 400
+
+    def test_bulk_move(self, api_client, customer, regions, query_budgets):
+        source, destination = regions
+        running = create_machine(customer, source)
+        busy = create_machine(customer, source, state="migrating")
+
+        response = api_client.post(
+            reverse("api:virtualmachine-bulk-move"),
+            {
+                "machines": [str(running.pk), str(busy.pk)],
+                "region": str(destination.pk),
+            },
+            format="json",
+        )
+
+        assert response.status_code == 202
+        assert response.json()["accepted"] == [str(running.pk)]
+        assert response.json()["rejected"] == [str(busy.pk)]
+
+    def test_evacuate(
+        self,
+        api_client,
+        admin,
+        customer,
+        regions,
+        settings,
+        query_budgets,
+        django_capture_on_commit_callbacks,
+    ):
+        source, destination = regions
+        old = create_host(source, "eu-1")
+        new = create_host(destination, "us-1")
+        machines = [create_machine(customer, source, old) for _ in range(2)]
+        machines.append(create_machine(None, source, old))
+        settings.MIGRATION_BATCH_SIZE = 2
+        url = reverse("api:region-evacuate", kwargs={"pk": source.pk})
+
+        api_client.force_authenticate(user=admin)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(url, {}, format="json")
+
+        assert response.status_code == 202
+        assert response.json()["machines"] == 3
+        job = Job.objects.get(pk=response.json()["job"])
+        assert (job.status, job.completed, job.failed) == ("succeeded", 3, 0)
+        assert set(
+            VirtualMachine.objects.filter(
+                pk__in=[machine.pk for machine in machines],
+            ).values_list("host", flat=True),
+        ) == {new.pk}
+        old.refresh_from_db()
+        assert not old.is_active
+        assert usage(old) == (0, 0, 0)
+        assert Notification.objects.filter(user=customer).count() == 1
+
+    def test_evacuating_is_for_admins(self, api_client, regions):
+        source, _ = regions
+        url = reverse("api:region-evacuate", kwargs={"pk": source.pk})
+
+        response = api_client.post(url, {}, format="json")
+
+        assert response.status_code == 403
@@ -0,0 +1,254 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from autovm.resources.models import Host
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.placement import NoCapacityError
+from autovm.resources.placement import PlacementIndex
+from autovm.resources.placement import place
+from autovm.users.models import User
+
+
+@pytest.fixture
+def region(db):
+    return Region.objects.create(name="Eu West")
+
+
+def create_machine(client, region):
+    os_version = OperatingSystemVersion.objects.create(
+        operating_system=OperatingSystem.objects.create(name="Ubuntu"),
+        version="24.04",
+    )
+    return client.post(
+        reverse("api:virtualmachine-list"),
+        {
+            "region": region.pk,
+            "operating_system_version": os_version.pk,
+            "disk_size": "200",
+        },
+        format="json",
+    )
+
+
+def create_host(region, name, cpus=16, memory=64, disk=2000):
+    return Host.objects.create(
+        name=name,
+        region=region,
+        cpus=cpus,
+        memory=memory,
+        disk=disk,
+    )
+
+
+def usage(host):
+    host.refresh_from_db()
+    return host.used_cpus, host.used_memory, host.used_disk
+
+
+class TestPlacementIndex:
+    def index(self):
+        index = PlacementIndex()
+        index.update(1, "eu", (16, 64, 2000))
+        index.update(2, "eu", (16, 32, 2000))
+        index.update(3, "us", (16, 48, 2000))
+        return index
+
+    def test_binpack_picks_the_fullest_host_that_fits(self):
+        index = self.index()
+
+        assert index.find(["eu"], 2, 8, 400, "binpack") == 2
+        assert index.find(["eu"], 2, 48, 400, "binpack") == 1
+        assert index.find(["eu", "us"], 2, 40, 400, "binpack") == 3
+
+    def test_spread_picks_the_emptiest_host(self):
+        index = self.index()
+
+        assert index.find(["eu"], 2, 8, 400, "spread") == 1
+        assert index.find(["eu", "us"], 2, 8, 400, "spread") == 1
+
+    def test_hosts_short_of_any_resource_are_skipped(self):
+        index = self.index()
+
+        assert index.find(["eu"], 32, 8, 400, "binpack") is None
+        assert index.find(["eu"], 2, 8, 4000, "spread") is None
+
+    def test_taken_capacity_is_no_longer_free(self):
+        index = self.index()
+
+        index.take(1, 8, 40, 400)
+
+        assert index.find(["eu"], 2, 30, 400, "binpack") == 2
+        assert index.find(["eu"], 2, 30, 400, "spread") == 2
+
+    def test_inactive_hosts_are_dropped(self):
+        index = self.index()
+
+        index.update(2, "eu", (16, 32, 2000), active=False)
+
+        assert index.find(["eu"], 2, 8, 400, "binpack") == 1
+
+
+@pytest.mark.django_db
+class TestPlace:
+    def test_machines_are_placed_in_their_region(self, admin, region):
+        other = create_host(Region.objects.create(name="Us East"), "us-1")
+        host = create_host(region, "eu-1")
+        machine = VirtualMachine.objects.create(
+            user=admin,
+            region=region,
+            disk_size="300",
+        )
+
+        assert place(machine) == host.pk
+
+        machine.refresh_from_db()
+        assert machine.host == host
+        assert usage(host) == (2, 4, 300)
+        assert usage(other) == (0, 0, 0)
+
+    def test_machines_without_a_region_take_the_hosts(self, admin, region):
+        host = create_host(region, "eu-1")
+        machine = VirtualMachine.objects.create(user=admin)
+
+        place(machine)
+
+        machine.refresh_from_db()
+        assert (machine.host, machine.region) == (host, region)
+
+    def test_regions_without_hosts_are_not_placed(self, admin, region):
+        machine = VirtualMachine.objects.create(user=admin, region=region)
+
+        assert place(machine) is None
+
+    def test_full_regions_have_no_capacity(self, admin, region):
+        create_host(region, "eu-1", disk=300)
+        machine = VirtualMachine.objects.create(
+            user=admin,
+            region=region,
+            disk_size="400",
+        )
+
+        with pytest.raises(NoCapacityError):
+            place(machine)
+
+    def test_capacity_reserved_elsewhere_is_picked_up(
+        self,
+        admin,
+        region,
+        placement_index,
+    ):
+        full = create_host(region, "eu-1", memory=4)
+        spare = create_host(region, "eu-2", memory=64)
+        placement_index.refresh()
+        # another process fills the host this one would pick
+        Host.objects.filter(pk=full.pk).reserve(2, 4, 300)
+        machine = VirtualMachine.objects.create(
+            user=admin,
+            region=region,
+            disk_size="300",
+        )
+
+        assert place(machine) == spare.pk
+        assert usage(full) == (2, 4, 300)
+
+    def test_reservations_enter_the_index_on_commit(
+        self,
+        admin,
+        region,
+        placement_index,
+        django_capture_on_commit_callbacks,
+    ):
+        host = create_host(region, "eu-1")
+        placement_index.refresh()
+        machine = VirtualMachine.objects.create(
+            user=admin,
+            region=region,
+            disk_size="300",
+        )
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            place(machine)
+            # a rolled back transaction leaves the index as it was
+            assert placement_index.hosts[host.pk][1] == (64, 16, 2000, host.pk)
+        for callback in callbacks:
+            callback()
+
+        assert placement_index.hosts[host.pk][1] == (60, 14, 1700, host.pk)
+
+    def test_deleted_machines_release_their_capacity(self, admin, region):
+        host = create_host(region, "eu-1")
+        machine = VirtualMachine.objects.create(user=admin, region=region)
+        place(machine)
+
+        machine.delete()
+
+        assert usage(host) == (0, 0, 0)
+
+    def test_resized_machines_change_their_usage(self, admin, region):
+        host = create_host(region, "eu-1")
+        machine = VirtualMachine.objects.create(user=admin, region=region)
+        place(machine)
+
+        machine = VirtualMachine.objects.get(pk=machine.pk)
+        machine.disk_size = "600"
+        machine.save()
+
+        assert usage(host) == (4, 16, 600)
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("_eager_celery")
+class TestPlacementEndpoints:
+    def test_created_machines_are_placed(
+        self,
+        api_client,
+        region,
+        django_capture_on_commit_callbacks,
+    ):
+        host = create_host(region, "eu-1")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = create_machine(api_client, region)
+
+        assert response.status_code == 201
+        assert response.json()["host"] == str(host.pk)
+        assert VirtualMachine.objects.get().state == "running"
+
+    def test_creating_without_capacity_is_unavailable(self, api_client, region):
+        create_host(region, "eu-1", cpus=0)
+
+        response = create_machine(api_client, region)
+
+        assert response.status_code == 503
+        assert not VirtualMachine.objects.exists()
+
+    def test_capacity_per_region(self, api_client, region):
+        create_host(region, "eu-1")
+        create_host(region, "eu-2")
+        Host.objects.filter(name="eu-1").reserve(2, 4, 300)
+
+        response = api_client.get(reverse("api:host-capacity"))
+
+        assert response.json() == [
+            {
+                "region": str(region.pk),
+                "hosts": 2,
+                "cpus": 32,
+                "memory": 128,
+                "disk": 4000,
+                "free_cpus": 30,
+                "free_memory": 124,
+                "free_disk": 3700,
+            },
+        ]
+
+    def test_hosts_are_for_admins(self, region):
+        customer = User.objects.create_user(email="c@mail.com", password="password")
+        client = APIClient()
+        client.force_authenticate(user=customer)
+
+        assert client.get(reverse("api:host-list")).status_code == 403
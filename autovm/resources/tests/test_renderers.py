@@ -0,0 +1,86 @@
+import io
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from autovm.billing.models import BillingAccount
+from autovm.resources.api.parsers import ORJSONParser
+from autovm.resources.api.renderers import ORJSONRenderer
+from autovm.users.models import User
+
+
+class TestORJSONRenderer:
+    def test_matches_json_renderer(self):
+        data = {
+            "id": uuid.uuid4(),
+            "created": timezone.now(),
+            "day": timezone.now().date(),
+            "amount": Decimal("12.50"),
+            "elapsed": timedelta(seconds=90),
+            "label": gettext_lazy("Daily"),
+            "text": "café \u2028 line",
+            "items": [1, 2.5, None, True],
+        }
+
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    def test_indent(self):
+        rendered = ORJSONRenderer().render(
+            {"a": 1},
+            "application/json; indent=4",
+        )
+
+        assert rendered == b'{\n  "a": 1\n}'
+
+    def test_none_renders_empty(self):
+        assert ORJSONRenderer().render(None) == b""
+
+
+class TestORJSONParser:
+    def test_matches_json_parser(self):
+        body = '{"amount": 12.5, "name": "café", "tags": [1, null]}'.encode()
+
+        assert ORJSONParser().parse(io.BytesIO(body)) == JSONParser().parse(
+            io.BytesIO(body),
+        )
+
+    @pytest.mark.parametrize("body", [b"{", b'{"amount": NaN}', b"\xff"])
+    def test_invalid_json(self, body):
+        with pytest.raises(ParseError):
+            ORJSONParser().parse(io.BytesIO(body))
+
+    def test_other_encodings(self):
+        body = '{"name": "café"}'.encode("latin-1")
+        parsed = ORJSONParser().parse(
+            io.BytesIO(body),
+            parser_context={"encoding": "latin-1"},
+        )
+
+        assert parsed == {"name": "café"}
+
+
+@pytest.mark.django_db
+def test_api_round_trip():
+    user = User.objects.create_user(email="customer@mail.com", password="password")
+    BillingAccount.objects.create(user=user, amount=0)
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    response = client.post(
+        reverse("api:billingaccount-deposit"),
+        b'{"amount": 100}',
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/json"
+    assert BillingAccount.objects.get(user=user).amount == 100
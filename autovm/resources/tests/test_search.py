@@ -0,0 +1,241 @@
+import pytest
+from django.urls import reverse
+
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.billing.models import Transaction
+from autovm.resources.models import Backup
+from autovm.resources.models import OperatingSystem
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.users.models import User
+
+
+@pytest.fixture
+def admin(admin):
+    admin.name = "Ada Lovelace"
+    admin.save(update_fields=["name"])
+    return admin
+
+
+@pytest.fixture
+def machines(admin):
+    region = Region.objects.create(name="Germany Central")
+    ubuntu = OperatingSystemVersion.objects.create(
+        operating_system=OperatingSystem.objects.create(name="Ubuntu"),
+        version="20.04",
+    )
+    fedora = OperatingSystemVersion.objects.create(
+        operating_system=OperatingSystem.objects.create(name="Fedora"),
+        version="40",
+    )
+    return [
+        VirtualMachine.objects.create(
+            name="webserver01",
+            description="nginx front",
+            user=admin,
+            region=region,
+            operating_system_version=ubuntu,
+        ),
+        VirtualMachine.objects.create(
+            name="database01",
+            description="postgres primary for the webserver",
+            user=admin,
+            operating_system_version=fedora,
+        ),
+    ]
+
+
+def search(client, text):
+    response = client.get(reverse("api:virtualmachine-list"), {"search": text})
+    assert response.status_code == 200
+    return [vm["name"] for vm in response.json()["results"]]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("machines")
+class TestVirtualMachineSearch:
+    @pytest.mark.parametrize(
+        ("text", "expected"),
+        [
+            ("ubun", ["webserver01"]),
+            ("germany", ["webserver01"]),
+            ("lovelace", ["database01", "webserver01"]),
+            ("20.04", ["webserver01"]),
+            ("postgres primary", ["database01"]),
+            ("fedora 40", ["database01"]),
+            ("nothing", []),
+        ],
+    )
+    def test_search(self, api_client, text, expected):
+        assert search(api_client, text) == expected
+
+    def test_misspelt_name(self, api_client):
+        assert search(api_client, "webservr01") == ["webserver01"]
+
+    def test_results_are_ranked(self, api_client):
+        response = api_client.get(
+            reverse("api:virtualmachine-list"),
+            {"search": "webserver"},
+        )
+        results = response.json()["results"]
+
+        # the name match outranks the description match
+        assert [vm["name"] for vm in results] == ["webserver01", "database01"]
+        assert results[0]["search_rank"] > results[1]["search_rank"]
+
+    def test_rank_only_returned_when_searching(self, api_client):
+        results = api_client.get(reverse("api:virtualmachine-list")).json()["results"]
+        assert all("search_rank" not in vm for vm in results)
+
+    def test_search_is_paginated_in_rank_order(self, api_client, admin, machines):
+        for i in range(10):
+            VirtualMachine.objects.create(
+                name=f"web{i:02}",
+                description="web",
+                user=admin,
+                operating_system_version=machines[0].operating_system_version,
+            )
+        url = reverse("api:virtualmachine-list")
+
+        first_page = api_client.get(url, {"search": "web"}).json()
+        second_page = api_client.get(first_page["next"]).json()
+
+        results = first_page["results"] + second_page["results"]
+        ranks = [vm["search_rank"] for vm in results]
+        assert len(results) == 12
+        assert len({vm["_id"] for vm in results}) == 12
+        assert ranks == sorted(ranks, reverse=True)
+
+    def test_quotes_in_search_terms(self, api_client):
+        assert search(api_client, "'ubuntu'") == ["webserver01"]
+        # nothing left to search for, all machines are listed
+        assert search(api_client, "'") == ["database01", "webserver01"]
+
+
+@pytest.mark.django_db
+class TestSearchVector:
+    def test_related_renames_refresh_the_vector(self, api_client, machines):
+        region = Region.objects.get()
+        region.name = "Iceland North"
+        region.save()
+        operating_system = OperatingSystem.objects.get(name="Fedora")
+        operating_system.name = "Rocky"
+        operating_system.save()
+        user = User.objects.get(email="admin@mail.com")
+        user.name = "Grace Hopper"
+        user.save()
+
+        assert search(api_client, "iceland") == ["webserver01"]
+        assert search(api_client, "rocky") == ["database01"]
+        assert search(api_client, "hopper") == ["database01", "webserver01"]
+        assert search(api_client, "lovelace") == []
+
+    def test_routine_saves_skip_the_refresh(
+        self,
+        machines,
+        admin,
+        django_assert_num_queries,
+    ):
+        vm = machines[0]
+        vm.is_active = False
+        with django_assert_num_queries(1):
+            vm.save(update_fields=["is_active"])
+
+        admin.last_login = vm.created
+        with django_assert_num_queries(1):
+            admin.save()
+
+
+@pytest.fixture
+def billing(admin, machines):
+    """
+    Backups, accounts, subscriptions and transactions for two users.
+    """
+    other = User.objects.create_user(
+        name="Grace Hopper",
+        email="grace@mail.com",
+        password="password",
+    )
+    gold = RatePlan.objects.create(plan="gold", price=800, vm_limit=3, backup_limit=3)
+    bronze = RatePlan.objects.create(plan="bronze", price=200)
+    admin_account = BillingAccount.objects.create(user=admin, amount=150)
+    other_account = BillingAccount.objects.create(user=other, amount=900)
+    Subscription.objects.create(account=admin_account, plan=gold)
+    Subscription.objects.create(account=other_account, plan=bronze, status="inactive")
+    Transaction.objects.create(account=admin_account, amount=150)
+    Transaction.objects.create(account=other_account, amount=900, status="completed")
+    Backup.objects.create(vm=machines[0], size=200)
+    Backup.objects.create(vm=machines[1], size=300)
+    return admin_account, other_account
+
+
+def search_ids(client, name, text, field="_id"):
+    response = client.get(reverse(f"api:{name}-list"), {"search": text})
+    assert response.status_code == 200
+    return [item[field] for item in response.json()["results"]]
+
+
+@pytest.mark.django_db
+class TestTypedSearch:
+    def test_backups(self, api_client, machines, billing):
+        today = machines[0].created.date().isoformat()
+
+        assert search_ids(api_client, "backup", machines[0].pk, "vm") == [
+            str(machines[0].pk),
+        ]
+        assert search_ids(api_client, "backup", "300", "size") == [300]
+        assert search_ids(api_client, "backup", "webserver", "size") == [200]
+        assert sorted(search_ids(api_client, "backup", today, "size")) == [200, 300]
+        assert search_ids(api_client, "backup", "2001-01-01") == []
+
+    def test_billing_accounts(self, api_client, admin, billing):
+        admin_account, other_account = billing
+
+        assert search_ids(api_client, "billingaccount", "150") == [
+            str(admin_account.pk),
+        ]
+        assert search_ids(api_client, "billingaccount", "900.00") == [
+            str(other_account.pk),
+        ]
+        assert search_ids(api_client, "billingaccount", "grace@") == [
+            str(other_account.pk),
+        ]
+        assert search_ids(api_client, "billingaccount", str(admin.pk)) == [
+            str(admin_account.pk),
+        ]
+
+    def test_subscriptions(self, api_client, billing):
+        admin_account, other_account = billing
+
+        assert search_ids(api_client, "subscription", "gold", "account") == [
+            str(admin_account.pk),
+        ]
+        assert search_ids(api_client, "subscription", "Inactive", "account") == [
+            str(other_account.pk),
+        ]
+        assert search_ids(api_client, "subscription", "hopper", "account") == [
+            str(other_account.pk),
+        ]
+        assert search_ids(api_client, "subscription", "gold inactive") == []
+
+    def test_transactions(self, api_client, billing):
+        admin_account, other_account = billing
+
+        assert search_ids(
+            api_client,
+            "transaction",
+            str(other_account.pk),
+            "amount",
+        ) == [
+            "900.00",
+        ]
+        assert search_ids(api_client, "transaction", "completed", "amount") == [
+            "900.00",
+        ]
+
+    def test_term_matching_no_field(self, api_client, billing):
+        assert search_ids(api_client, "rateplan", "diamond") == []
+        assert len(search_ids(api_client, "rateplan", "gold")) == 1
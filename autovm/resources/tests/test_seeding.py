@@ -0,0 +1,81 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import Subscription
+from autovm.billing.models import Transaction
+from autovm.resources.models import VirtualMachine
+from autovm.resources.models import VirtualMachineHistory
+from autovm.resources.seeding import SEED_DOMAIN
+from autovm.resources.seeding import BulkSeeder
+from autovm.resources.seeding import Volumes
+from autovm.users.models import Customer
+from autovm.users.models import User
+
+VOLUMES = Volumes(users=3, machines=7, history=20, transactions=5)
+
+
+def seed_machine_ids(seed):
+    with transaction.atomic():
+        BulkSeeder(seed=seed, batch_size=4).seed(VOLUMES)
+        machines = list(VirtualMachine.objects.order_by("name").values_list("pk"))
+        transaction.set_rollback(True)
+    return machines
+
+
+@pytest.mark.django_db
+class TestBulkSeeder:
+    def test_volumes_are_seeded(self):
+        BulkSeeder(batch_size=4).seed(VOLUMES)
+
+        assert User.objects.count() == VOLUMES.users
+        assert Customer.objects.count() == VOLUMES.users
+        assert BillingAccount.objects.count() == VOLUMES.users
+        assert Subscription.objects.filter(status="active").count() == VOLUMES.users
+        assert VirtualMachine.objects.count() == VOLUMES.machines
+        assert VirtualMachineHistory.objects.count() == VOLUMES.history
+        assert Transaction.objects.count() == VOLUMES.transactions
+
+    def test_seeded_rows_are_complete(self):
+        BulkSeeder().seed(VOLUMES)
+
+        user = User.objects.first()
+        assert user.check_password("password")
+        assert not VirtualMachine.objects.filter(search_vector=None).exists()
+        history = VirtualMachineHistory.objects.select_related("virtual_machine")
+        assert all(entry.user_id == entry.virtual_machine.user_id for entry in history)
+
+    def test_seed_is_deterministic(self):
+        assert seed_machine_ids(1) == seed_machine_ids(1)
+        assert seed_machine_ids(1) != seed_machine_ids(2)
+
+    def test_volumes_scale(self):
+        assert Volumes().scale(0.01) == Volumes(100, 1_000, 10_000, 1_000)
+        assert Volumes().scale(0).users == 1
+
+
+@pytest.mark.django_db
+class TestInitializeDataCommand:
+    def test_volumes_are_seeded(self, settings):
+        settings.ADMIN_USERNAME = "admin"
+        settings.ADMIN_EMAIL = "admin@mail.com"
+        settings.ADMIN_PASSWORD = "password"  # noqa: S105
+        call_command(
+            "initializedata",
+            users=VOLUMES.users,
+            vms=VOLUMES.machines,
+            history=VOLUMES.history,
+            transactions=VOLUMES.transactions,
+        )
+
+        seeded = User.objects.filter(email__endswith=f"@{SEED_DOMAIN}")
+        assert seeded.count() == VOLUMES.users
+        machines = VirtualMachine.objects.filter(user__in=seeded)
+        assert machines.count() == VOLUMES.machines
+        assert User.objects.filter(email="customer1@mail.com").exists()
+
+    def test_machines_need_users(self):
+        with pytest.raises(CommandError):
+            call_command("initializedata", vms=7)
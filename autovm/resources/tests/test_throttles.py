@@ -0,0 +1,129 @@
+from unittest.mock import patch
+
+import pytest
+import redis
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from autovm.resources.api import throttles
+from autovm.users.models import User
+
+
+@pytest.fixture
+def rates(settings):
+    """
+    Small rates so that buckets run dry within a test.
+    """
+    rates = {
+        "anon": "2/min",
+        "user": "3/min",
+        "user:admin": "5/min",
+        "backup": "1/hour",
+    }
+    settings.REST_FRAMEWORK = {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": rates,
+    }
+    return rates
+
+
+@pytest.fixture
+def now():
+    """
+    The clock of the fake Redis server the buckets are kept on.
+    """
+    with patch("time.time", return_value=1_000_000.0) as clock:
+        yield clock
+
+
+def make_client(**fields):
+    user = User.objects.create_user(password="password", **fields)  # noqa: S106
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("rates", "now")
+class TestTokenBucketThrottle:
+    url = "/api/regions/"
+
+    def test_user_bucket_runs_dry(self):
+        client = make_client(email="customer@mail.com")
+        statuses = [client.get(self.url).status_code for _ in range(4)]
+
+        assert statuses == [200, 200, 200, 429]
+
+    def test_retry_after_header(self):
+        client = make_client(email="customer@mail.com")
+        for _ in range(3):
+            client.get(self.url)
+
+        response = client.get(self.url)
+        # one token every 20 seconds at 3/min
+        assert response["Retry-After"] == "20"
+
+    def test_bucket_refills(self, now):
+        client = make_client(email="customer@mail.com")
+        for _ in range(3):
+            client.get(self.url)
+        assert client.get(self.url).status_code == 429
+
+        now.return_value += 20
+        assert client.get(self.url).status_code == 200
+        assert client.get(self.url).status_code == 429
+
+    def test_users_have_separate_buckets(self):
+        first = make_client(email="first@mail.com")
+        second = make_client(email="second@mail.com")
+        for _ in range(3):
+            first.get(self.url)
+
+        assert first.get(self.url).status_code == 429
+        assert second.get(self.url).status_code == 200
+
+    def test_role_rate_overrides_user_rate(self):
+        client = make_client(email="admin@mail.com", role="admin")
+        statuses = [client.get(self.url).status_code for _ in range(6)]
+
+        assert statuses == [200] * 5 + [429]
+
+    def test_anonymous_requests_are_throttled_per_client(self):
+        client = APIClient()
+        url = reverse("rest_login")
+        data = {"email": "nobody@mail.com", "password": "wrong"}
+        statuses = [client.post(url, data).status_code for _ in range(3)]
+
+        assert statuses == [400, 400, 429]
+
+    def test_write_scope_has_its_own_bucket(self, throttle_redis):
+        client = make_client(email="customer@mail.com")
+        user = User.objects.get(email="customer@mail.com")
+        url = reverse("api:virtualmachine-backup", kwargs={"pk": "missing"})
+
+        assert client.post(url).status_code == 404
+        assert client.post(url).status_code == 429
+        # reads only draw from the user bucket, which still has a token
+        assert client.get(self.url).status_code == 200
+        assert throttle_redis.exists(f"throttle:backup:{user.pk}")
+
+    def test_denied_request_does_not_drain_other_buckets(self, throttle_redis):
+        client = make_client(email="customer@mail.com")
+        url = reverse("api:virtualmachine-backup", kwargs={"pk": "missing"})
+        for _ in range(3):
+            client.post(url)
+
+        # the first post spent a user token, the rejected ones did not
+        assert client.get(self.url).status_code == 200
+        assert client.get(self.url).status_code == 200
+        assert client.get(self.url).status_code == 429
+
+    def test_requests_allowed_when_redis_is_down(self, monkeypatch):
+        def unavailable(**kwargs):
+            raise redis.ConnectionError
+
+        monkeypatch.setattr(throttles, "get_token_bucket", lambda: unavailable)
+        client = make_client(email="customer@mail.com")
+        statuses = [client.get(self.url).status_code for _ in range(5)]
+
+        assert statuses == [200] * 5
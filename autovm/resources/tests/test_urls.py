@@ -124,6 +124,7 @@ def authenticated_customer_client(db):
 
 
 @pytest.mark.django_db
+@pytest.mark.usefixtures("query_budgets")
 class TestVirtualMachineEndpoints:
     """
     Test the virtual machine endpoints
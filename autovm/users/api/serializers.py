@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
+from autovm.users.mail import queue_email
 from autovm.users.models import User, Customer, Guest
 from autovm.billing.models import BillingAccount
 from autovm.billing.api.serializers import RatePlanSerializer
@@ -9,6 +11,29 @@ from dj_rest_auth.registration.serializers import RegisterSerializer
 UserModel = get_user_model()
 
 
+def save_with_billing_account(user):
+    """
+    Insert a new user together with their profile and billing account.
+    Both inserts skip the existence check and run in the surrounding
+    transaction instead of a savepoint.
+    """
+    with transaction.atomic(savepoint=False):
+        user.save()
+        ensure_billing_account(user)
+    return user
+
+
+def ensure_billing_account(user):
+    """
+    Give a user a billing account unless they have one, in a single
+    INSERT ... ON CONFLICT DO NOTHING.
+    """
+    BillingAccount.objects.bulk_create(
+        [BillingAccount(user=user)],
+        ignore_conflicts=True,
+    )
+
+
 class UserSerializer(serializers.ModelSerializer[User]):
     """
     user serializer
@@ -135,10 +160,24 @@ class CustomerUserSerializer(serializers.ModelSerializer[User]):
         """
         return obj.user.id
 
+    def get_billing_account(self, obj):
+        """
+        Billing account of the customer, created if it is missing.
+        """
+        try:
+            return obj.user.billingaccount
+        except BillingAccount.DoesNotExist:
+            billing_account, created = BillingAccount.objects.get_or_create(
+                user=obj.user,
+            )
+            return billing_account
+
     def get_guests(self, obj):
         """
         Get the number of guests for this user.
         """
+        if hasattr(obj, "guest_count"):
+            return obj.guest_count
         return Guest.objects.filter(customer=obj.user.customer_profile).count()
 
     def get_created(self, obj):
@@ -157,19 +196,23 @@ class CustomerUserSerializer(serializers.ModelSerializer[User]):
         """
         Get the account balance of the customer.
         """
-        billing_account = 0
-
-        billing_account, created = BillingAccount.objects.get_or_create(user=obj.user)
-
-        return billing_account.amount
+        return self.get_billing_account(obj).amount
 
     def get_current_plan(self, obj):
         """
         Get the current plan of the customer.
         """
-        billing_account, created = BillingAccount.objects.get_or_create(user=obj.user)
-        # get the subscription
-        subscription = billing_account.subscription_set.filter(status="active").first()
+        billing_account = self.get_billing_account(obj)
+        # get the subscription, prefetched by CustomerViewset
+        subscriptions = getattr(billing_account, "active_subscriptions", None)
+        if subscriptions is None:
+            subscription = (
+                billing_account.subscription_set.filter(status="active")
+                .select_related("plan")
+                .first()
+            )
+        else:
+            subscription = subscriptions[0] if subscriptions else None
         if subscription:
             # serialize the plan
             return RatePlanSerializer(subscription.plan).data
@@ -239,16 +282,16 @@ class GuestRegistrationSerializer(serializers.Serializer):
         new_user.set_password(password)
         new_user.save()
 
-        new_user.guest_profile.customer = customer
-        new_user.guest_profile.save()
+        Guest.objects.filter(user=new_user).update(customer=customer)
 
         # send the password and confirmation email to the user
         message = f"Dear {new_user.name}, \n Your VMControlHub guest account has been created. Your details are as below: \n Login email {new_user.email} \n\n is: {password}"
-        # send a confirmation email to the user
-        new_user.email_user(
+        # queue a confirmation email for the user, sent once the guest is committed
+        queue_email(
             "VMControl Manager Account Creation",
             message,
             "VMControl Manager <no-reply@example.com>",
+            [new_user.email],
         )
 
         return new_user
@@ -308,5 +351,4 @@ class RegistrationSerializer(serializers.ModelSerializer[User]):
 
         user.set_password(validated_data["password"])
 
-        user.save()
-        return user
+        return save_with_billing_account(user)
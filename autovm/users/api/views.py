@@ -1,3 +1,5 @@
+from django.db.models import Count
+from django.db.models import Prefetch
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
@@ -12,8 +14,8 @@ from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.tokens import AccessToken
 
+from autovm.billing.models import Subscription
 from autovm.users.models import Customer, GeneralAdmin, Guest, User
-from autovm.billing.models import BillingAccount
 from autovm.resources.tasks import notify_suspended_user
 
 from .serializers import (
@@ -25,6 +27,7 @@ from .serializers import (
     UserSerializer,
     CustomerSusensionSerializer,
     RegistrationSerializer,
+    ensure_billing_account,
 )
 
 
@@ -73,6 +76,27 @@ class CustomerViewset(viewsets.ModelViewSet):
     filter_backends = [SearchFilter, DjangoFilterBackend]
     search_fields = ["user__name", "user__email"]
     filterset_fields = ["suspended"]
+    query_budgets = {"list": 2, "retrieve": 2}
+
+    def get_queryset(self):
+        """
+        Load what CustomerUserSerializer shows with the customers.
+        """
+        return (
+            super()
+            .get_queryset()
+            .select_related("user__billingaccount")
+            .annotate(guest_count=Count("guests"))
+            .prefetch_related(
+                Prefetch(
+                    "user__billingaccount__subscription_set",
+                    queryset=Subscription.objects.filter(
+                        status="active",
+                    ).select_related("plan"),
+                    to_attr="active_subscriptions",
+                ),
+            )
+        )
 
     @action(detail=False, methods=["get"], name="Statistics")
     def statistics(self, request, pk=None):
@@ -234,17 +258,14 @@ class GoogleSocialLoginViewSet(ModelViewSet):
         name = request.data.get("name")
 
         try:
-            user, created = User.objects.get_or_create(email=email)
-            BillingAccount.objects.get_or_create(
-                user=user
-            )  # move this to under created
+            user, created = User.objects.get_or_create(
+                email=email,
+                defaults={"name": name, "is_active": True},
+            )
             if created:
-                user.name = name
-                user.is_active = True
                 user.set_unusable_password()
-                user.save()
-                # only customers have billing accounts.
-                # guest accounts are already created with their email accounts
+                user.save(update_fields=["password"])
+            ensure_billing_account(user)
 
             serializer = CustomUserSerializer(user, context={"request": request})
 
@@ -332,8 +353,6 @@ class RegistrationView(APIView):
 
             token = AccessToken.for_user(user)
             refresh = RefreshToken.for_user(user)
-            # create a billing account during registration
-            BillingAccount.objects.get_or_create(user=user)
 
             user_serializer = CustomUserSerializer(user, context={"request": request})
 
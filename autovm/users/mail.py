@@ -0,0 +1,57 @@
+import json
+import logging
+from functools import partial
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from autovm.users import tasks
+
+logger = logging.getLogger(__name__)
+
+
+def _enqueue(email: dict):
+    """
+    Push a committed email onto the mail queue and make sure a
+    send_queued_emails run is pending.
+    """
+    try:
+        client = tasks.get_redis()
+        client.rpush(tasks.MAIL_QUEUE, json.dumps(email))
+        # the first email of a batch schedules the run, later ones join it
+        pending = client.set(
+            tasks.MAIL_FLUSH_PENDING,
+            1,
+            nx=True,
+            ex=settings.MAIL_BATCH_DELAY + 60,
+        )
+    except redis.RedisError:
+        logger.exception("Could not queue an email, sending it on its own")
+        tasks.send_email_batch.delay([email])
+        return
+    if pending:
+        tasks.send_queued_emails.apply_async(countdown=settings.MAIL_BATCH_DELAY)
+
+
+def queue_email(
+    subject: str,
+    message: str,
+    from_email: str | None,
+    recipient_list: list[str],
+):
+    """
+    Queue an email for the mail worker instead of sending it inline.
+
+    The email joins the mail queue once the current transaction commits and
+    is dropped if it, or the savepoint it was queued in, rolls back. The
+    worker sends the emails queued within MAIL_BATCH_DELAY seconds of each
+    other, by any request, over a single SMTP connection.
+    """
+    email = {
+        "subject": subject,
+        "body": message,
+        "from_email": from_email,
+        "to": recipient_list,
+    }
+    transaction.on_commit(partial(_enqueue, email))
@@ -1,5 +1,7 @@
 import random
+import time
 from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
 from django.conf import settings
 
 from autovm.users.models import User
@@ -13,6 +15,9 @@ from autovm.resources.models import VirtualMachine
 from autovm.resources.models import VirtualMachineHistory
 
 from autovm.billing.utils.payment_client import PaymentClient
+from autovm.resources.seeding import SEED_DOMAIN
+from autovm.resources.seeding import BulkSeeder
+from autovm.resources.seeding import Volumes
 
 
 class Command(BaseCommand):
@@ -22,10 +27,60 @@ class Command(BaseCommand):
 
     help = "Initialize data for local development"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=0,
+            help="Number of customers to seed",
+        )
+        parser.add_argument(
+            "--vms",
+            type=int,
+            default=0,
+            help="Number of machines to seed",
+        )
+        parser.add_argument(
+            "--history",
+            type=int,
+            default=0,
+            help="Number of machine history entries to seed",
+        )
+        parser.add_argument(
+            "--transactions",
+            type=int,
+            default=0,
+            help="Number of transactions to seed",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed, the same seed always produces the same data",
+        )
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
     def handle(self, *args, **kwargs):
         """
-        This will create 5 instances of each model
+        This will create 5 instances of each model, then seed the requested
+        volumes of rows in bulk
         """
+        volumes = Volumes(
+            users=kwargs["users"],
+            machines=kwargs["vms"],
+            history=kwargs["history"],
+            transactions=kwargs["transactions"],
+        )
+        if not volumes.users and (volumes.machines or volumes.transactions):
+            msg = "--vms and --transactions need --users to own them"
+            raise CommandError(msg)
+        if not volumes.machines and volumes.history:
+            msg = "--history needs --vms to describe"
+            raise CommandError(msg)
+        seeded = User.objects.filter(email__endswith=f"@{SEED_DOMAIN}")
+        if volumes.users and seeded.exists():
+            msg = "The database is already seeded, flush it to seed it again"
+            raise CommandError(msg)
 
         # create RatePlan 4
         bronze, created = RatePlan.objects.get_or_create(
@@ -91,6 +146,7 @@ class Command(BaseCommand):
                 operating_system_version=os_version,
                 region=region,
                 user=new_customer,
+                state="running",
             )
 
             # create historical data for each vm
@@ -125,3 +181,19 @@ class Command(BaseCommand):
                     f"Admin user '{settings.ADMIN_USERNAME}' already exists"
                 )
             )
+
+        if volumes.users:
+            self.stdout.write(f"Seeding {volumes}")
+            started = time.perf_counter()
+            BulkSeeder(
+                seed=kwargs["seed"],
+                batch_size=kwargs["batch_size"],
+                log=self.stdout.write,
+            ).seed(volumes)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Seeded in {time.perf_counter() - started:.1f}s, "
+                    f"users can sign in as user0000000@{SEED_DOMAIN} with "
+                    "the password 'password'",
+                ),
+            )
@@ -2,7 +2,6 @@ import string
 import secrets
 from typing import TYPE_CHECKING
 
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import UserManager as DjangoUserManager
 
 if TYPE_CHECKING:
@@ -21,7 +20,7 @@ class UserManager(DjangoUserManager["User"]):
             raise ValueError(msg)
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.password = make_password(password)
+        user.set_password(password)
         user.save(using=self._db)
         return user
 
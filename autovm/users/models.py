@@ -1,6 +1,8 @@
 from typing import ClassVar
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
@@ -30,6 +32,16 @@ class User(AbstractUser):
 
     objects: ClassVar[UserManager] = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        """
+        Trigram indexes serve the name and email searches of the API
+        """
+
+        indexes = [
+            GinIndex(OpClass("name", name="gin_trgm_ops"), name="user_name_trgm_gin"),
+            GinIndex(OpClass("email", name="gin_trgm_ops"), name="user_email_trgm_gin"),
+        ]
+
     def get_absolute_url(self) -> str:
         """Get URL for user's detail view.
 
@@ -42,19 +54,54 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the stored role so that saves only provision a profile
+        when the role actually changes, and the stored name so that only
+        renames refresh the search vector of the user's machines. Together
+        with the email they are nested in the payloads of those machines.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._stored_role = instance.__dict__.get("role")
+        instance._stored_name = instance.__dict__.get("name")
+        instance._stored_email = instance.__dict__.get("email")
+        return instance
+
     def save(self, *args, **kwargs):
         """
         Save user and create profile if it doesn't exist.
         All users are customers if their role is not specified.
+
+        The profile is only provisioned on insert or when the role changes,
+        so routine saves such as ``last_login`` updates cost a single query.
         """
+        role_changed = self.__dict__.get("role") != getattr(self, "_stored_role", None)
+        provision = self._state.adding or role_changed
         super().save(*args, **kwargs)
+        if provision:
+            self.provision_profile()
+        self._stored_role = self.__dict__.get("role")
+        self._stored_name = self.__dict__.get("name")
+        self._stored_email = self.__dict__.get("email")
+
+    def provision_profile(self):
+        """
+        Create the profile matching the user's role if it doesn't exist.
+        Uses a single ``INSERT ... ON CONFLICT DO NOTHING`` instead of a
+        ``get_or_create`` round trip.
+        """
         if self.role == "admin":
-            GeneralAdmin.objects.get_or_create(user=self)
+            profile_model = GeneralAdmin
         elif self.role == "guest":
-            Guest.objects.get_or_create(user=self)
+            profile_model = Guest
         else:
             # register as a customer by default
-            Customer.objects.get_or_create(user=self)
+            profile_model = Customer
+        profile_model.objects.bulk_create(
+            [profile_model(user=self)],
+            ignore_conflicts=True,
+        )
 
 
 class ProfileBase(models.Model):
@@ -1,9 +1,70 @@
+import functools
+import json
+import smtplib
+
+import redis
 from celery import shared_task
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail import get_connection
 
 from .models import User
 
+# Redis list queue_email pushes committed emails onto
+MAIL_QUEUE = "mail:queue"
+# Set while a send_queued_emails run is pending
+MAIL_FLUSH_PENDING = "mail:flush-pending"
+# Held by the send_queued_emails run sending the queue, for at most
+# MAIL_SENDING_TIMEOUT seconds
+MAIL_SENDING = "mail:sending"
+MAIL_SENDING_TIMEOUT = 10 * 60
+
+
+@functools.cache
+def get_redis():
+    return redis.Redis.from_url(settings.MAIL_QUEUE_REDIS_URL)
+
 
 @shared_task()
 def get_users_count():
     """A pointless Celery task to demonstrate usage."""
     return User.objects.count()
+
+
+@shared_task()
+def send_email_batch(emails: list[dict]):
+    """
+    Send a batch of queued emails over a single mail connection.
+    """
+    messages = [EmailMessage(**email) for email in emails]
+    with get_connection() as connection:
+        return connection.send_messages(messages)
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(smtplib.SMTPException, OSError),
+    retry_backoff=True,
+    max_retries=10,
+)
+def send_queued_emails(self):
+    """
+    Send the emails waiting on the mail queue, MAIL_BATCH_SIZE at a time
+    over a single mail connection each. A batch leaves the queue once it is
+    sent, so a failed one is sent again when the task is retried.
+    """
+    client = get_redis()
+    # emails queued from here on schedule the next run
+    client.delete(MAIL_FLUSH_PENDING)
+    lock = client.lock(MAIL_SENDING, timeout=MAIL_SENDING_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        # another run is sending, it may be past the emails queued since
+        raise self.retry(countdown=settings.MAIL_BATCH_DELAY)
+    sent = 0
+    try:
+        while emails := client.lrange(MAIL_QUEUE, 0, settings.MAIL_BATCH_SIZE - 1):
+            sent += send_email_batch([json.loads(email) for email in emails])
+            client.ltrim(MAIL_QUEUE, len(emails), -1)
+    finally:
+        lock.release()
+    return sent
@@ -1,7 +1,16 @@
+from http import HTTPStatus
+
 import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
 from rest_framework.test import APIRequestFactory
 
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
 from autovm.users.api.views import UserViewSet
+from autovm.users.models import Customer
+from autovm.users.models import Guest
 from autovm.users.models import User
 
 
@@ -37,3 +46,125 @@ class TestUserViewSet:
             "username": user.username,
             "role": user.role,
         }
+
+
+@pytest.mark.django_db
+class TestRegistrationView:
+    def test_register_creates_profile_and_billing_account(
+        self,
+        django_assert_max_num_queries,
+    ):
+        client = APIClient()
+        # email check, user, profile and billing account inserts, plus the
+        # ATOMIC_REQUESTS savepoint pair inside the test transaction
+        with django_assert_max_num_queries(6):
+            response = client.post(
+                reverse("custom_register"),
+                data={
+                    "name": "new customer",
+                    "email": "new-customer@example.com",
+                    "password": "something-r@nd0m!",
+                },
+                format="json",
+            )
+
+        assert response.status_code == HTTPStatus.OK
+        user = User.objects.get(email="new-customer@example.com")
+        assert Customer.objects.filter(user=user).exists()
+        assert BillingAccount.objects.filter(user=user).exists()
+
+
+@pytest.mark.django_db
+class TestGoogleSocialLoginView:
+    def sign_in(self, email):
+        return APIClient().post(
+            reverse("api:google-auth-list"),
+            data={"name": "google customer", "email": email},
+            format="json",
+        )
+
+    def test_first_sign_in_creates_the_customer(self):
+        response = self.sign_in("google@example.com")
+
+        assert response.status_code == HTTPStatus.OK
+        user = User.objects.get(email="google@example.com")
+        assert user.name == "google customer"
+        assert not user.has_usable_password()
+        assert BillingAccount.objects.filter(user=user).exists()
+
+    def test_existing_users_are_signed_in(self, user: User):
+        assert self.sign_in(user.email).status_code == HTTPStatus.OK
+        assert self.sign_in(user.email).status_code == HTTPStatus.OK
+
+        assert User.objects.filter(email=user.email).count() == 1
+        assert BillingAccount.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db
+class TestGuestRegistrationView:
+    def test_guest_email_is_queued_until_commit(
+        self,
+        user: User,
+        settings,
+        mailoutbox,
+        django_capture_on_commit_callbacks,
+    ):
+        settings.CELERY_TASK_ALWAYS_EAGER = True
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                reverse("guest-registration"),
+                data={"name": "new guest", "email": "new-guest@example.com"},
+                format="json",
+            )
+            assert mailoutbox == []
+
+        assert response.status_code == HTTPStatus.OK
+        guest = User.objects.get(email="new-guest@example.com").guest_profile
+        assert guest.customer.user == user
+        assert [message.to for message in mailoutbox] == [["new-guest@example.com"]]
+
+
+@pytest.mark.django_db
+class TestCustomerViewset:
+    def create_customer(self, number, plan):
+        user = User.objects.create_user(
+            email=f"customer{number}@example.com",
+            password="password",
+        )
+        account, _ = BillingAccount.objects.get_or_create(user=user)
+        Subscription.objects.create(account=account, plan=plan)
+        guest = User.objects.create_user(
+            email=f"guest{number}@example.com",
+            password="password",
+            role="guest",
+        )
+        Guest.objects.filter(user=guest).update(
+            customer=Customer.objects.get(user=user),
+        )
+
+    def test_list_queries_do_not_grow_with_the_page(self, query_budgets):
+        admin = User.objects.create_user(
+            email="admin@example.com",
+            password="password",
+            role="admin",
+        )
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        plan = RatePlan.objects.create(plan="gold", price=800)
+
+        self.create_customer(1, plan)
+        client.get(reverse("api:customer-list"))
+        for number in range(2, 6):
+            self.create_customer(number, plan)
+        response = client.get(reverse("api:customer-list"))
+
+        customers = {
+            customer["email"]: customer for customer in response.json()["results"]
+        }
+        assert len(customers) == 5
+        assert customers["customer1@example.com"]["guests"] == 1
+        assert customers["customer1@example.com"]["current_plan"]["plan"] == "gold"
+        assert query_budgets[0].queries == query_budgets[1].queries
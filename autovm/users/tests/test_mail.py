@@ -0,0 +1,54 @@
+import pytest
+from django.db import transaction
+
+from autovm.users.mail import queue_email
+from autovm.users.tasks import MAIL_FLUSH_PENDING
+from autovm.users.tasks import MAIL_QUEUE
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.usefixtures("_eager_celery")
+def test_queued_emails_are_sent_on_commit(
+    mailoutbox,
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        queue_email("First", "body", None, ["first@example.com"])
+        queue_email("Second", "body", None, ["second@example.com"])
+        assert mailoutbox == []
+
+    assert [message.subject for message in mailoutbox] == ["First", "Second"]
+
+
+@pytest.mark.usefixtures("_eager_celery")
+def test_queued_emails_are_dropped_on_rollback(
+    mailoutbox,
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        try:
+            with transaction.atomic():
+                queue_email("Rolled back", "body", None, ["guest@example.com"])
+                raise RuntimeError  # noqa: TRY301
+        except RuntimeError:
+            pass
+        queue_email("Committed", "body", None, ["guest@example.com"])
+
+    assert [message.subject for message in mailoutbox] == ["Committed"]
+
+
+@pytest.mark.usefixtures("_eager_celery")
+def test_emails_of_separate_transactions_join_the_pending_run(
+    mailoutbox,
+    mail_redis,
+    django_capture_on_commit_callbacks,
+):
+    mail_redis.set(MAIL_FLUSH_PENDING, 1)
+
+    for subject in ["First", "Second"]:
+        with django_capture_on_commit_callbacks(execute=True):
+            queue_email(subject, "body", None, ["guest@example.com"])
+
+    assert mailoutbox == []
+    assert mail_redis.llen(MAIL_QUEUE) == 2
@@ -1,5 +1,28 @@
+from autovm.users.models import Customer
+from autovm.users.models import GeneralAdmin
 from autovm.users.models import User
 
 
 def test_user_get_absolute_url(user: User):
     assert user.get_absolute_url() == f"/users/{user.pk}/"
+
+
+def test_user_profile_created_on_insert(user: User):
+    assert Customer.objects.filter(user=user).exists()
+
+
+def test_user_update_skips_profile_provisioning(
+    user: User,
+    django_assert_num_queries,
+):
+    user = User.objects.get(pk=user.pk)
+    user.is_staff = True
+    with django_assert_num_queries(1):
+        user.save()
+
+
+def test_user_role_change_provisions_profile(user: User):
+    user = User.objects.get(pk=user.pk)
+    user.role = "admin"
+    user.save()
+    assert GeneralAdmin.objects.filter(user=user).exists()
@@ -1,8 +1,27 @@
+import gzip
 from http import HTTPStatus
 
 import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
 from django.urls import reverse
 
+from autovm.resources.api.schema import build_schema
+
+
+@pytest.fixture(scope="module")
+def schema_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("openapi")
+    with override_settings(API_SCHEMA_DIR=str(directory)):
+        build_schema()
+    return directory
+
+
+@pytest.fixture
+def built_schema(settings, schema_dir):
+    settings.API_SCHEMA_DIR = str(schema_dir)
+    return schema_dir
+
 
 def test_swagger_accessible_by_admin(admin_client):
     url = reverse("api-docs")
@@ -17,7 +36,52 @@ def test_swagger_ui_not_accessible_by_normal_user(client):
     assert response.status_code == HTTPStatus.FORBIDDEN
 
 
-def test_api_schema_generated_successfully(admin_client):
+def test_api_schema_generated_successfully(admin_client, built_schema):
     url = reverse("api-schema")
     response = admin_client.get(url)
     assert response.status_code == HTTPStatus.OK
+    assert response.content == (built_schema / "openapi.yaml").read_bytes()
+
+
+def test_api_schema_formats(admin_client, built_schema):
+    response = admin_client.get(
+        reverse("api-schema"),
+        headers={"Accept": "application/vnd.oai.openapi+json"},
+    )
+
+    assert response["Content-Type"] == "application/vnd.oai.openapi+json"
+    assert response.json()["info"]["title"] == "Virtual Machine Control API"
+
+
+def test_api_schema_is_conditional(admin_client, built_schema):
+    url = reverse("api-schema")
+    etag = admin_client.get(url)["ETag"]
+
+    response = admin_client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_api_schema_is_precompressed(admin_client, built_schema):
+    response = admin_client.get(
+        reverse("api-schema"),
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    assert response["Content-Encoding"] == "gzip"
+    assert response.content == (built_schema / "openapi.yaml.gz").read_bytes()
+    assert (
+        gzip.decompress(response.content)
+        == (built_schema / "openapi.yaml").read_bytes()
+    )
+
+
+def test_api_schema_not_built(admin_client, settings, tmp_path):
+    settings.API_SCHEMA_DIR = str(tmp_path)
+    url = reverse("api-schema")
+
+    with pytest.raises(ImproperlyConfigured):
+        admin_client.get(url)
+
+    settings.DEBUG = True
+    assert admin_client.get(url).status_code == HTTPStatus.OK
@@ -1,7 +1,16 @@
+import json
+import smtplib
+from unittest.mock import patch
+
 import pytest
 from celery.result import EagerResult
+from django.core.mail import get_connection
 
+from autovm.users.tasks import MAIL_FLUSH_PENDING
+from autovm.users.tasks import MAIL_QUEUE
 from autovm.users.tasks import get_users_count
+from autovm.users.tasks import send_email_batch
+from autovm.users.tasks import send_queued_emails
 from autovm.users.tests.factories import UserFactory
 
 pytestmark = pytest.mark.django_db
@@ -15,3 +24,67 @@ def test_user_count(settings):
     task_result = get_users_count.delay()
     assert isinstance(task_result, EagerResult)
     assert task_result.result == batch_size
+
+
+def test_send_email_batch_uses_one_connection(settings, mailoutbox):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    emails = [
+        {
+            "subject": "Welcome",
+            "body": f"Hello guest{i}",
+            "from_email": "no-reply@example.com",
+            "to": [f"guest{i}@example.com"],
+        }
+        for i in range(3)
+    ]
+
+    with patch("autovm.users.tasks.get_connection", wraps=get_connection) as conn:
+        task_result = send_email_batch.delay(emails)
+
+    assert task_result.result == len(emails)
+    assert conn.call_count == 1
+    assert [message.to for message in mailoutbox] == [email["to"] for email in emails]
+
+
+def test_send_queued_emails_in_batches(settings, mailoutbox, mail_redis):
+    settings.MAIL_BATCH_SIZE = 2
+    mail_redis.set(MAIL_FLUSH_PENDING, 1)
+    for i in range(3):
+        mail_redis.rpush(
+            MAIL_QUEUE,
+            json.dumps({"subject": "Welcome", "to": [f"guest{i}@example.com"]}),
+        )
+
+    with patch("autovm.users.tasks.get_connection", wraps=get_connection) as conn:
+        assert send_queued_emails() == 3
+
+    assert conn.call_count == 2
+    assert len(mailoutbox) == 3
+    assert not mail_redis.exists(MAIL_QUEUE, MAIL_FLUSH_PENDING)
+
+
+def test_failed_batches_stay_queued_until_sent(settings, mailoutbox, mail_redis):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    for i in range(2):
+        mail_redis.rpush(
+            MAIL_QUEUE,
+            json.dumps({"subject": "Welcome", "to": [f"guest{i}@example.com"]}),
+        )
+    attempts = []
+
+    def flaky_connection(*args, **kwargs):
+        attempts.append(1)
+        if len(attempts) == 1:
+            msg = "Service not available"
+            raise smtplib.SMTPServerDisconnected(msg)
+        return get_connection(*args, **kwargs)
+
+    with patch("autovm.users.tasks.get_connection", flaky_connection):
+        send_queued_emails.delay()
+
+    assert len(attempts) == 2
+    assert [message.to for message in mailoutbox] == [
+        ["guest0@example.com"],
+        ["guest1@example.com"],
+    ]
+    assert not mail_redis.exists(MAIL_QUEUE)
@@ -0,0 +1,103 @@
+"""
+Benchmarks of the API hot paths against seeded production volumes, see
+"Benchmarking the API hot paths" in the README.
+"""
+
+import pytest
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from autovm.billing.models import BillingAccount
+from autovm.billing.models import RatePlan
+from autovm.billing.models import Subscription
+from autovm.resources.api.throttles import TokenBucketThrottle
+from autovm.resources.seeding import SEED_DOMAIN
+from autovm.resources.seeding import BulkSeeder
+from autovm.resources.seeding import Volumes
+from autovm.users.models import User
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--seed-scale",
+        type=float,
+        default=1.0,
+        help="Fraction of the production volumes to seed, 1 seeds 10k users, "
+        "100k machines, 1M history entries and 100k transactions",
+    )
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):  # noqa: PT004
+    """
+    Seed a database of its own, so that with --reuse-db the seeded rows are
+    kept across runs without showing up in the functional tests.
+    """
+    database = settings.DATABASES["default"]
+    database.setdefault("TEST", {})
+    database["TEST"]["NAME"] = f"test_{database['NAME']}_benchmarks"
+
+
+@pytest.fixture(scope="session")
+def seeded(request, django_db_setup, django_db_blocker):
+    volumes = Volumes().scale(request.config.getoption("--seed-scale"))
+    with django_db_blocker.unblock():
+        seeded_users = User.objects.filter(email__endswith=f"@{SEED_DOMAIN}").count()
+        if not seeded_users:
+            BulkSeeder().seed(volumes)
+        elif seeded_users != volumes.users:
+            msg = (
+                f"The database was seeded with {seeded_users} users, "
+                "run with --create-db to seed it again"
+            )
+            raise pytest.UsageError(msg)
+    return volumes
+
+
+@pytest.fixture(autouse=True)
+def _unthrottled(monkeypatch):
+    monkeypatch.setattr(TokenBucketThrottle, "allow_request", lambda *args: True)
+
+
+@pytest.fixture
+def admin(seeded, db):
+    return User.objects.create_user(
+        email="benchmark-admin@mail.com",
+        password="password",  # noqa: S106
+        role="admin",
+    )
+
+
+@pytest.fixture
+def customer(seeded, db):
+    """
+    A seeded customer, on a plan that lets benchmarks create as many
+    machines and backups as they need and with the funds to subscribe.
+    """
+    user = User.objects.filter(
+        email__endswith=f"@{SEED_DOMAIN}",
+        virtual_machines__isnull=False,
+    ).first()
+    plan = RatePlan.objects.create(
+        plan="platinum",
+        price=1,
+        vm_limit=1_000_000,
+        backup_limit=1_000_000,
+    )
+    BillingAccount.objects.filter(user=user).update(amount=10_000_000)
+    Subscription.objects.filter(account__user=user).update(plan=plan)
+    return user
+
+
+@pytest.fixture
+def admin_client(admin):
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    return client
+
+
+@pytest.fixture
+def customer_client(customer):
+    client = APIClient()
+    client.force_authenticate(user=customer)
+    return client
@@ -0,0 +1,99 @@
+from itertools import cycle
+
+import pytest
+from django.urls import reverse
+
+from autovm.billing.models import Subscription
+from autovm.resources.models import OperatingSystemVersion
+from autovm.resources.models import Region
+from autovm.resources.models import VirtualMachine
+from autovm.resources.seeding import SEED_DOMAIN
+from autovm.users.models import User
+
+pytest.importorskip("pytest_benchmark")
+
+# writes run a fixed number of rounds so they add a bounded number of rows,
+# rolled back after each benchmark
+WRITE_ROUNDS = 50
+
+
+def ok(response, status=200):
+    assert response.status_code == status, response.content
+    return response
+
+
+@pytest.mark.django_db
+class TestVirtualMachineBenchmarks:
+    def test_list_all(self, benchmark, admin_client):
+        url = reverse("api:virtualmachine-list")
+        ok(benchmark(admin_client.get, url))
+
+    def test_list_own(self, benchmark, customer_client):
+        url = reverse("api:virtualmachine-list")
+        response = ok(benchmark(customer_client.get, url))
+        assert response.json()["results"]
+
+    def test_search(self, benchmark, admin_client):
+        url = reverse("api:virtualmachine-list")
+        ok(benchmark(admin_client.get, url, {"search": "ubuntu west"}))
+
+    def test_detail(self, benchmark, customer_client, customer):
+        machine = VirtualMachine.objects.filter(user=customer).first()
+        url = reverse("api:virtualmachine-detail", args=[machine.pk])
+        ok(benchmark(customer_client.get, url))
+
+    def test_statistics(self, benchmark, admin_client):
+        url = reverse("api:virtualmachine-statistics")
+        ok(benchmark(admin_client.get, url))
+
+    def test_create(self, benchmark, customer_client):
+        data = {
+            "description": "benchmark machine",
+            "region": str(Region.objects.first().pk),
+            "disk_size": "200",
+            "operating_system_version": str(OperatingSystemVersion.objects.first().pk),
+        }
+        url = reverse("api:virtualmachine-list")
+
+        def create():
+            return ok(customer_client.post(url, data, format="json"), 201)
+
+        benchmark.pedantic(create, rounds=WRITE_ROUNDS, warmup_rounds=1)
+
+    def test_assign(self, benchmark, admin_client, customer):
+        # the machine moves back and forth between two seeded customers
+        other = User.objects.filter(email__endswith=f"@{SEED_DOMAIN}").last()
+        Subscription.objects.filter(account__user=other).update(
+            plan=Subscription.objects.get(account__user=customer).plan,
+        )
+        machine = VirtualMachine.objects.filter(user=customer).first()
+        url = reverse("api:virtualmachine-assign", args=[machine.pk])
+        users = cycle([other, customer])
+
+        def assign():
+            data = {"user_id": next(users).pk}
+            return ok(admin_client.post(url, data, format="json"))
+
+        benchmark.pedantic(assign, rounds=WRITE_ROUNDS, warmup_rounds=1)
+
+    def test_backup(self, benchmark, customer_client, customer):
+        machine = VirtualMachine.objects.filter(user=customer).first()
+        url = reverse("api:virtualmachine-backup", args=[machine.pk])
+
+        def backup():
+            return ok(customer_client.post(url), 202)
+
+        benchmark.pedantic(backup, rounds=WRITE_ROUNDS, warmup_rounds=1)
+
+
+@pytest.mark.django_db
+class TestBillingBenchmarks:
+    def test_subscribe(self, benchmark, customer_client, customer):
+        plan = Subscription.objects.get(account__user=customer).plan
+        url = reverse("api:subscription-list")
+
+        def subscribe():
+            data = {"plan": str(plan.pk)}
+            return ok(customer_client.post(url, data, format="json"), 201)
+
+        benchmark.pedantic(subscribe, rounds=WRITE_ROUNDS, warmup_rounds=1)
@@ -12,13 +12,23 @@ from autovm.users.api.views import (
 
 from autovm.resources.api.views import (
     RegionViewSet,
+    HostViewSet,
     OperatingSystemVersionViewSet,
     VirtualMachineViewSet,
     VirtualMachineHistoryViewSet,
     BackupViewSet,
     NotificationViewSet,
+    JobViewSet,
 )
 
+from autovm.resources.api.async_views import (
+    AsyncNotificationListView,
+    AsyncVirtualMachineDetailView,
+    AsyncVirtualMachineListView,
+    AsyncVirtualMachineStatisticsView,
+)
+
+from autovm.billing.api.async_views import AsyncBalanceView
 from autovm.billing.api.views import (
     RatePlanViewSet,
     SubscriptionViewSet,
@@ -37,11 +47,13 @@ router.register("google-auth", GoogleSocialLoginViewSet, basename="google-auth")
 
 # resources
 router.register("regions", RegionViewSet)
+router.register("hosts", HostViewSet)
 router.register("os-versions", OperatingSystemVersionViewSet)
 router.register("virtual-machines", VirtualMachineViewSet)
 router.register("vm-history", VirtualMachineHistoryViewSet)
 router.register("backups", BackupViewSet)
 router.register("notifications", NotificationViewSet)
+router.register("jobs", JobViewSet)
 
 # billing
 router.register("rate-plans", RatePlanViewSet)
@@ -51,3 +63,32 @@ router.register("billing-accounts", BillingAccountViewSet)
 
 app_name = "api"
 urlpatterns = router.urls
+
+# async-native variants of the hot read endpoints
+urlpatterns += [
+    path(
+        "async/virtual-machines/",
+        AsyncVirtualMachineListView.as_view(),
+        name="async-virtualmachine-list",
+    ),
+    path(
+        "async/virtual-machines/statistics/",
+        AsyncVirtualMachineStatisticsView.as_view(),
+        name="async-virtualmachine-statistics",
+    ),
+    path(
+        "async/virtual-machines/<uuid:pk>/",
+        AsyncVirtualMachineDetailView.as_view(),
+        name="async-virtualmachine-detail",
+    ),
+    path(
+        "async/notifications/",
+        AsyncNotificationListView.as_view(),
+        name="async-notification-list",
+    ),
+    path(
+        "async/billing-accounts/balance/",
+        AsyncBalanceView.as_view(),
+        name="async-billingaccount-balance",
+    ),
+]
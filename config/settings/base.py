@@ -69,6 +69,7 @@ DJANGO_APPS = [
     "django.contrib.staticfiles",
     # "django.contrib.humanize", # Handy template tags
     "django.contrib.admin",
+    "django.contrib.postgres",
     "django.forms",
 ]
 THIRD_PARTY_APPS = [
@@ -139,7 +140,10 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "autovm.middleware.instrumentation.RequestMetricsMiddleware",
+    "autovm.middleware.budgets.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "autovm.middleware.compression.APICompressionMiddleware",
     "autovm.middleware.corsmiddleware.CorsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -174,6 +178,62 @@ MEDIA_ROOT = str(APPS_DIR / "media")
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "/media/"
 
+# HYPERVISORS
+# ------------------------------------------------------------------------------
+# Driver carrying out operations on machines, see autovm.resources.drivers
+HYPERVISOR_DRIVER = {
+    "BACKEND": env(
+        "HYPERVISOR_DRIVER",
+        default="autovm.resources.drivers.FakeDriver",
+    ),
+    "OPTIONS": {},
+}
+# Operations of a batch run at once on each host. Each batch has its own cap,
+# concurrent batches can run this many each on a host they share
+HYPERVISOR_HOST_CONCURRENCY = env.int("HYPERVISOR_HOST_CONCURRENCY", default=4)
+# Machines a lifecycle job carries an action out on at once, see
+# autovm.resources.lifecycle
+LIFECYCLE_BATCH_SIZE = env.int("LIFECYCLE_BATCH_SIZE", default=100)
+# Seconds after which machines still in a transitional state, and jobs that
+# haven't progressed, are given up on, see autovm.resources.lifecycle
+LIFECYCLE_TIMEOUT = env.int("LIFECYCLE_TIMEOUT", default=60 * 60)
+# Migrations of a batch run at once out of and into each host, and machines a
+# move job migrates at once, see autovm.resources.moves
+MIGRATION_SOURCE_CONCURRENCY = env.int("MIGRATION_SOURCE_CONCURRENCY", default=2)
+MIGRATION_DESTINATION_CONCURRENCY = env.int(
+    "MIGRATION_DESTINATION_CONCURRENCY",
+    default=2,
+)
+MIGRATION_BATCH_SIZE = env.int("MIGRATION_BATCH_SIZE", default=50)
+
+# Placement of new machines on hosts, binpack or spread, see
+# autovm.resources.placement
+PLACEMENT_STRATEGY = env("PLACEMENT_STRATEGY", default="binpack")
+# Seconds between incremental refreshes of the hosts each process places on
+PLACEMENT_REFRESH_INTERVAL = env.float("PLACEMENT_REFRESH_INTERVAL", default=5)
+# Seconds by which refreshes overlap, to pick up hosts committed late
+PLACEMENT_REFRESH_OVERLAP = env.float("PLACEMENT_REFRESH_OVERLAP", default=60)
+
+# JOBS
+# ------------------------------------------------------------------------------
+# Redis server changes of jobs are published through, see autovm.resources.jobs
+JOB_EVENTS_REDIS_URL = env("REDIS_URL", default="redis://redis:6379/0")
+# Seconds a ticket for the websocket of jobs can be used in
+JOB_TICKET_TTL = env.int("JOB_TICKET_TTL", default=30)
+# Seconds finished jobs are kept before they are archived
+JOB_RETENTION = env.int("JOB_RETENTION", default=7 * 24 * 60 * 60)
+
+# BACKUPS
+# ------------------------------------------------------------------------------
+# Where the chunks and manifests of backed up disk images are kept, see
+# autovm.resources.backup_store
+BACKUP_STORE = {
+    "BACKEND": "autovm.resources.backup_store.FileSystemChunkStore",
+    "OPTIONS": {
+        "location": env("BACKUP_STORE_LOCATION", default=str(BASE_DIR / "backups")),
+    },
+}
+
 # TEMPLATES
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#templates
@@ -232,6 +292,12 @@ EMAIL_BACKEND = env(
 )
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-timeout
 EMAIL_TIMEOUT = 5
+# Redis server queued emails wait on for the mail worker, see autovm.users.mail
+MAIL_QUEUE_REDIS_URL = env("REDIS_URL", default="redis://redis:6379/0")
+# Seconds the mail worker waits for more emails before it sends the queued ones
+MAIL_BATCH_DELAY = env.int("MAIL_BATCH_DELAY", default=5)
+# Most emails sent over a single mail connection
+MAIL_BATCH_SIZE = env.int("MAIL_BATCH_SIZE", default=100)
 
 # ADMIN
 # ------------------------------------------------------------------------------
@@ -302,6 +368,75 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-routes
+# Outgoing mail is batched on its own queue so bursts don't delay other tasks
+# Backups run on their own queue, consumed only by the celerybackupworker
+# service, so its concurrency bounds how many run at once across regions
+CELERY_TASK_ROUTES = {
+    "autovm.users.tasks.send_email_batch": {"queue": "mail"},
+    "autovm.users.tasks.send_queued_emails": {"queue": "mail"},
+    "autovm.resources.tasks.run_backups": {"queue": "backups"},
+    "autovm.resources.tasks.collect_backup_garbage": {"queue": "backups"},
+    "autovm.resources.tasks.back_up": {"queue": "backups"},
+}
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+# Entries are synced into the database scheduler when beat starts
+CELERY_BEAT_SCHEDULE = {
+    "purge-idempotency-keys": {
+        "task": "autovm.resources.tasks.purge_idempotency_keys",
+        "schedule": 60 * 60,
+    },
+    "schedule-backups": {
+        "task": "autovm.resources.tasks.schedule_backups",
+        "schedule": 5 * 60,
+    },
+    "prune-backups": {
+        "task": "autovm.resources.tasks.prune_expired_backups",
+        "schedule": 60 * 60,
+    },
+    "collect-backup-garbage": {
+        "task": "autovm.resources.tasks.collect_backup_garbage",
+        "schedule": 24 * 60 * 60,
+    },
+    "recover-stalled-machines": {
+        "task": "autovm.resources.tasks.recover_stalled_machines",
+        "schedule": 5 * 60,
+    },
+    "archive-jobs": {
+        "task": "autovm.resources.tasks.archive_finished_jobs",
+        "schedule": 60 * 60,
+    },
+    "roll-up-usage": {
+        "task": "autovm.billing.tasks.roll_up_usage",
+        "schedule": 10 * 60,
+    },
+}
+# Scheduled backups, see autovm.resources.backups
+# Seconds between runs of the scheduler, its dispatches are spread over them
+BACKUP_SCHEDULE_INTERVAL = CELERY_BEAT_SCHEDULE["schedule-backups"]["schedule"]
+# Most machines of each region claimed per run of the scheduler. This caps
+# how many are backed up per interval, not how many back up at once
+BACKUP_REGION_CONCURRENCY = env.int("BACKUP_REGION_CONCURRENCY", default=50)
+# Machines backed up by each task
+BACKUP_BATCH_SIZE = env.int("BACKUP_BATCH_SIZE", default=10)
+# Seconds by which the next backup of a machine is shifted at random
+BACKUP_JITTER = env.int("BACKUP_JITTER", default=60 * 60)
+# Seconds for which stored backup data nothing refers to is kept, so that
+# backups being written aren't collected before they are recorded
+BACKUP_GC_GRACE = env.int("BACKUP_GC_GRACE", default=24 * 60 * 60)
+# Usage metering, see autovm.billing.metering
+# Seconds after the end of an hour before it is rolled up, for the events
+# of transactions still running then to be committed
+METERING_DELAY = env.int("METERING_DELAY", default=5 * 60)
+# Price of an hour of a machine of each storage size running, and of an hour
+# of its storage provisioned, running or not
+METERING_RATES = {
+    "200": {"running": "0.010", "provisioned": "0.002"},
+    "300": {"running": "0.020", "provisioned": "0.003"},
+    "400": {"running": "0.040", "provisioned": "0.004"},
+    "600": {"running": "0.080", "provisioned": "0.006"},
+    "1000": {"running": "0.160", "provisioned": "0.010"},
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
@@ -338,10 +473,56 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    # orjson backed JSON, swap for rest_framework's JSONRenderer and JSONParser
+    # to fall back to the stdlib encoder
+    "DEFAULT_RENDERER_CLASSES": (
+        "autovm.resources.api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "autovm.resources.api.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.CursorPagination",
     "PAGE_SIZE": 8,
+    "DEFAULT_THROTTLE_CLASSES": ("autovm.resources.api.throttles.TokenBucketThrottle",),
+    # see TokenBucketThrottle for how these rates map to buckets
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "60/min",
+        "user": "300/min",
+        "user:admin": "1200/min",
+        # writes on heavy endpoints
+        "backup": "10/hour",
+        "assign": "60/hour",
+        "lifecycle": "600/hour",
+        "deposit": "20/hour",
+        "subscriptions": "10/hour",
+    },
 }
+# Redis server holding the throttling token buckets
+THROTTLE_REDIS_URL = env("REDIS_URL", default="redis://redis:6379/0")
+# How long responses of POSTs sent with an Idempotency-Key are replayed, in seconds
+IDEMPOTENCY_KEY_TTL = env.int("DJANGO_IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60)
+# Redis server holding the version of the region, OS and rate plan catalog
+CATALOG_REDIS_URL = env("REDIS_URL", default="redis://redis:6379/0")
+# How long a worker serves its cached catalog before checking the version, in seconds
+CATALOG_CACHE_TTL = env.float("DJANGO_CATALOG_CACHE_TTL", default=5)
+# API responses shorter than this many bytes are sent uncompressed
+API_COMPRESSION_MIN_SIZE = env.int("DJANGO_API_COMPRESSION_MIN_SIZE", default=1024)
+# Where manage.py buildschema writes the OpenAPI schema served at /api/schema/
+API_SCHEMA_DIR = env("DJANGO_API_SCHEMA_DIR", default=str(BASE_DIR / "openapi"))
+# Send request timings to clients, see RequestMetricsMiddleware. They tell
+# anyone how many queries each request runs, so they are off unless debugging
+SERVER_TIMING_HEADER = env.bool("DJANGO_SERVER_TIMING_HEADER", default=DEBUG)
+# Bearer token Prometheus must send to scrape /metrics, not served if unset
+METRICS_TOKEN = env("DJANGO_METRICS_TOKEN", default=None)
+# What to do with requests that run more queries than their view's budget:
+# off, log or raise, see autovm.middleware.budgets
+QUERY_BUDGET_MODE = env("DJANGO_QUERY_BUDGET_MODE", default="off")
+# Budget of views that don't declare one, unlimited if unset
+QUERY_BUDGET_DEFAULT = env.int("DJANGO_QUERY_BUDGET_DEFAULT", default=None)
 
 # django-cors-headers - https://github.com/adamchainz/django-cors-headers#setup
 CORS_URLS_REGEX = r"^/api/.*$"
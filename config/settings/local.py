@@ -73,6 +73,16 @@ INSTALLED_APPS += ["django_extensions"]
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-eager-propagates
 CELERY_TASK_EAGER_PROPAGATES = True
 
+# Query budgets
+# ------------------------------------------------------------------------------
+# log requests over their view's budget, see autovm.middleware.budgets
+QUERY_BUDGET_MODE = env("DJANGO_QUERY_BUDGET_MODE", default="log")
+
+# Instrumentation
+# ------------------------------------------------------------------------------
+# show request timings in the browser's developer tools
+SERVER_TIMING_HEADER = env.bool("DJANGO_SERVER_TIMING_HEADER", default=True)
+
 
 ADMIN_USERNAME = env("ADMIN_USERNAME", default="vmadmin")
 ADMIN_EMAIL = env("ADMIN_EMAIL", default="vmadmin@virtualmachinemanager.com")
@@ -34,3 +34,12 @@ TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore[index]
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "http://media.testserver"
+
+# QUERY BUDGETS
+# ------------------------------------------------------------------------------
+# a request over its view's budget fails the test that made it
+QUERY_BUDGET_MODE = "raise"
+
+# INSTRUMENTATION
+# ------------------------------------------------------------------------------
+SERVER_TIMING_HEADER = True
@@ -7,10 +7,11 @@ from django.urls import include
 from django.urls import path
 from django.views import defaults as default_views
 from django.views.generic import TemplateView
-from drf_spectacular.views import SpectacularAPIView
 from drf_spectacular.views import SpectacularSwaggerView
 from rest_framework.authtoken.views import obtain_auth_token
 
+from autovm.middleware.instrumentation import metrics_view
+from autovm.resources.api.schema import SchemaArtifactView
 from autovm.users.api.views import GuestRegistrationView
 from autovm.users.api.views import RegistrationView
 
@@ -29,6 +30,8 @@ urlpatterns = [
     path("accounts/", include("allauth.urls")),
     # Media files
     *static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT),
+    # Prometheus metrics
+    path("metrics", metrics_view, name="metrics"),
 ]
 if settings.DEBUG:
     # Static file serving when using Gunicorn + Uvicorn for local web socket development
@@ -40,7 +43,7 @@ urlpatterns += [
     path("api/", include("config.api_router")),
     # DRF auth token
     path("api/auth-token/", obtain_auth_token),
-    path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
+    path("api/schema/", SchemaArtifactView.as_view(), name="api-schema"),
     path("api/account-auth/", include("dj_rest_auth.urls")),
     path("api/register/", RegistrationView.as_view(), name="custom_register"),
     path(
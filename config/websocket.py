@@ -1,4 +1,122 @@
+"""
+Websockets, served next to Django by the ASGI application.
+
+/ws/jobs/ streams every change of the authenticated user's jobs, rendered as
+the API renders them, see autovm.resources.jobs. Browsers can't set headers
+on websockets, so clients authenticate with the dj-rest-auth cookie or a
+single-use ticket from POST /api/jobs/ticket/ in the ``ticket`` query
+parameter. Query strings end up in access logs, where a ticket is worthless
+once used or expired and a JWT wouldn't be. Browsers send the cookie along
+with websockets opened by any site, so it is only taken from pages of this
+one.
+Other paths answer "ping" with "pong!".
+"""
+
+import asyncio
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
+from django.conf import settings
+from django.http.request import split_domain_port
+from django.http.request import validate_host
+from rest_framework.exceptions import AuthenticationFailed
+
+from autovm.resources import jobs
+from autovm.resources.api.async_views import AsyncJWTAuthentication
+from autovm.users.models import User
+
+JOBS_PATH = "/ws/jobs/"
+
+
+def trusted_origin(scope):
+    """
+    Whether a websocket was opened by a page of this site, one of
+    CSRF_TRUSTED_ORIGINS or of ALLOWED_HOSTS. Clients other than browsers
+    send no Origin.
+    """
+    origin = dict(scope.get("headers", [])).get(b"origin")
+    if origin is None:
+        return True
+    origin = origin.decode("latin-1")
+    if origin in settings.CSRF_TRUSTED_ORIGINS:
+        return True
+    domain, _ = split_domain_port(urlsplit(origin).netloc)
+    return bool(domain) and validate_host(domain, settings.ALLOWED_HOSTS)
+
+
+def raw_token(scope):
+    """
+    The JWT of a websocket, from its cookies if opened by a page of this site.
+    """
+    if not trusted_origin(scope):
+        return None
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies = SimpleCookie(value.decode())
+            morsel = cookies.get(rest_auth_settings.JWT_AUTH_COOKIE)
+            if morsel:
+                return morsel.value
+    return None
+
+
+async def authenticate(scope):
+    """
+    The user of a websocket, None if it carries no valid ticket or token.
+    """
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if "ticket" in query:
+        user_id = await jobs.redeem_ticket(query["ticket"][0])
+        if user_id is None:
+            return None
+        return await User.objects.filter(pk=user_id, is_active=True).afirst()
+    token = raw_token(scope)
+    if token is None:
+        return None
+    try:
+        return await AsyncJWTAuthentication().aauthenticate_token(token)
+    except AuthenticationFailed:
+        return None
+
+
+async def forward(pubsub, send):
+    async for message in pubsub.listen():
+        if message["type"] == "message":
+            await send({"type": "websocket.send", "text": message["data"].decode()})
+
+
+async def job_events(scope, receive, send):
+    """
+    Send the changes of the user's jobs until the client disconnects. The
+    channel is subscribed to before the socket is accepted, so no change
+    made after the client is told it is connected is missed.
+    """
+    await receive()  # websocket.connect
+    user = await authenticate(scope)
+    if user is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    client = jobs.get_async_redis()
+    pubsub = client.pubsub()
+    await pubsub.subscribe(jobs.job_channel(user.pk))
+    await send({"type": "websocket.accept"})
+    forwarding = asyncio.create_task(forward(pubsub, send))
+    try:
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        forwarding.cancel()
+        await pubsub.aclose()
+        await client.aclose()
+
+
 async def websocket_application(scope, receive, send):
+    if scope["path"] == JOBS_PATH:
+        await job_events(scope, receive, send)
+        return
+
     while True:
         event = await receive()
 